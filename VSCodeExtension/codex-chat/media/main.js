@@ -12,8 +12,11 @@
     const sendButton = document.getElementById('sendButton');
     const toggleDebugButton = document.getElementById('toggleDebug');
     const listToolsButton = document.getElementById('listTools');
+    const showMetricsButton = document.getElementById('showMetrics');
     const newSessionButton = document.getElementById('newSession');
     const reconnectButton = document.getElementById('reconnect');
+    const cancelButton = document.getElementById('cancelRequest');
+    const streamingEntries = new Map();
 
     sendButton.addEventListener('click', onSend);
     messageInput.addEventListener('keydown', (event) => {
@@ -24,8 +27,10 @@
     });
     toggleDebugButton.addEventListener('click', () => vscode.postMessage({ type: 'toggleDebug' }));
     listToolsButton.addEventListener('click', () => vscode.postMessage({ type: 'listTools' }));
+    showMetricsButton.addEventListener('click', () => vscode.postMessage({ type: 'showMetrics' }));
     newSessionButton.addEventListener('click', () => vscode.postMessage({ type: 'newSession' }));
     reconnectButton.addEventListener('click', () => vscode.postMessage({ type: 'reconnect' }));
+    cancelButton.addEventListener('click', () => vscode.postMessage({ type: 'cancel' }));
 
     function onSend() {
         const text = messageInput.value.trim();
@@ -51,6 +56,29 @@
         entry.textContent = `${labelForKind(kind)} ${text}`;
         chatLog.appendChild(entry);
         chatLog.scrollTop = chatLog.scrollHeight;
+        return entry;
+    }
+
+    function appendDelta(requestId, text) {
+        let stream = streamingEntries.get(requestId);
+        if (!stream) {
+            stream = { entry: appendEntry('assistant', ''), text: '' };
+            streamingEntries.set(requestId, stream);
+        }
+        stream.text += text;
+        stream.entry.textContent = `${labelForKind('assistant')} ${stream.text}`;
+        chatLog.scrollTop = chatLog.scrollHeight;
+    }
+
+    function finishAssistant(requestId, text) {
+        const stream = requestId ? streamingEntries.get(requestId) : undefined;
+        if (!stream) {
+            appendEntry('assistant', text);
+            return;
+        }
+        // The final message is authoritative (tool rounds are streamed too).
+        stream.entry.textContent = `${labelForKind('assistant')} ${text}`;
+        streamingEntries.delete(requestId);
     }
 
     function labelForKind(kind) {
@@ -84,7 +112,7 @@
     }
 
     function setControlsEnabled(enabled) {
-        [sendButton, toggleDebugButton, listToolsButton, newSessionButton].forEach((button) => {
+        [sendButton, cancelButton, toggleDebugButton, listToolsButton, showMetricsButton, newSessionButton].forEach((button) => {
             button.disabled = !enabled;
         });
         messageInput.disabled = !enabled;
@@ -117,9 +145,15 @@
         }
         switch (message.type) {
             case 'assistant':
-                appendEntry('assistant', message.message || '');
+                finishAssistant(message.requestId, message.message || '');
                 showSpinner(false);
                 break;
+            case 'assistant-delta':
+                appendDelta(message.requestId, message.text || '');
+                break;
+            case 'progress':
+                appendEntry('system', message.message || '');
+                break;
             case 'system':
                 appendEntry('system', message.message || '');
                 showSpinner(false);
@@ -44,6 +44,8 @@ class ChatPanel {
         this.debugEnabled = false;
         this.workspacePath = undefined;
         this.pythonPath = undefined;
+        this.requestCounter = 0;
+        this.sessionId = `vsc-${getNonce().slice(0, 12)}`;
 
         this.panel.onDidDispose(() => this.dispose(), null, this.disposables);
         this.panel.webview.onDidReceiveMessage((message) => this.handleWebviewMessage(message), null, this.disposables);
@@ -93,8 +95,10 @@ class ChatPanel {
             <span id="status" class="status">Connecting…</span>
             <span id="spinner" class="spinner" style="display:none" aria-label="Loading"></span>
             <div class="actions">
+                <button id="cancelRequest" disabled>Stop</button>
                 <button id="toggleDebug" disabled>Toggle Debug</button>
                 <button id="listTools" disabled>List Tools</button>
+                <button id="showMetrics" disabled>Metrics</button>
                 <button id="newSession" disabled>New Session</button>
                 <button id="reconnect">Reconnect</button>
             </div>
@@ -121,6 +125,7 @@ class ChatPanel {
         const configuredWorkspace = (config.get('workspacePath') || '').trim();
         this.workspacePath = configuredWorkspace || this.resolveWorkspacePath();
         this.pythonPath = (config.get('pythonPath') || 'python').trim() || 'python';
+        this.useDaemon = !!config.get('useDaemon');
 
         this.setControlsEnabled(false);
         this.postToWebview({ type: 'debug-visibility', visible: false });
@@ -149,7 +154,7 @@ class ChatPanel {
         }));
 
         try {
-            await this.bridge.start(this.workspacePath, this.pythonPath);
+            await this.bridge.start(this.workspacePath, this.pythonPath, this.useDaemon);
             this.postToWebview({ type: 'status', level: 'info', message: 'Backend process started. Waiting for ready event…' });
         } catch (error) {
             const message = error && error.message ? error.message : String(error);
@@ -183,7 +188,7 @@ class ChatPanel {
                 }
                 if (message.content && message.content.trim().length > 0) {
                     try {
-                        await this.bridge.send({ type: 'message', content: message.content });
+                        await this.bridge.send({ type: 'message', content: message.content, session_id: this.sessionId, request_id: this.nextRequestId(), stream: true });
                     } catch (error) {
                         this.postToWebview({ type: 'status', level: 'error', message: `Failed to send message: ${error.message || error}` });
                     }
@@ -191,25 +196,39 @@ class ChatPanel {
                 break;
             case 'toggleDebug':
                 if (this.bridge && this.bridge.isRunning) {
-                    this.bridge.send({ type: 'toggle_debug' }).catch((error) => {
+                    this.bridge.send({ type: 'toggle_debug', session_id: this.sessionId }).catch((error) => {
                         this.postToWebview({ type: 'status', level: 'error', message: `Failed to toggle debug: ${error.message || error}` });
                     });
                 }
                 break;
             case 'listTools':
                 if (this.bridge && this.bridge.isRunning) {
-                    this.bridge.send({ type: 'message', content: '!tools' }).catch((error) => {
+                    this.bridge.send({ type: 'message', content: '!tools', session_id: this.sessionId }).catch((error) => {
                         this.postToWebview({ type: 'status', level: 'error', message: `Failed to request tools: ${error.message || error}` });
                     });
                 }
                 break;
+            case 'showMetrics':
+                if (this.bridge && this.bridge.isRunning) {
+                    this.bridge.send({ type: 'metrics', session_id: this.sessionId }).catch((error) => {
+                        this.postToWebview({ type: 'status', level: 'error', message: `Failed to request metrics: ${error.message || error}` });
+                    });
+                }
+                break;
             case 'newSession':
                 if (this.bridge && this.bridge.isRunning) {
-                    this.bridge.send({ type: 'message', content: '!new' }).catch((error) => {
+                    this.bridge.send({ type: 'message', content: '!new', session_id: this.sessionId }).catch((error) => {
                         this.postToWebview({ type: 'status', level: 'error', message: `Failed to reset session: ${error.message || error}` });
                     });
                 }
                 break;
+            case 'cancel':
+                if (this.bridge && this.bridge.isRunning) {
+                    this.bridge.send({ type: 'cancel', session_id: this.sessionId }).catch((error) => {
+                        this.postToWebview({ type: 'status', level: 'error', message: `Failed to cancel: ${error.message || error}` });
+                    });
+                }
+                break;
             case 'reconnect':
                 await this.restartBackend();
                 break;
@@ -218,6 +237,11 @@ class ChatPanel {
         }
     }
 
+    nextRequestId() {
+        this.requestCounter += 1;
+        return `vsc-${Date.now().toString(36)}-${this.requestCounter}`;
+    }
+
     async restartBackend() {
         this.setControlsEnabled(false);
         this.postToWebview({ type: 'status', level: 'info', message: 'Restarting backend…' });
@@ -254,11 +278,26 @@ class ChatPanel {
                 this.postToWebview({ type: 'spinner', show: false });
                 break;
             case 'assistant':
-                this.postToWebview({ type: 'assistant', message: message.content || '' });
+                this.postToWebview({ type: 'assistant', message: message.content || '', requestId: message.request_id });
+                break;
+            case 'delta':
+                this.postToWebview({ type: 'assistant-delta', text: message.content || '', requestId: message.request_id });
+                break;
+            case 'step_started':
+                this.postToWebview({ type: 'progress', message: `Step ${message.step} started: ${message.task || ''}` });
+                break;
+            case 'step_finished':
+                this.postToWebview({ type: 'progress', message: `Step ${message.step} finished in ${Number(message.elapsed || 0).toFixed(2)}s` });
+                break;
+            case 'done':
+                this.postToWebview({ type: 'spinner', show: false });
                 break;
             case 'notification':
                 this.postToWebview({ type: 'system', message: message.content || '' });
                 break;
+            case 'metrics':
+                this.postToWebview({ type: 'system', message: message.content || 'No metrics recorded yet.' });
+                break;
             case 'error':
                 this.postToWebview({ type: 'status', level: 'error', message: message.content || 'Unknown backend error.' });
                 break;
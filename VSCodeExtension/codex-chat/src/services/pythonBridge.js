@@ -30,14 +30,15 @@ class PythonBridge {
         return !!this.process && !this.process.killed;
     }
 
-    start(workspacePath, pythonPath) {
+    start(workspacePath, pythonPath, useDaemon) {
         if (this.isRunning) {
             return Promise.resolve();
         }
 
         return new Promise((resolve, reject) => {
             try {
-                const child = spawn(pythonPath || 'python', ['-u', '-m', 'core.chat_process'], {
+                const args = useDaemon ? ['-u', '-m', 'core.daemon', 'attach'] : ['-u', '-m', 'core.chat_process'];
+                const child = spawn(pythonPath || 'python', args, {
                     cwd: workspacePath,
                     stdio: ['pipe', 'pipe', 'pipe'],
                 });
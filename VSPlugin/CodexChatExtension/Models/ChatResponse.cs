@@ -6,6 +6,10 @@ namespace CodexChatExtension.Models
     {
         public string Type { get; set; } = string.Empty;
         public string? Content { get; set; }
+        public string? RequestId { get; set; }
+        public string? Step { get; set; }
+        public string? StepTask { get; set; }
+        public double? Elapsed { get; set; }
         public IReadOnlyList<string> Debug { get; set; } = System.Array.Empty<string>();
         public IReadOnlyList<string> Extras { get; set; } = System.Array.Empty<string>();
         public bool? DebugEnabled { get; set; }
@@ -44,7 +44,10 @@ namespace CodexChatExtension.Services
             var startInfo = new ProcessStartInfo
             {
                 FileName = pythonExecutable,
-                Arguments = "-u -m core.chat_process",
+                // CODEX_AGENT_DAEMON=1 attaches to the shared, already-warm agent daemon.
+                Arguments = Environment.GetEnvironmentVariable("CODEX_AGENT_DAEMON") == "1"
+                    ? "-u -m core.daemon attach"
+                    : "-u -m core.chat_process",
                 WorkingDirectory = workspacePath,
                 RedirectStandardOutput = true,
                 RedirectStandardError = true,
@@ -123,6 +126,10 @@ namespace CodexChatExtension.Services
             {
                 Type = root.GetProperty("type").GetString() ?? string.Empty,
                 Content = root.TryGetProperty("content", out var content) ? content.GetString() : null,
+                RequestId = root.TryGetProperty("request_id", out var requestId) ? requestId.GetString() : null,
+                Step = root.TryGetProperty("step", out var step) ? step.ToString() : null,
+                StepTask = root.TryGetProperty("task", out var task) ? task.GetString() : null,
+                Elapsed = root.TryGetProperty("elapsed", out var elapsed) && elapsed.ValueKind == JsonValueKind.Number ? elapsed.GetDouble() : null,
             };
 
             if (root.TryGetProperty("debug", out var debugElement))
@@ -16,6 +16,9 @@ namespace CodexChatExtension.ToolWindows
         private bool _isConnected;
         private bool _debugEnabled;
         private readonly StringBuilder _chatBuilder = new();
+        private readonly StringBuilder _streamBuilder = new();
+        private string? _streamRequestId;
+        private int _requestCounter;
 
         public CodexChatWindowControl()
         {
@@ -121,7 +124,8 @@ namespace CodexChatExtension.ToolWindows
 
             try
             {
-                await _client.SendAsync(new { type = "message", content = message });
+                var requestId = $"vs-{++_requestCounter}";
+                await _client.SendAsync(new { type = "message", content = message, request_id = requestId, stream = true });
             }
             catch (Exception ex)
             {
@@ -218,7 +222,24 @@ namespace CodexChatExtension.ToolWindows
                     }
                     AppendSystem("Backend ready.");
                     break;
+                case "delta":
+                    AppendDelta(response.RequestId, response.Content ?? string.Empty);
+                    break;
+                case "step_started":
+                    AppendSystem($"Step {response.Step} started: {response.StepTask}");
+                    break;
+                case "step_finished":
+                    AppendSystem($"Step {response.Step} finished in {(response.Elapsed ?? 0):0.00}s");
+                    break;
+                case "done":
+                    break;
                 case "assistant":
+                    if (_streamRequestId != null && _streamRequestId == response.RequestId)
+                    {
+                        // The final message replaces the streamed text (tool rounds are streamed too).
+                        _streamRequestId = null;
+                        _streamBuilder.Clear();
+                    }
                     AppendAssistant(response.Content ?? string.Empty);
                     if (response.Extras.Any())
                     {
@@ -264,28 +285,43 @@ namespace CodexChatExtension.ToolWindows
         private void AppendUser(string message)
         {
             _chatBuilder.AppendLine($"You: {message}");
-            ChatLog.Text = _chatBuilder.ToString();
-            ChatLog.ScrollToEnd();
+            RenderChat();
         }
 
         private void AppendAssistant(string message)
         {
             _chatBuilder.AppendLine($"Assistant: {message}");
-            ChatLog.Text = _chatBuilder.ToString();
-            ChatLog.ScrollToEnd();
+            RenderChat();
         }
 
         private void AppendSystem(string message)
         {
             _chatBuilder.AppendLine($"[System] {message}");
-            ChatLog.Text = _chatBuilder.ToString();
-            ChatLog.ScrollToEnd();
+            RenderChat();
         }
 
         private void AppendError(string message)
         {
             _chatBuilder.AppendLine($"[Error] {message}");
-            ChatLog.Text = _chatBuilder.ToString();
+            RenderChat();
+        }
+
+        private void AppendDelta(string? requestId, string text)
+        {
+            if (_streamRequestId != requestId)
+            {
+                _streamRequestId = requestId;
+                _streamBuilder.Clear();
+            }
+            _streamBuilder.Append(text);
+            RenderChat();
+        }
+
+        private void RenderChat()
+        {
+            ChatLog.Text = _streamRequestId == null
+                ? _chatBuilder.ToString()
+                : $"{_chatBuilder}Assistant: {_streamBuilder}";
             ChatLog.ScrollToEnd();
         }
 
@@ -0,0 +1,131 @@
+"""Replay a recorded chat completion stream through the SSE parsers.
+
+Usage (from the repository root):
+
+    python -m benchmarks.sse_parser_bench [--tokens 50000] [--recording path]
+
+Without ``--recording`` a deterministic 50k-token stream is synthesised
+(mixed ASCII/multi-byte code deltas, cut into socket-sized chunks at
+arbitrary byte offsets). Pass ``--save`` to write it out for later replays.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from core.sse import ChatStreamParser, iter_chat_deltas
+
+_WORDS = [
+    "def", " return", " self", ".", "_buffer", "(", ")", ":", "\n    ", " if", " not", " None",
+    " for", " in", " range", "é", "—", "日本", " 🚀", "\"", "{", "}", " =", " +", "1",
+]
+
+
+def synthesize_recording(tokens, seed=1234):
+    rng = random.Random(seed)
+    events = []
+    for index in range(tokens):
+        chunk = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {"content": rng.choice(_WORDS)}, "finish_reason": None}],
+        }
+        events.append("data: " + json.dumps(chunk, ensure_ascii=False) + "\n\n")
+    events.append('data: {"choices":[{"index":0,"delta":{},"finish_reason":"stop"}],'
+                  f'"usage":{{"prompt_tokens":100,"completion_tokens":{tokens}}}}}\n\n')
+    events.append("data: [DONE]\n\n")
+    raw = "".join(events).encode("utf-8")
+    chunks = []
+    offset = 0
+    while offset < len(raw):
+        size = rng.randint(256, 4096)
+        chunks.append(raw[offset:offset + size])
+        offset += size
+    return chunks
+
+
+def _split_lines(chunks):
+    # Mirrors requests.Response.iter_lines() on top of iter_content().
+    pending = None
+    for chunk in chunks:
+        if pending is not None:
+            chunk = pending + chunk
+        lines = chunk.splitlines()
+        pending = lines.pop() if lines and lines[-1] and chunk[-1:] == lines[-1][-1:] else None
+        yield from lines
+    if pending is not None:
+        yield pending
+
+
+def legacy_parse(chunks):
+    """The original stream_chat loop: iter_lines, json per line, string concat."""
+    content = ""
+    for line in _split_lines(chunks):
+        if not line or not line.startswith(b"data: "):
+            continue
+        payload = line[6:]
+        if payload == b"[DONE]":
+            break
+        try:
+            import json as _json
+            chunk = _json.loads(payload)
+            delta = chunk["choices"][0]["delta"].get("content", "")
+            if delta:
+                content += delta
+        except Exception:
+            continue
+    return content
+
+
+def streaming_parse(chunks):
+    parser = ChatStreamParser()
+    for _ in iter_chat_deltas(chunks, parser):
+        pass
+    return parser.content
+
+
+def _best_of(func, chunks, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(chunks)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SSE parser microbenchmark")
+    parser.add_argument("--tokens", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--recording", help="Replay a raw stream captured to disk")
+    parser.add_argument("--save", help="Write the synthesised stream to this path")
+    args = parser.parse_args(argv)
+
+    if args.recording:
+        with open(args.recording, "rb") as handle:
+            raw = handle.read()
+        chunks = [raw[i:i + 2048] for i in range(0, len(raw), 2048)]
+    else:
+        chunks = synthesize_recording(args.tokens)
+    if args.save:
+        with open(args.save, "wb") as handle:
+            handle.write(b"".join(chunks))
+
+    total_bytes = sum(len(chunk) for chunk in chunks)
+    legacy_time, legacy_content = _best_of(legacy_parse, chunks, args.repeat)
+    stream_time, stream_content = _best_of(streaming_parse, chunks, args.repeat)
+    if legacy_content != stream_content:
+        print("WARNING: parsers disagree on the reassembled content.")
+    print(f"Stream: {len(chunks)} chunks, {total_bytes / 1e6:.2f} MB, {len(stream_content)} chars")
+    print(f"legacy    : {legacy_time * 1000:8.1f} ms  ({total_bytes / legacy_time / 1e6:7.1f} MB/s)")
+    print(f"streaming : {stream_time * 1000:8.1f} ms  ({total_bytes / stream_time / 1e6:7.1f} MB/s)")
+    print(f"speedup   : {legacy_time / stream_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
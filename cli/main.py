@@ -1,6 +1,6 @@
 import argparse
-import re
 import shutil
+import sys
 import time
 
 from prompt_toolkit import PromptSession
@@ -10,11 +10,16 @@ from prompt_toolkit.shortcuts import print_formatted_text
 from prompt_toolkit.styles import Style
 
 from core.api import OpenAIClient
+from core.batch import BatchRunner
 from core.config import load_config
-from core.history import ConversationHistory
-from core.mcp import discover_mcp_tools, run_mcp_tool
+from core.frontend import build_executor, build_tool_cache, connection_debug_line, new_history, respond_with_tools, tool_cache_debug_line
+from core.mcp import add_mcp_tools
+from core.metrics import METRICS, format_summary, start_exporter
+from core.planner import build_plan_prompt, execute_plan, parse_plan
+from core.router import Router
 from core.tool_loader import load_tools
 from core.skills import list_skills, load_skill, save_skill
+from core.summarizer import BackgroundSummarizer
 from core.system_prompt import seed_history_with_system_prompts
 
 
@@ -57,7 +62,7 @@ def _run_skill(name, history, client, chat_log, debug_metrics):
     for index, step in enumerate(skill.get("steps", []), start=1):
         _append_log(chat_log, "class:tool", f"[Skill Step {index}] {step}")
         history.add_user_message(f"Skill step: {step}")
-        step_response, elapsed = _collect_response(client, history)
+        step_response, elapsed = _collect_response(client, history, use_cache=True, profile="skill")
         history.add_assistant_message(step_response)
         _append_log(chat_log, "class:assistant", step_response.strip())
         if debug_metrics:
@@ -75,32 +80,96 @@ def _save_skill(payload, chat_log):
         _append_log(chat_log, "class:tool", f"Failed to save skill: {exc}")
 
 
-def _collect_response(client, history, on_chunk=None):
+def _collect_response(client, history, on_chunk=None, use_cache=False, profile="chat"):
     start = time.time()
-    response = ""
-    for chunk in client.stream_chat(history.get_messages()):
-        response += chunk
+    parts = []
+    for chunk in client.stream_chat(history.get_messages(), use_cache=use_cache, profile=profile):
+        parts.append(chunk)
         if on_chunk:
             on_chunk(chunk)
     elapsed = time.time() - start
-    return response, elapsed
+    METRICS.observe("stage_seconds", elapsed, stage=profile)
+    return "".join(parts), elapsed
+
+
+def _run_batch(args, config, client, tools, summarizer, cache):
+    # System prompts are read once and copied into every item's history.
+    template = new_history(config)
+    seed_history_with_system_prompts(template, tools)
+    system_messages = [message["content"] for message in template.system]
+
+    def make_worker():
+        executor = build_executor(tools, config, cache)
+
+        def process(prompt):
+            history = new_history(config, summarizer)
+            for content in system_messages:
+                history.add_system_message(content)
+            history.add_user_message(prompt)
+            prompt_tokens = history.token_count()
+            start = time.time()
+            first = []
+            response, _, tool_calls = respond_with_tools(
+                client,
+                history,
+                executor,
+                config,
+                on_chunk=lambda chunk: first or first.append(time.time() - start),
+                use_cache=True,
+            )
+            return {
+                "response": response.strip(),
+                "ttft": round(first[0], 3) if first else None,
+                "tool_calls": tool_calls,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": history.tokenizer(response),
+            }
+
+        return process
+
+    def on_result(record, counts):
+        status = f"error: {record['error']}" if record.get("error") else "ok"
+        print(f"[{counts['done']} done, {counts['failed']} failed] {record['id']} {record['latency']:.2f}s {status}", file=sys.stderr, flush=True)
+
+    runner = BatchRunner(make_worker, workers=args.workers or config.get("batch_workers", 4), on_result=on_result)
+    try:
+        totals = runner.run(args.batch, args.out)
+    except OSError as exc:
+        print(f"Batch failed: {exc}", file=sys.stderr)
+        return 2
+    print(
+        f"Batch finished in {totals['elapsed']:.1f}s: {totals['done']} done, {totals['failed']} failed, "
+        f"{totals['skipped']} already done.",
+        file=sys.stderr,
+    )
+    if config.get("debug_metrics", False):
+        print(connection_debug_line(client), file=sys.stderr)
+        if cache is not None:
+            print(tool_cache_debug_line(cache), file=sys.stderr)
+    return 1 if totals["failed"] else 0
 
 
 def main(argv=None):
     parser = argparse.ArgumentParser(description="codex-agent CLI")
     parser.add_argument("--exec", dest="exec_message", type=str, help="Send a single message and exit")
+    parser.add_argument("--batch", type=str, help="Run every prompt in a JSONL file and exit")
+    parser.add_argument("--out", type=str, help="Results file for --batch; rerunning resumes from it")
+    parser.add_argument("--workers", type=int, help="Prompts run at once in --batch mode")
     args = parser.parse_args(argv)
+    if args.batch and not args.out:
+        parser.error("--batch requires --out")
 
     config = load_config()
     client = OpenAIClient(config)
-    history = ConversationHistory()
-    tools = load_tools()
-    mcp_tools = discover_mcp_tools()
-    for name, description in mcp_tools.items():
-        tools[name] = {
-            "run": lambda arguments, n=name: run_mcp_tool(n, arguments),
-            "description": f"(MCP) {description}",
-        }
+    start_exporter(config)
+    router = Router(client, mode=config.get("router_mode", "local"))
+    summarizer = BackgroundSummarizer(client) if config.get("async_summaries", True) else None
+    history = new_history(config, summarizer)
+    tools = add_mcp_tools(load_tools())
+    tool_cache = build_tool_cache(config)
+    if args.batch:
+        return _run_batch(args, config, client, tools, summarizer, tool_cache)
+    executor = build_executor(tools, config, tool_cache)
     seed_history_with_system_prompts(history, tools)
 
     if args.exec_message:
@@ -109,16 +178,16 @@ def main(argv=None):
             parts = message[1:].split(maxsplit=1)
             toolname = parts[0]
             toolarg = parts[1] if len(parts) > 1 else ""
-            if toolname in tools:
-                print(tools[toolname]["run"](toolarg))
-            else:
-                print(f"Tool '{toolname}' not found.")
+            print(executor.call(toolname, toolarg))
             return
         history.add_user_message(message)
-        response, elapsed = _collect_response(
+        response, elapsed, _ = respond_with_tools(
             client,
             history,
+            executor,
+            config,
             on_chunk=lambda chunk: print(chunk, end="", flush=True),
+            use_cache=True,
         )
         print()
         if config.get("debug_metrics", False):
@@ -154,14 +223,9 @@ def main(argv=None):
                     chat_log.extend(_list_skills_lines())
                     continue
                 if user_input == "!new":
-                    history = ConversationHistory()
-                    tools = load_tools()
-                    mcp_tools = discover_mcp_tools()
-                    for name, description in mcp_tools.items():
-                        tools[name] = {
-                            "run": lambda arguments, n=name: run_mcp_tool(n, arguments),
-                            "description": f"(MCP) {description}",
-                        }
+                    history = new_history(config, summarizer)
+                    tools = add_mcp_tools(load_tools())
+                    executor.tools = tools
                     seed_history_with_system_prompts(history, tools)
                     chat_log.clear()
                     chat_log.append(("", "[History cleared]"))
@@ -171,6 +235,10 @@ def main(argv=None):
                     state = "enabled" if debug_metrics else "disabled"
                     _append_log(chat_log, "class:tool", f"[Debug metrics {state}]")
                     continue
+                if user_input == "!metrics":
+                    lines = format_summary(METRICS.snapshot()) or ["No metrics recorded yet."]
+                    chat_log.extend(("class:tool", line) for line in lines)
+                    continue
                 if user_input.startswith("!run "):
                     _run_skill(user_input[5:].strip(), history, client, chat_log, debug_metrics)
                     continue
@@ -181,48 +249,34 @@ def main(argv=None):
                     parts = user_input[1:].split(maxsplit=1)
                     toolname = parts[0]
                     toolarg = parts[1] if len(parts) > 1 else ""
-                    if toolname in tools:
-                        result = tools[toolname]["run"](toolarg)
-                        _append_log(chat_log, "class:tool", result)
-                    else:
-                        _append_log(chat_log, "class:tool", f"Tool '{toolname}' not found.")
+                    _append_log(chat_log, "class:tool", executor.call(toolname, toolarg))
                     continue
 
                 history.add_user_message(user_input)
                 _append_log(chat_log, "class:user", f"You: {user_input}\n")
 
-                router_prompt = (
-                    "Does the following user request require a multi-step plan (tools/actions) or can it be answered directly? "
-                    "Reply with 'plan' or 'respond'. Request: '" + user_input + "'"
-                )
-                history.add_user_message(router_prompt)
-                router_response, _ = _collect_response(client, history)
-                decision = router_response.strip().lower()
-                if history.memory[0] and history.memory[0][-1]["role"] == "user" and router_prompt in history.memory[0][-1]["content"]:
-                    history.memory[0].pop()
-
-                if "plan" in decision:
-                    plan_prompt = (
-                        "Given the user's request, break it down into a numbered list of concrete steps (tools or actions) to achieve the goal. "
-                        f"Only plan up to {chain_limit} steps. Respond with the plan as a numbered list."
-                    )
+                route = router.route(user_input, history.get_messages())
+                if debug_metrics:
+                    _append_log(chat_log, "class:tool", f"[DEBUG] Router: {route['decision']} via {route['source']} ({route['elapsed']:.2f}s)")
+
+                if route["decision"] == "plan":
+                    plan_prompt = build_plan_prompt(chain_limit)
                     history.add_user_message(plan_prompt)
-                    plan_response, plan_elapsed = _collect_response(client, history)
+                    plan_response, plan_elapsed = _collect_response(client, history, profile="plan")
                     if debug_metrics:
                         _append_log(chat_log, "class:tool", f"[DEBUG] Planning time: {plan_elapsed:.2f}s")
-                    steps = re.findall(r"\d+\.\s*(.*)", plan_response)
+                    steps = parse_plan(plan_response, chain_limit)
                     if not steps:
                         _append_log(chat_log, "class:tool", "[No plan steps found. Proceeding with normal chat.]")
                         continue
-                    chain_history = []
                     t_chain_start = time.time()
-                    for step in steps[:chain_limit]:
-                        history.add_user_message(f"Step: {step}")
-                        step_response, step_elapsed = _collect_response(client, history)
-                        history.add_assistant_message(step_response)
-                        chain_history.append({"step": step, "response": step_response.strip()})
-                        if debug_metrics:
-                            _append_log(chat_log, "class:tool", f"[DEBUG] Step time: {step_elapsed:.2f}s")
+                    executor.reset()
+                    chain_history = execute_plan(
+                        client, history, steps, config.get("plan_workers", 4), executor=executor, max_rounds=config.get("tool_rounds", 5)
+                    )
+                    if debug_metrics:
+                        for entry in chain_history:
+                            _append_log(chat_log, "class:tool", f"[DEBUG] Step {entry['id']} time: {entry['elapsed']:.2f}s")
                     t_chain_end = time.time()
                     summary_prompt = (
                         f"Provide a response that is appropriate based on the user's prompt: '{user_input}'.\n"
@@ -230,20 +284,33 @@ def main(argv=None):
                         "\n".join([f"Step: {entry['step']}\nResult: {entry['response']}" for entry in chain_history])
                     )
                     history.add_user_message(summary_prompt)
-                    summary_response, summary_elapsed = _collect_response(client, history)
+                    summary_response, summary_elapsed = _collect_response(client, history, profile="summary")
                     _append_log(chat_log, "class:assistant", summary_response.strip())
                     if debug_metrics:
                         _append_log(chat_log, "class:tool", f"[DEBUG] Chain steps: {len(chain_history)} | Chain time: {t_chain_end - t_chain_start:.2f}s")
                         _append_log(chat_log, "class:tool", f"[DEBUG] Summary time: {summary_elapsed:.2f}s")
+                        _append_log(chat_log, "class:tool", connection_debug_line(client))
+                        if executor.cache is not None:
+                            _append_log(chat_log, "class:tool", tool_cache_debug_line(executor.cache))
                     _append_log(chat_log, "class:tool", "\n[Chain complete. Returning to user input.]")
                 else:
-                    direct_response, direct_elapsed = _collect_response(client, history)
+                    executor.reset()
+                    direct_response, direct_elapsed, tool_calls = respond_with_tools(
+                        client, history, executor, config, initial_reply=route["response"]
+                    )
+                    if route["response"] is not None:
+                        direct_elapsed += route["elapsed"]
                     _append_log(chat_log, "class:assistant", direct_response.strip())
                     if debug_metrics:
                         _append_log(chat_log, "class:tool", f"[DEBUG] Response time: {direct_elapsed:.2f}s")
+                        if tool_calls:
+                            _append_log(chat_log, "class:tool", f"[DEBUG] Tool calls: {tool_calls}")
+                        _append_log(chat_log, "class:tool", connection_debug_line(client))
+                        if executor.cache is not None:
+                            _append_log(chat_log, "class:tool", tool_cache_debug_line(executor.cache))
             except (KeyboardInterrupt, EOFError):
                 print("\nExiting.")
                 break
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,41 +1,303 @@
+import email.utils
+import json
+import random
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from core.backends import BACKGROUND, INTERACTIVE, BackendPool
+from core.metrics import METRICS
+from core.profiles import BACKGROUND_PROFILES, load_profiles, request_params
+from core.response_cache import ResponseCache, request_key
+from core.sse import ChatStreamParser, iter_chat_deltas
+
+
+def _retryable(exc):
+    """Errors that say the backend, not the request, is at fault."""
+    if isinstance(exc, requests.HTTPError):
+        status = exc.response.status_code if exc.response is not None else 0
+        return status >= 500 or status == 429
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError))
+
+
+def _status(exc):
+    response = getattr(exc, "response", None)
+    return response.status_code if isinstance(exc, requests.HTTPError) and response is not None else None
+
+
+def _retry_after(exc):
+    """Seconds asked for by a ``Retry-After`` header (delta or HTTP date), or None."""
+    response = getattr(exc, "response", None)
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base, cap, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than ``retry_after``."""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap) + random.uniform(0, base))
+    return delay
+
 
 class OpenAIClient:
     def __init__(self, config):
-        self.api_url = config["api_url"]
+        self.api_urls = config.get("api_urls") or [config["api_url"]]
+        self.api_url = self.api_urls[0]
         self.api_key = config["api_key"]
         self.model = config.get("model", "gpt-3.5-turbo")
+        self.profiles = load_profiles(config)
+        self.timeout = (config.get("connect_timeout", 5.0), config.get("read_timeout", 300.0))
         self.last_response = ""
+        self.last_usage = None
+        self.last_finish_reason = None
+        self.session = self._build_session(config.get("pool_size", 4))
+        self.backends = BackendPool(
+            self.api_urls,
+            self.session,
+            probe_interval=config.get("backend_probe_interval", 10.0),
+            limit=config.get("backend_concurrency", 4),
+            max_limit=config.get("backend_max_concurrency", 16),
+        )
+        self.retries = config.get("retries", 3)
+        self.retry_base = config.get("retry_base_delay", 0.5)
+        self.retry_cap = config.get("retry_max_delay", 30.0)
+        self.retry_count = 0
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        cache_mode = config.get("response_cache", "off")
+        self.cache = None
+        if cache_mode in ("skills", "all"):
+            self.cache = ResponseCache(
+                max_bytes=config.get("response_cache_mb", 64) * 1024 * 1024,
+                ttl=config.get("response_cache_ttl", 7 * 24 * 3600),
+            )
+        self.cache_all = cache_mode == "all"
 
-    def stream_chat(self, messages):
-        headers = {
+    def _build_session(self, pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
-        }
-        data = {
-            "model": self.model,
-            "messages": messages,
-            "stream": True,
-        }
-        with requests.post(self.api_url, headers=headers, json=data, stream=True) as resp:
+            "Connection": "keep-alive",
+        })
+        return session
+
+    def stream_chat(self, messages, cancel_event=None, use_cache=False, profile="chat"):
+        """Stream reply deltas using the named generation ``profile``."""
+        data = request_params(self.profiles.get(profile, {}), self.model)
+        data.update(messages=messages, stream=True)
+        start = time.perf_counter()
+        try:
+            if self.cache is not None and (use_cache or self.cache_all):
+                yield from self._stream_cached(data, cancel_event, profile)
+            else:
+                yield from self._stream(data, cancel_event, profile=profile)
+        finally:
+            METRICS.observe("model_call_seconds", time.perf_counter() - start, profile=profile)
+
+    def _stream_cached(self, data, cancel_event, profile="chat"):
+        params = {k: v for k, v in data.items() if k not in ("messages", "stream")}
+        key = request_key(data["model"], data["messages"], params)
+        cached = self.cache.get(key)
+        METRICS.inc("cache_lookups_total", cache="response", result="miss" if cached is None else "hit")
+        if cached is not None:
+            self.last_response = "".join(cached)
+            self.last_usage = None
+            self.last_finish_reason = "cached"
+            for delta in cached:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                yield delta
+            return
+        chunks = []
+        parser = ChatStreamParser()
+        for delta in self._stream(data, cancel_event, parser, profile):
+            chunks.append(delta)
+            yield delta
+        if parser.finish_reason and not (cancel_event is not None and cancel_event.is_set()):
+            self.cache.put(key, chunks)
+
+    def _stream(self, data, cancel_event, parser=None, profile="chat"):
+        """Stream from the least-loaded healthy backend.
+
+        A backend that fails before sending a token is reported to the pool
+        and the call moves on to the next one. Once every backend has failed
+        the round is retried after a jittered exponential backoff (at least
+        the server's ``Retry-After``), up to ``retries`` times. Once tokens
+        have been yielded an error is raised as usual.
+
+        Each attempt parses with a fresh ``ChatStreamParser`` so a backend
+        that died mid-event leaves nothing behind for the next one; the
+        caller's ``parser`` receives the content, usage and finish reason of
+        the attempt that completed.
+        """
+        priority = BACKGROUND if profile in BACKGROUND_PROFILES else INTERACTIVE
+        # Serialized once: the size is recorded and every retry reuses it.
+        body = json.dumps(data).encode("utf-8")
+        METRICS.observe("model_request_bytes", len(body), profile=profile)
+        call_start = time.perf_counter()
+        first = last = None
+        deltas = 0
+        tried = []
+        attempt = 0
+        while True:
+            backend = self.backends.acquire(exclude=tried, priority=priority, cancel_event=cancel_event)
+            if backend is None:
+                return
+            tried.append(backend)
+            started = time.time()
+            ttft = None
+            error = None
+            retry_after = None
+            current = ChatStreamParser()
+            try:
+                for delta in self._stream_from(backend.url, body, cancel_event, current):
+                    if ttft is None:
+                        ttft = time.time() - started
+                    now = time.perf_counter()
+                    if first is None:
+                        first = now
+                        METRICS.observe("model_ttft_seconds", now - call_start, profile=profile)
+                    else:
+                        METRICS.observe("model_inter_token_seconds", now - last, profile=profile)
+                    last = now
+                    deltas += 1
+                    yield delta
+                if ttft is None:
+                    ttft = time.time() - started
+                if parser is not None:
+                    parser.parts = current.parts
+                    parser.usage = current.usage
+                    parser.finish_reason = current.finish_reason
+                tokens = (current.usage or {}).get("completion_tokens") or deltas
+                # Reasoning-only output reports usage but yields no deltas.
+                if first is not None and tokens > 1 and last > first:
+                    METRICS.observe("model_output_tokens_per_second", (tokens - 1) / (last - first), profile=profile)
+                return
+            except Exception as exc:
+                error = exc
+                if not _retryable(exc):
+                    raise
+                status = _status(exc)
+                if status == 429:
+                    retry_after = _retry_after(exc) or 0.0
+                if ttft is not None or (cancel_event is not None and cancel_event.is_set()):
+                    raise
+            finally:
+                status = _status(error)
+                overloaded = isinstance(error, requests.Timeout) or (status is not None and (status >= 500 or status == 429))
+                self.backends.release(
+                    backend,
+                    ttft=ttft if error is None else None,
+                    ok=error is None,
+                    overloaded=overloaded,
+                    retry_after=retry_after,
+                    rejected=error is not None and not _retryable(error),
+                )
+            if len(tried) < len(self.backends.backends):
+                continue
+            if attempt >= self.retries:
+                raise error
+            delay = backoff_delay(attempt, self.retry_base, self.retry_cap, _retry_after(error))
+            attempt += 1
+            self.retry_count += 1
+            tried = []
+            if cancel_event is not None:
+                if cancel_event.wait(delay):
+                    return
+            else:
+                time.sleep(delay)
+
+    def _stream_from(self, url, body, cancel_event, parser):
+        with self.session.post(url, data=body, stream=True, timeout=self.timeout) as resp:
             resp.raise_for_status()
-            content = ""
-            for line in resp.iter_lines():
-                if not line or not line.startswith(b"data: "):
-                    continue
-                payload = line[6:]
-                if payload == b"[DONE]":
-                    break
-                try:
-                    import json
-                    chunk = json.loads(payload)
-                    delta = chunk["choices"][0]["delta"].get("content", "")
-                    if delta:
-                        content += delta
-                        yield delta
-                except Exception:
+            self._track(cancel_event, resp)
+            try:
+                for delta in iter_chat_deltas(resp.iter_content(chunk_size=None), parser):
+                    if cancel_event is not None and cancel_event.is_set():
+                        break
+                    yield delta
+            except Exception:
+                # abort() closes the response under the reader; that is not an error.
+                if cancel_event is None or not cancel_event.is_set():
+                    raise
+            finally:
+                self._untrack(cancel_event, resp)
+                self.last_response = parser.content
+                self.last_usage = parser.usage
+                self.last_finish_reason = parser.finish_reason
+
+    def _track(self, cancel_event, resp):
+        if cancel_event is None:
+            return
+        with self._inflight_lock:
+            self._inflight.setdefault(id(cancel_event), set()).add(resp)
+        if cancel_event.is_set():
+            resp.close()
+
+    def _untrack(self, cancel_event, resp):
+        if cancel_event is None:
+            return
+        with self._inflight_lock:
+            responses = self._inflight.get(id(cancel_event))
+            if responses is not None:
+                responses.discard(resp)
+                if not responses:
+                    del self._inflight[id(cancel_event)]
+
+    def abort(self, cancel_event):
+        """Set ``cancel_event`` and close every stream running under it.
+
+        Closing the response interrupts a read that is blocked waiting for the
+        next token, which checking the event between tokens cannot do.
+        """
+        cancel_event.set()
+        with self._inflight_lock:
+            responses = list(self._inflight.get(id(cancel_event), ()))
+        for resp in responses:
+            try:
+                resp.close()
+            except Exception:
+                pass
+
+    def connection_stats(self):
+        """Return opened connections vs. requests served across the session's pools."""
+        opened = 0
+        served = 0
+        for adapter in {id(a): a for a in self.session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
                     continue
-            self.last_response = content
+                opened += pool.num_connections
+                served += pool.num_requests
+        return {"opened": opened, "requests": served, "reused": max(served - opened, 0)}
+
+    def backend_stats(self):
+        return self.backends.stats()
+
+    def queue_stats(self):
+        """Admission queue depth and wait times, plus retries made so far."""
+        return dict(self.backends.queue_stats(), retries=self.retry_count)
+
+    def close(self):
+        self.backends.close()
+        self.session.close()
 
     def get_last_response(self):
         return self.last_response
@@ -0,0 +1,236 @@
+"""Spread model calls over several OpenAI-compatible servers.
+
+Every backend carries an EWMA of its time to first token, an EWMA error
+rate and a count of calls in flight. A call goes to the healthy backend
+with the lowest expected wait, ``(in_flight + 1) * ttft`` (backends not yet
+measured are assumed to be average). Failures are noticed passively: a
+backend whose call fails is taken out of rotation for a cooldown that
+doubles while it keeps failing. An active prober also polls the
+``/models`` endpoint of backends that are out and brings them back as
+soon as they answer; only a successful call resets the cooldown.
+
+Admission is AIMD per backend: a backend takes at most ``limit`` calls at
+once, the limit grows by ``1/limit`` after each successful call and halves
+when the backend answers 429, 5xx or times out. A 429 parks the backend
+for its ``Retry-After`` (if any) without counting as a failure.
+Calls that find every backend full wait in a priority queue, interactive
+work ahead of background summaries, first come first served within a
+priority; a waiter that can only use busy backends (a failover excluding
+the ones it already tried) does not block the waiters behind it.
+"""
+import itertools
+import threading
+import time
+
+DEFAULT_TTFT = 1.0
+EWMA_ALPHA = 0.3
+BASE_COOLDOWN = 2.0
+MAX_COOLDOWN = 60.0
+
+INTERACTIVE = 0
+BACKGROUND = 10
+
+
+def probe_url(api_url):
+    """The ``/models`` listing next to a ``/chat/completions`` endpoint."""
+    base, sep, _ = api_url.rpartition("/chat/completions")
+    return f"{base}/models" if sep else api_url
+
+
+class Backend:
+    def __init__(self, url, limit=4.0, max_limit=16.0):
+        self.url = url
+        self.limit = float(limit)
+        self.max_limit = float(max_limit)
+        self.in_flight = 0
+        self.ttft = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.down_until = 0.0
+        self.cooldown = BASE_COOLDOWN
+        self.calls = 0
+        self.throttled = 0
+
+    def has_room(self, claimed=0):
+        return self.in_flight + claimed < max(int(self.limit), 1)
+
+    def healthy(self, now=None):
+        return self.down_until <= (now or time.time())
+
+    def expected_wait(self, default_ttft=DEFAULT_TTFT):
+        ttft = default_ttft if self.ttft is None else self.ttft
+        return (self.in_flight + 1) * ttft * (1.0 + self.error_rate)
+
+
+class BackendPool:
+    """Pick, track and probe the backends behind one client."""
+
+    def __init__(self, urls, session=None, probe_interval=10.0, limit=4, max_limit=16):
+        self.backends = [Backend(url, limit, max(limit, max_limit)) for url in urls]
+        self.session = session
+        self.probe_interval = probe_interval
+        self._lock = threading.Condition()
+        self._waiters = {}
+        self._order = itertools.count()
+        self.admitted = 0
+        self.queued = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._stop = threading.Event()
+        self._prober = None
+        if session is not None and probe_interval > 0 and len(self.backends) > 1:
+            self._prober = threading.Thread(target=self._probe_loop, daemon=True, name="backend-probe")
+            self._prober.start()
+
+    def _pick(self, exclude, now, claimed):
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        if not candidates:
+            return None
+        healthy = [backend for backend in candidates if backend.healthy(now)]
+        if not healthy:
+            # Everything is cooling down: try whichever comes back first.
+            return min(candidates, key=lambda b: b.down_until)
+        ready = [backend for backend in healthy if backend.has_room(claimed.get(backend, 0))]
+        if not ready:
+            return None
+        measured = [b.ttft for b in self.backends if b.ttft is not None]
+        default = sum(measured) / len(measured) if measured else DEFAULT_TTFT
+        return min(ready, key=lambda b: b.expected_wait(default))
+
+    def _admit(self, ticket, now):
+        """The backend ``ticket`` may take now, once the waiters ahead have claimed theirs.
+
+        Waiters are served in priority order, but one whose ``exclude`` rules
+        out every free backend does not hold up those behind it.
+        """
+        claimed = {}
+        for other in sorted(self._waiters):
+            backend = self._pick(self._waiters[other], now, claimed)
+            if other == ticket:
+                return backend
+            if backend is not None:
+                claimed[backend] = claimed.get(backend, 0) + 1
+        return None
+
+    def acquire(self, exclude=(), priority=INTERACTIVE, cancel_event=None):
+        """Reserve the best backend not in ``exclude``, queueing while all are full.
+
+        Returns None when every backend has been tried or ``cancel_event``
+        is set while waiting.
+        """
+        with self._lock:
+            if all(backend in exclude for backend in self.backends):
+                return None
+            ticket = (priority, next(self._order))
+            self._waiters[ticket] = exclude
+            enqueued = time.time()
+            waited = False
+            try:
+                while True:
+                    backend = self._admit(ticket, time.time())
+                    if backend is not None:
+                        break
+                    if cancel_event is not None and cancel_event.is_set():
+                        return None
+                    if not waited:
+                        waited = True
+                        self.queued += 1
+                        self.max_depth = max(self.max_depth, len(self._waiters))
+                    # Wake periodically: cooldowns expire and cancels arrive without a notify.
+                    self._lock.wait(0.25)
+            finally:
+                del self._waiters[ticket]
+                self._lock.notify_all()
+            wait = time.time() - enqueued
+            self.admitted += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            backend.in_flight += 1
+            backend.calls += 1
+            return backend
+
+    def release(self, backend, ttft=None, ok=True, overloaded=False, retry_after=None, rejected=False):
+        """Record the outcome of a call started with ``acquire``.
+
+        ``overloaded`` marks a 429, 5xx or timeout, which halves the
+        backend's limit; a 429 (``retry_after`` set, 0 without the header)
+        only parks the backend for that long instead of ejecting it.
+        ``rejected`` marks a failure that is the request's fault (a 4xx):
+        it counts as an error but neither grows the limit nor ejects.
+        """
+        with self._lock:
+            self._lock.notify_all()
+            backend.in_flight = max(backend.in_flight - 1, 0)
+            backend.error_rate += EWMA_ALPHA * ((0.0 if ok else 1.0) - backend.error_rate)
+            if ttft is not None:
+                backend.ttft = ttft if backend.ttft is None else backend.ttft + EWMA_ALPHA * (ttft - backend.ttft)
+            if ok:
+                backend.limit = min(backend.limit + 1.0 / backend.limit, backend.max_limit)
+                self._mark_up(backend)
+                return
+            if rejected:
+                return
+            if overloaded:
+                backend.limit = max(backend.limit / 2, 1.0)
+            if retry_after is not None:
+                backend.throttled += 1
+                backend.down_until = max(backend.down_until, time.time() + retry_after)
+                return
+            backend.failures += 1
+            backend.down_until = time.time() + backend.cooldown
+            backend.cooldown = min(backend.cooldown * 2, MAX_COOLDOWN)
+
+    def _mark_up(self, backend):
+        backend.failures = 0
+        backend.down_until = 0.0
+        backend.cooldown = BASE_COOLDOWN
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.probe_interval):
+            with self._lock:
+                targets = [backend for backend in self.backends if not backend.healthy()]
+            for backend in targets:
+                try:
+                    resp = self.session.get(probe_url(backend.url), timeout=(2, 5))
+                    resp.close()
+                    alive = resp.status_code < 500
+                except Exception:
+                    alive = False
+                if alive:
+                    with self._lock:
+                        backend.down_until = 0.0
+                        self._lock.notify_all()
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "url": backend.url,
+                    "healthy": backend.healthy(now),
+                    "in_flight": backend.in_flight,
+                    "limit": round(backend.limit, 2),
+                    "ttft": backend.ttft,
+                    "error_rate": round(backend.error_rate, 3),
+                    "failures": backend.failures,
+                    "calls": backend.calls,
+                    "throttled": backend.throttled,
+                }
+                for backend in self.backends
+            ]
+
+    def queue_stats(self):
+        """Queue depth now and at its deepest, and how long admitted calls waited."""
+        with self._lock:
+            return {
+                "depth": len(self._waiters),
+                "max_depth": self.max_depth,
+                "queued": self.queued,
+                "admitted": self.admitted,
+                "wait_avg": self.wait_total / self.admitted if self.admitted else 0.0,
+                "wait_max": self.wait_max,
+            }
+
+    def close(self):
+        self._stop.set()
@@ -0,0 +1,132 @@
+"""Headless batch runs over a JSONL file of prompts.
+
+Each input line is either a JSON object with a ``prompt`` (or ``content``)
+and an optional ``id``, or a bare JSON string; blank lines are skipped and
+an item without an id is named after its line number. Lines are read
+lazily and handed to a fixed number of worker threads through a bounded
+queue, so a huge input never sits in memory.
+
+The output file doubles as the checkpoint: every finished item is appended
+as one JSON line and flushed before the next is taken. On a rerun, items
+that already have a successful record are skipped, and failed ones run
+again. A reader should take the last record for each id.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+def read_items(path):
+    """Yield ``(id, prompt, line_number)``; malformed lines yield a None prompt."""
+    with open(path, "r", encoding="utf-8") as handle:
+        for number, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                yield str(number), None, number
+                continue
+            if isinstance(item, str):
+                yield str(number), item, number
+            elif isinstance(item, dict):
+                prompt = item.get("prompt", item.get("content"))
+                yield str(item.get("id", number)), prompt if isinstance(prompt, str) else None, number
+            else:
+                yield str(number), None, number
+
+
+def completed_ids(path):
+    """Ids with a successful record in an existing results file."""
+    done = set()
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from an interrupted run.
+                    continue
+                if isinstance(record, dict) and "id" in record:
+                    if record.get("error"):
+                        done.discard(record["id"])
+                    else:
+                        done.add(record["id"])
+    except FileNotFoundError:
+        pass
+    return done
+
+
+class BatchRunner:
+    """Feed items to ``workers`` threads, each with its own ``process`` state.
+
+    ``make_worker()`` is called once per thread and returns a callable
+    ``prompt -> dict`` of result fields; the runner adds the id, line number,
+    latency and any error.
+    """
+
+    def __init__(self, make_worker, workers=4, on_result=None):
+        self.make_worker = make_worker
+        self.workers = max(int(workers), 1)
+        self.on_result = on_result
+        self.counts = {"done": 0, "failed": 0, "skipped": 0}
+        self._lock = threading.Lock()
+
+    def run(self, input_path, out_path):
+        skip = completed_ids(out_path)
+        inbox = queue.Queue(maxsize=self.workers * 2)
+        started = time.time()
+        with open(out_path, "a", encoding="utf-8") as out:
+            threads = [
+                threading.Thread(target=self._work, args=(inbox, out), daemon=True, name=f"batch-{n}")
+                for n in range(self.workers)
+            ]
+            for thread in threads:
+                thread.start()
+            try:
+                for item_id, prompt, number in read_items(input_path):
+                    if item_id in skip:
+                        self.counts["skipped"] += 1
+                        continue
+                    inbox.put((item_id, prompt, number))
+            finally:
+                for _ in threads:
+                    inbox.put(_DONE)
+                for thread in threads:
+                    thread.join()
+        return dict(self.counts, elapsed=time.time() - started)
+
+    def _work(self, inbox, out):
+        process = None
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                return
+            item_id, prompt, number = item
+            record = {"id": item_id, "line": number}
+            start = time.time()
+            try:
+                if prompt is None:
+                    raise ValueError("no prompt on this line")
+                if process is None:
+                    process = self.make_worker()
+                record.update(process(prompt))
+            except Exception as exc:
+                record["error"] = str(exc) or type(exc).__name__
+            record["latency"] = round(time.time() - start, 3)
+            self._write(out, record)
+
+    def _write(self, out, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            out.write(line)
+            out.flush()
+            os.fsync(out.fileno())
+            self.counts["failed" if record.get("error") else "done"] += 1
+            if self.on_result is not None:
+                self.on_result(record, dict(self.counts))
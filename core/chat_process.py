@@ -1,46 +1,67 @@
+import functools
 import json
-import re
+import queue
 import sys
+import threading
 import time
 
 from core.api import OpenAIClient
 from core.config import load_config
-from core.history import ConversationHistory
-from core.mcp import discover_mcp_tools, run_mcp_tool
+from core.frontend import build_executor, build_tool_cache, connection_debug_line, new_history, respond_with_tools, tool_cache_debug_line
+from core.mcp import add_mcp_tools
+from core.metrics import METRICS, format_summary, start_exporter
+from core.planner import build_plan_prompt, execute_plan, parse_plan
+from core.protocol import DeltaCoalescer, JsonLineWriter, new_request_id
+from core.router import Router
+from core.sessions import ChatSession, SessionRegistry
 from core.skills import list_skills, load_skill, save_skill
+from core.summarizer import BackgroundSummarizer
 from core.system_prompt import seed_history_with_system_prompts
 from core.tool_loader import load_tools
 
 
 def _load_all_tools():
-    tools = load_tools()
-    mcp_tools = discover_mcp_tools()
-    for name, description in mcp_tools.items():
-        tools[name] = {
-            "run": lambda arguments, n=name: run_mcp_tool(n, arguments),
-            "description": f"(MCP) {description}",
-        }
-    return tools
+    return add_mcp_tools(load_tools())
 
 
 def _format_tools(tools):
     return "\n".join([f"- {name}: {meta['description']}" for name, meta in tools.items()])
 
 
-def _collect_response(client, history, on_chunk=None):
+def _collect_response(client, history, on_chunk=None, use_cache=False, cancel_event=None, profile="chat"):
     start = time.time()
-    response = ""
-    for chunk in client.stream_chat(history.get_messages()):
-        response += chunk
+    parts = []
+    for chunk in client.stream_chat(history.get_messages(), cancel_event=cancel_event, use_cache=use_cache, profile=profile):
+        parts.append(chunk)
         if on_chunk:
             on_chunk(chunk)
     elapsed = time.time() - start
-    return response, elapsed
+    METRICS.observe("stage_seconds", elapsed, stage=profile)
+    return "".join(parts), elapsed
 
 
-def _send(payload):
-    sys.stdout.write(json.dumps(payload) + "\n")
-    sys.stdout.flush()
+def _metrics_payload(shared, fmt=None):
+    """Reply to the ``metrics`` action: a snapshot, or Prometheus text with ``format: "prometheus"``."""
+    if fmt == "prometheus":
+        return {"type": "metrics", "format": "prometheus", "content": METRICS.prometheus()}
+    snapshot = METRICS.snapshot()
+    client = shared["client"]
+    snapshot["queue"] = client.queue_stats()
+    snapshot["backends"] = client.backend_stats()
+    if shared.get("tool_cache") is not None:
+        snapshot["tool_cache"] = shared["tool_cache"].stats()
+    return {"type": "metrics", "metrics": snapshot, "content": "\n".join(format_summary(snapshot)) or "No metrics recorded yet."}
+
+
+_writer = JsonLineWriter(sys.stdout)
+
+
+def _send(payload, request_id=None, session_id=None, writer=None):
+    if request_id is not None:
+        payload = dict(payload, request_id=request_id)
+    if session_id is not None:
+        payload = dict(payload, session_id=session_id)
+    (writer or _writer).send(payload)
 
 
 def _handle_skill(skill_name, history, client, debug_metrics, debug_lines):
@@ -51,7 +72,7 @@ def _handle_skill(skill_name, history, client, debug_metrics, debug_lines):
     for index, step in enumerate(skill.get("steps", []), start=1):
         result_lines.append(f"[Skill Step {index}] {step}")
         history.add_user_message(f"Skill step: {step}")
-        step_response, elapsed = _collect_response(client, history)
+        step_response, elapsed = _collect_response(client, history, use_cache=True, profile="skill")
         history.add_assistant_message(step_response)
         result_lines.append(step_response.strip())
         if debug_metrics:
@@ -60,163 +81,340 @@ def _handle_skill(skill_name, history, client, debug_metrics, debug_lines):
     return "\n".join(result_lines)
 
 
-def main():
-    config = load_config()
-    client = OpenAIClient(config)
-    history = ConversationHistory()
-    tools = _load_all_tools()
+def _coalescer(config, reply, request_id):
+    return DeltaCoalescer(
+        reply,
+        request_id,
+        interval=config.get("stream_interval", 0.05),
+        max_chars=config.get("stream_max_chars", 512),
+    )
+
+
+def _handle_message(shared, session, user_input, reply, request_id, stream):
+    """Answer one chat message in ``session``. Returns False when the session should end."""
+    config = shared["config"]
+    client = shared["client"]
+    history = session.history
+    executor = session.executor
+    tools = session.tools
+    debug_metrics = session.debug_metrics
+
+    if user_input.lower() in {"exit", "quit"}:
+        reply({"type": "notification", "content": "Session closed."})
+        return False
+
+    debug_lines = []
+    aux_messages = []
+
+    # Command handling similar to CLI shortcuts
+    if user_input == "!tools":
+        aux_messages.append(_format_tools(tools) or "No tools available.")
+        reply({"type": "assistant", "content": "\n".join(aux_messages), "debug": debug_lines})
+        return True
+    if user_input == "!skills":
+        skills = list_skills()
+        if not skills:
+            aux_messages.append("No skills found.")
+        else:
+            aux_messages.extend([f"- {skill['name']}: {skill.get('description', '')}" for skill in skills])
+        reply({"type": "assistant", "content": "\n".join(aux_messages), "debug": debug_lines})
+        return True
+    if user_input == "!new":
+        session.history = history = new_history(config, shared["summarizer"])
+        session.tools = executor.tools = tools = _load_all_tools()
+        seed_history_with_system_prompts(history, tools)
+        aux_messages.append("[History cleared]")
+        reply({"type": "assistant", "content": "\n".join(aux_messages), "debug": debug_lines})
+        return True
+    if user_input == "!debug":
+        session.debug_metrics = debug_metrics = not debug_metrics
+        reply({"type": "notification", "content": f"Debug metrics {'enabled' if debug_metrics else 'disabled'}.", "debug": debug_metrics})
+        return True
+    if user_input.startswith("!run "):
+        response_text = _handle_skill(user_input[5:].strip(), history, client, debug_metrics, debug_lines)
+        reply({"type": "assistant", "content": response_text, "debug": debug_lines})
+        return True
+    if user_input.startswith("!save_skill "):
+        try:
+            payload = user_input[len("!save_skill "):]
+            name, desc, steps = payload.split("|", 2)
+            steps_list = [step.strip() for step in steps.split(";") if step.strip()]
+            save_skill(name.strip(), desc.strip(), steps_list)
+            aux_messages.append(f"Skill '{name.strip()}' saved.")
+        except Exception as exc:
+            aux_messages.append(f"Failed to save skill: {exc}")
+        reply({"type": "assistant", "content": "\n".join(aux_messages), "debug": debug_lines})
+        return True
+    if user_input.startswith("!"):
+        parts = user_input[1:].split(maxsplit=1)
+        toolname = parts[0]
+        toolarg = parts[1] if len(parts) > 1 else ""
+        result = executor.call(toolname, toolarg)
+        reply({"type": "assistant", "content": result, "debug": debug_lines})
+        return True
+
+    history.add_user_message(user_input)
+
+    coalescer = _coalescer(config, reply, request_id) if stream else None
+    on_chunk = coalescer.add if coalescer else None
+
+    route = shared["router"].route(
+        user_input, history.get_messages(), cancel_event=executor.cancel_event, on_chunk=on_chunk
+    )
+    if debug_metrics:
+        debug_lines.append(f"[DEBUG] Router: {route['decision']} via {route['source']} ({route['elapsed']:.2f}s)")
+
+    if route["decision"] == "plan":
+        plan_prompt = build_plan_prompt(config.get("chain_limit", 25))
+        history.add_user_message(plan_prompt)
+        plan_response, plan_elapsed = _collect_response(client, history, cancel_event=executor.cancel_event, profile="plan")
+        if debug_metrics:
+            debug_lines.append(f"[DEBUG] Planning time: {plan_elapsed:.2f}s")
+        steps = parse_plan(plan_response, config.get("chain_limit", 25))
+        if executor.cancelled:
+            reply({"type": "assistant", "content": "", "debug": debug_lines, "extras": ["[Request cancelled.]"]})
+            return True
+        if not steps:
+            aux_messages.append("[No plan steps found. Try rephrasing your request.]")
+            reply({"type": "assistant", "content": "\n".join(aux_messages), "debug": debug_lines})
+            return True
+        t_chain_start = time.time()
+        on_step_start = on_step_end = None
+        if stream:
+            def on_step_start(step):
+                reply({"type": "step_started", "step": step["id"], "task": step["task"]})
+
+            def on_step_end(step, response, elapsed):
+                reply({"type": "step_finished", "step": step["id"], "task": step["task"], "content": response.strip(), "elapsed": elapsed})
+        chain_history = execute_plan(
+            client,
+            history,
+            steps,
+            config.get("plan_workers", 4),
+            executor=executor,
+            max_rounds=config.get("tool_rounds", 5),
+            on_step_start=on_step_start,
+            on_step_end=on_step_end,
+        )
+        if debug_metrics:
+            for entry in chain_history:
+                debug_lines.append(f"[DEBUG] Step {entry['id']} time: {entry['elapsed']:.2f}s")
+        t_chain_end = time.time()
+        if executor.cancelled:
+            if coalescer:
+                coalescer.close()
+            reply({
+                "type": "assistant",
+                "content": "\n".join(f"Step {entry['id']}: {entry['response']}" for entry in chain_history),
+                "debug": debug_lines,
+                "extras": aux_messages + ["[Request cancelled.]"]
+            })
+            return True
+        summary_prompt = (
+            f"Provide a response that is appropriate based on the user's prompt: '{user_input}'.\n"
+            "Knowing these Steps and results:\n" +
+            "\n".join([f"Step: {entry['step']}\nResult: {entry['response']}" for entry in chain_history])
+        )
+        history.add_user_message(summary_prompt)
+        summary_response, summary_elapsed = _collect_response(
+            client, history, on_chunk=on_chunk, cancel_event=executor.cancel_event, profile="summary"
+        )
+        if coalescer:
+            coalescer.close()
+        if debug_metrics:
+            debug_lines.append(f"[DEBUG] Chain steps: {len(chain_history)} | Chain time: {t_chain_end - t_chain_start:.2f}s")
+            debug_lines.append(f"[DEBUG] Summary time: {summary_elapsed:.2f}s")
+            debug_lines.append(connection_debug_line(client))
+            if executor.cache is not None:
+                debug_lines.append(tool_cache_debug_line(executor.cache))
+        reply({
+            "type": "assistant",
+            "content": summary_response.strip(),
+            "debug": debug_lines,
+            "extras": aux_messages + ["[Chain complete. Returning to chat.]"]
+        })
+    else:
+        if coalescer and route["response"] is not None and not route["streamed"]:
+            coalescer.add(route["response"])
+        direct_response, direct_elapsed, tool_calls = respond_with_tools(
+            client, history, executor, config, initial_reply=route["response"], on_chunk=on_chunk
+        )
+        if coalescer:
+            coalescer.close()
+        if executor.cancelled:
+            aux_messages.append("[Request cancelled.]")
+        if route["response"] is not None:
+            direct_elapsed += route["elapsed"]
+        if debug_metrics:
+            debug_lines.append(f"[DEBUG] Response time: {direct_elapsed:.2f}s")
+            if tool_calls:
+                debug_lines.append(f"[DEBUG] Tool calls: {tool_calls}")
+            debug_lines.append(connection_debug_line(client))
+            if executor.cache is not None:
+                debug_lines.append(tool_cache_debug_line(executor.cache))
+        reply({"type": "assistant", "content": direct_response.strip(), "debug": debug_lines, "extras": aux_messages})
+    return True
+
+
+def _new_session(shared, session_id):
+    config = shared["config"]
+    history = new_history(config, shared["summarizer"])
+    tools = shared["tools"]
     seed_history_with_system_prompts(history, tools)
-    debug_metrics = config.get("debug_metrics", False)
+    return ChatSession(
+        session_id,
+        history,
+        build_executor(tools, config, shared.get("tool_cache")),
+        tools,
+        client=shared["client"],
+        debug_metrics=config.get("debug_metrics", False),
+    )
+
+
+def build_shared(config=None):
+    """Build the state every session shares: client, router, summarizer, tools and tool cache."""
+    config = config or load_config()
+    client = OpenAIClient(config)
+    start_exporter(config)
+    return {
+        "config": config,
+        "client": client,
+        "router": Router(client, mode=config.get("router_mode", "local")),
+        "summarizer": BackgroundSummarizer(client) if config.get("async_summaries", True) else None,
+        "tools": _load_all_tools(),
+        "tool_cache": build_tool_cache(config),
+    }
 
-    _send({"type": "ready", "debug": debug_metrics})
 
+def build_registry(shared, spares=0):
+    return SessionRegistry(
+        functools.partial(_new_session, shared),
+        max_workers=shared["config"].get("session_workers", 8),
+        spares=spares,
+    )
+
+
+def read_lines(stream, inbox):
+    for line in stream:
+        inbox.put(line)
+    inbox.put(None)
+
+
+def _run_request(shared, on_exit, user_input, reply, request_id, stream, session):
+    start = time.time()
+    keep_running = True
+    try:
+        keep_running = _handle_message(shared, session, user_input, reply, request_id, stream)
+    except Exception as exc:
+        reply({"type": "error", "content": f"Request failed: {exc}"})
+    METRICS.observe("request_seconds", time.time() - start)
+    if stream:
+        reply({"type": "done", "elapsed": time.time() - start})
+    if not keep_running:
+        on_exit(session)
+
+
+def _skip_request(reply, stream):
+    reply({"type": "notification", "content": "Request cancelled before it started."})
+    if stream:
+        reply({"type": "done", "elapsed": 0.0})
+
+
+def serve(shared, registry, inbox, writer=None, namespace="", on_exit=None):
+    """Handle protocol lines from ``inbox`` until it yields None or a shutdown.
+
+    Session and request ids are prefixed with ``namespace`` inside the
+    registry so several clients can share one. ``on_exit(session)`` runs when
+    a user types exit/quit (by default the session is closed). Returns True
+    when the client asked for a shutdown.
+    """
+    send = functools.partial(_send, writer=writer)
+    on_exit = on_exit or (lambda session: registry.close(session.id))
     while True:
-        line = sys.stdin.readline()
-        if not line:
-            break
+        line = inbox.get()
+        if line is None:
+            return False
         line = line.strip()
         if not line:
             continue
         try:
             request = json.loads(line)
         except json.JSONDecodeError:
-            _send({"type": "error", "content": "Invalid JSON input."})
+            send({"type": "error", "content": "Invalid JSON input."})
             continue
 
         action = request.get("type")
+        request_id = request.get("request_id") or request.get("id")
+        session_key = namespace + (request.get("session_id") or "default")
+        reply = functools.partial(send, request_id=request_id, session_id=request.get("session_id"))
         if action == "shutdown":
-            _send({"type": "notification", "content": "Shutting down."})
-            break
-        if action == "toggle_debug":
-            debug_metrics = not debug_metrics
-            _send({"type": "notification", "content": f"Debug metrics {'enabled' if debug_metrics else 'disabled'}.", "debug": debug_metrics})
-            continue
-        if action == "message":
-            user_input = request.get("content", "")
-            if not user_input:
-                _send({"type": "error", "content": "Empty message."})
-                continue
-        else:
-            _send({"type": "error", "content": f"Unknown action '{action}'."})
-            continue
-
-        if user_input.lower() in {"exit", "quit"}:
-            _send({"type": "notification", "content": "Session closed."})
-            break
-
-        debug_lines = []
-        aux_messages = []
-
-        # Command handling similar to CLI shortcuts
-        if user_input == "!tools":
-            aux_messages.append(_format_tools(tools) or "No tools available.")
-            _send({"type": "assistant", "content": "\n".join(aux_messages), "debug": debug_lines})
-            continue
-        if user_input == "!skills":
-            skills = list_skills()
-            if not skills:
-                aux_messages.append("No skills found.")
+            reply({"type": "notification", "content": "Shutting down."})
+            return True
+        if action == "cancel":
+            # ``request_id`` names the request to cancel; without one the whole
+            # session is cancelled.
+            if request_id:
+                cancelled = registry.cancel(request_id=namespace + request_id)
             else:
-                aux_messages.extend([f"- {skill['name']}: {skill.get('description', '')}" for skill in skills])
-            _send({"type": "assistant", "content": "\n".join(aux_messages), "debug": debug_lines})
+                cancelled = registry.cancel(session_id=session_key)
+            if cancelled:
+                reply({"type": "notification", "content": "Cancelling."})
+            else:
+                reply({"type": "error", "content": "Nothing to cancel."})
             continue
-        if user_input == "!new":
-            history = ConversationHistory()
-            tools = _load_all_tools()
-            seed_history_with_system_prompts(history, tools)
-            aux_messages.append("[History cleared]")
-            _send({"type": "assistant", "content": "\n".join(aux_messages), "debug": debug_lines})
+        if action == "close_session":
+            registry.close(session_key)
+            reply({"type": "notification", "content": "Session closed."})
             continue
-        if user_input == "!debug":
-            debug_metrics = not debug_metrics
-            _send({"type": "notification", "content": f"Debug metrics {'enabled' if debug_metrics else 'disabled'}.", "debug": debug_metrics})
+        if action == "metrics":
+            reply(_metrics_payload(shared, request.get("format")))
             continue
-        if user_input.startswith("!run "):
-            response_text = _handle_skill(user_input[5:].strip(), history, client, debug_metrics, debug_lines)
-            _send({"type": "assistant", "content": response_text, "debug": debug_lines})
+        if action == "toggle_debug":
+            session = registry.get(session_key)
+            session.debug_metrics = not session.debug_metrics
+            reply({"type": "notification", "content": f"Debug metrics {'enabled' if session.debug_metrics else 'disabled'}.", "debug": session.debug_metrics})
             continue
-        if user_input.startswith("!save_skill "):
-            try:
-                payload = user_input[len("!save_skill "):]
-                name, desc, steps = payload.split("|", 2)
-                steps_list = [step.strip() for step in steps.split(";") if step.strip()]
-                save_skill(name.strip(), desc.strip(), steps_list)
-                aux_messages.append(f"Skill '{name.strip()}' saved.")
-            except Exception as exc:
-                aux_messages.append(f"Failed to save skill: {exc}")
-            _send({"type": "assistant", "content": "\n".join(aux_messages), "debug": debug_lines})
+        if action != "message":
+            reply({"type": "error", "content": f"Unknown action '{action}'."})
             continue
-        if user_input.startswith("!"):
-            parts = user_input[1:].split(maxsplit=1)
-            toolname = parts[0]
-            toolarg = parts[1] if len(parts) > 1 else ""
-            if toolname in tools:
-                try:
-                    result = tools[toolname]["run"](toolarg)
-                except Exception as exc:
-                    result = f"Tool '{toolname}' failed: {exc}"
-            else:
-                result = f"Tool '{toolname}' not found."
-            _send({"type": "assistant", "content": str(result), "debug": debug_lines})
+        user_input = request.get("content", "")
+        if not user_input:
+            reply({"type": "error", "content": "Empty message."})
             continue
 
-        history.add_user_message(user_input)
-
-        router_prompt = (
-            "Does the following user request require a multi-step plan (tools/actions) or can it be answered directly? "
-            "Reply with 'plan' or 'respond'. Request: '" + user_input + "'"
+        request_id = request_id or new_request_id()
+        reply = functools.partial(send, request_id=request_id, session_id=request.get("session_id"))
+        stream = bool(request.get("stream"))
+        registry.submit(
+            session_key,
+            namespace + request_id,
+            functools.partial(_run_request, shared, on_exit, user_input, reply, request_id, stream),
+            on_skip=functools.partial(_skip_request, reply, stream),
         )
-        history.add_user_message(router_prompt)
-        router_response, _ = _collect_response(client, history)
-        decision = router_response.strip().lower()
-        if history.memory[0] and history.memory[0][-1]["role"] == "user" and router_prompt in history.memory[0][-1]["content"]:
-            history.memory[0].pop()
-
-        if "plan" in decision:
-            plan_prompt = (
-                "Given the user's request, break it down into a numbered list of concrete steps (tools or actions) to achieve the goal. "
-                f"Only plan up to {config.get('chain_limit', 25)} steps. Respond with the plan as a numbered list."
-            )
-            history.add_user_message(plan_prompt)
-            plan_response, plan_elapsed = _collect_response(client, history)
-            if debug_metrics:
-                debug_lines.append(f"[DEBUG] Planning time: {plan_elapsed:.2f}s")
-            steps = re.findall(r"\d+\.\s*(.*)", plan_response)
-            if not steps:
-                aux_messages.append("[No plan steps found. Try rephrasing your request.]")
-                _send({"type": "assistant", "content": "\n".join(aux_messages), "debug": debug_lines})
-                continue
-            chain_history = []
-            t_chain_start = time.time()
-            for step in steps[: config.get("chain_limit", 25)]:
-                history.add_user_message(f"Step: {step}")
-                step_response, step_elapsed = _collect_response(client, history)
-                history.add_assistant_message(step_response)
-                chain_history.append({"step": step, "response": step_response.strip()})
-                if debug_metrics:
-                    debug_lines.append(f"[DEBUG] Step time: {step_elapsed:.2f}s")
-            t_chain_end = time.time()
-            summary_prompt = (
-                f"Provide a response that is appropriate based on the user's prompt: '{user_input}'.\n"
-                "Knowing these Steps and results:\n" +
-                "\n".join([f"Step: {entry['step']}\nResult: {entry['response']}" for entry in chain_history])
-            )
-            history.add_user_message(summary_prompt)
-            summary_response, summary_elapsed = _collect_response(client, history)
-            if debug_metrics:
-                debug_lines.append(f"[DEBUG] Chain steps: {len(chain_history)} | Chain time: {t_chain_end - t_chain_start:.2f}s")
-                debug_lines.append(f"[DEBUG] Summary time: {summary_elapsed:.2f}s")
-            _send({
-                "type": "assistant",
-                "content": summary_response.strip(),
-                "debug": debug_lines,
-                "extras": aux_messages + ["[Chain complete. Returning to chat.]"]
-            })
+
+
+def main():
+    shared = build_shared()
+    registry = build_registry(shared)
+    # Requests without a session id share the default session, which keeps
+    # single-chat clients working as before.
+    registry.get("default")
+
+    _send({"type": "ready", "debug": shared["config"].get("debug_metrics", False)})
+
+    # stdin is read on its own thread so a long request never blocks the
+    # next one (or a cancel) from being picked up.
+    inbox = queue.Queue()
+    threading.Thread(target=read_lines, args=(sys.stdin, inbox), daemon=True).start()
+
+    def on_exit(session):
+        if session.id == "default":
+            inbox.put(None)
         else:
-            direct_response, direct_elapsed = _collect_response(client, history)
-            if debug_metrics:
-                debug_lines.append(f"[DEBUG] Response time: {direct_elapsed:.2f}s")
-            _send({"type": "assistant", "content": direct_response.strip(), "debug": debug_lines, "extras": aux_messages})
+            registry.close(session.id)
+
+    shutdown = serve(shared, registry, inbox, on_exit=on_exit)
+    registry.shutdown(cancel=shutdown)
 
 
 if __name__ == "__main__":
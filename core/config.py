@@ -5,11 +5,67 @@ def _parse_bool(value, default=False):
         return default
     return value.strip().lower() in {"1", "true", "yes", "on"}
 
+def _parse_limits(value):
+    limits = {}
+    for item in (value or "").split(","):
+        name, _, limit = item.partition("=")
+        if name.strip() and limit.strip().isdigit():
+            limits[name.strip()] = int(limit)
+    return limits
+
+def _profile_overrides(environ):
+    prefix = "LLM_PROFILE_"
+    return {key[len(prefix):].lower(): value for key, value in environ.items() if key.startswith(prefix) and value.strip()}
+
+def cache_dir():
+    path = os.environ.get("CODEX_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "codex-agent")
+    os.makedirs(path, exist_ok=True)
+    return path
+
 def load_config():
     return {
         "api_url": os.environ.get("OPENAI_API_URL", "http://apple.stephensdev.com:11434/v1/chat/completions"),
+        "api_urls": [url.strip() for url in os.environ.get("OPENAI_API_URLS", "").split(",") if url.strip()],
+        "backend_probe_interval": float(os.environ.get("LLM_BACKEND_PROBE", 10)),
+        "backend_concurrency": int(os.environ.get("LLM_BACKEND_CONCURRENCY", 4)),
+        "backend_max_concurrency": int(os.environ.get("LLM_BACKEND_MAX_CONCURRENCY", 16)),
+        "retries": int(os.environ.get("LLM_RETRIES", 3)),
+        "retry_base_delay": float(os.environ.get("LLM_RETRY_BASE_DELAY", 0.5)),
+        "retry_max_delay": float(os.environ.get("LLM_RETRY_MAX_DELAY", 30)),
         "api_key": os.environ.get("OPENAI_API_KEY", "sk-xxx"),
         "model": os.environ.get("OPENAI_MODEL", "qwen3:8b"),
+        "fast_model": os.environ.get("LLM_FAST_MODEL", "").strip(),
+        "profiles_file": os.environ.get("LLM_PROFILES_FILE", "").strip(),
+        "profile_overrides": _profile_overrides(os.environ),
+        "pool_size": int(os.environ.get("LLM_POOL_SIZE", 4)),
+        "connect_timeout": float(os.environ.get("LLM_CONNECT_TIMEOUT", 5)),
+        "read_timeout": float(os.environ.get("LLM_READ_TIMEOUT", 300)),
+        "router_mode": os.environ.get("LLM_ROUTER_MODE", "local").strip().lower(),
+        "plan_workers": int(os.environ.get("LLM_PLAN_WORKERS", 4)),
+        "session_workers": int(os.environ.get("LLM_SESSION_WORKERS", 8)),
+        "batch_workers": int(os.environ.get("LLM_BATCH_WORKERS", 4)),
+        "daemon_port": int(os.environ.get("LLM_DAEMON_PORT", 0)),
+        "daemon_idle": float(os.environ.get("LLM_DAEMON_IDLE", 1800)),
+        "daemon_spares": int(os.environ.get("LLM_DAEMON_SPARES", 1)),
+        "tool_workers": int(os.environ.get("LLM_TOOL_WORKERS", 8)),
+        "tool_timeout": float(os.environ.get("LLM_TOOL_TIMEOUT", 60)),
+        "tool_cache": _parse_bool(os.environ.get("LLM_TOOL_CACHE"), default=True),
+        "tool_cache_entries": int(os.environ.get("LLM_TOOL_CACHE_ENTRIES", 256)),
+        "tool_rounds": int(os.environ.get("LLM_TOOL_ROUNDS", 5)),
+        "tool_default_concurrency": int(os.environ.get("LLM_TOOL_DEFAULT_CONCURRENCY", 4)),
+        "tool_concurrency": _parse_limits(os.environ.get("LLM_TOOL_CONCURRENCY", "run_in_terminal=1,shell=1,run=1,test=1,commit=1,revert=1")),
+        "terminal_timeout": float(os.environ.get("LLM_TERMINAL_TIMEOUT", 30)),
+        "terminal_buffer_kb": int(os.environ.get("LLM_TERMINAL_BUFFER_KB", 1024)),
+        "context_tokens": int(os.environ.get("LLM_CONTEXT_TOKENS", 8192)),
+        "tokenizer": os.environ.get("LLM_TOKENIZER", "approx").strip().lower(),
+        "async_summaries": _parse_bool(os.environ.get("LLM_ASYNC_SUMMARIES"), default=True),
+        "response_cache": os.environ.get("LLM_RESPONSE_CACHE", "off").strip().lower(),
+        "response_cache_mb": int(os.environ.get("LLM_RESPONSE_CACHE_MB", 64)),
+        "response_cache_ttl": float(os.environ.get("LLM_RESPONSE_CACHE_TTL", 7 * 24 * 3600)),
+        "stream_interval": float(os.environ.get("LLM_STREAM_INTERVAL", 0.05)),
+        "stream_max_chars": int(os.environ.get("LLM_STREAM_MAX_CHARS", 512)),
         "chain_limit": int(os.environ.get("LLM_CHAIN_LIMIT", os.environ.get("CHAIN_LIMIT", 25))),
         "debug_metrics": _parse_bool(os.environ.get("LLM_DEBUG_METRICS"), default=True),
+        "metrics_file": os.environ.get("LLM_METRICS_FILE", "").strip(),
+        "metrics_interval": float(os.environ.get("LLM_METRICS_INTERVAL", 15)),
     }
@@ -0,0 +1,326 @@
+"""Long-lived agent process shared by editor clients.
+
+``python -m core.daemon serve`` keeps the model client, tools and MCP
+discovery warm and speaks the chat_process JSON-lines protocol over a Unix
+domain socket (localhost TCP where those are unavailable). Editors run
+``python -m core.daemon attach``, which starts the daemon if needed and
+relays stdin/stdout, so it is a drop-in replacement for
+``python -m core.chat_process``.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import queue
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from core.config import cache_dir, load_config
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def _workspace_key():
+    return hashlib.sha256(os.path.abspath(os.getcwd()).encode("utf-8")).hexdigest()[:12]
+
+
+def _state_path():
+    # One daemon per workspace: tools act on the directory it was started in.
+    return os.path.join(cache_dir(), f"daemon-{_workspace_key()}.json")
+
+
+def _lock_path():
+    return os.path.join(cache_dir(), f"daemon-{_workspace_key()}.lock")
+
+
+def _try_lock():
+    """Take the workspace's daemon lock without blocking; the open file, or None if it is held.
+
+    The serving daemon holds it for its whole life, so only one process can
+    bind the socket and write the state file; the OS drops it when the
+    holder dies.
+    """
+    handle = open(_lock_path(), "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def _write_state(state):
+    path = _state_path()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as handle:
+        json.dump(state, handle)
+    os.replace(tmp, path)
+
+
+def _read_state():
+    try:
+        with open(_state_path(), "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def _listen(port=0):
+    if hasattr(socket, "AF_UNIX") and not port:
+        path = os.path.join(cache_dir(), f"agent-{_workspace_key()}.sock")
+        if os.path.exists(path):
+            os.unlink(path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        os.chmod(path, 0o600)
+        address = {"family": "unix", "path": path}
+    else:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(("127.0.0.1", port))
+        address = {"family": "tcp", "host": "127.0.0.1", "port": server.getsockname()[1]}
+    server.listen(16)
+    return server, address
+
+
+def _connect(state, timeout=2.0):
+    if state["family"] == "unix":
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        target = state["path"]
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        target = (state["host"], state["port"])
+    sock.settimeout(timeout)
+    try:
+        sock.connect(target)
+    except OSError:
+        sock.close()
+        raise
+    sock.settimeout(None)
+    return sock
+
+
+class AgentDaemon:
+    """Serve many clients from one warm process.
+
+    Each connection attaches with the token from the state file and an
+    optional ``client_id``; its sessions live under that id, so a client that
+    reconnects with the same id gets its conversations back. Sessions idle
+    for ``idle_timeout`` seconds are evicted, and ``spares`` sessions are
+    kept ready so a new chat starts without setup.
+    """
+
+    def __init__(self, port=0, idle_timeout=1800.0, spares=1):
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.spares = spares
+        self.token = secrets.token_hex(16)
+        self._connections = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def serve_forever(self):
+        lock = _try_lock()
+        if lock is None:
+            return False  # another daemon serves (or is starting for) this workspace
+        try:
+            self._serve()
+        finally:
+            lock.close()
+        return True
+
+    def _serve(self):
+        from core.chat_process import build_registry, build_shared
+
+        self.shared = build_shared()
+        self.registry = build_registry(self.shared, spares=self.spares)
+        # Only the lock holder gets here, so a leftover socket file is safe to replace.
+        server, address = _listen(self.port)
+        _write_state(dict(address, token=self.token, pid=os.getpid(), started=time.time()))
+        threading.Thread(target=self._reap, daemon=True).start()
+        try:
+            while not self._stopping.is_set():
+                conn, _ = server.accept()
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self._stopping.set()
+            server.close()
+            state = _read_state()
+            if state and state.get("pid") == os.getpid():
+                os.unlink(_state_path())
+                if address["family"] == "unix" and os.path.exists(address["path"]):
+                    os.unlink(address["path"])
+            self.registry.shutdown(cancel=True)
+
+    def _reap(self):
+        interval = max(min(self.idle_timeout / 4, 60.0), 1.0)
+        while not self._stopping.wait(interval):
+            self.registry.evict_idle(self.idle_timeout)
+
+    def _handle(self, conn):
+        from core.chat_process import read_lines, serve
+        from core.protocol import JsonLineWriter
+
+        rfile = conn.makefile("r", encoding="utf-8", newline="\n")
+        writer = JsonLineWriter(conn.makefile("w", encoding="utf-8"))
+        try:
+            try:
+                hello = json.loads(rfile.readline() or "{}")
+            except ValueError:
+                hello = {}
+            if hello.get("type") != "attach" or not hmac.compare_digest(str(hello.get("token", "")), self.token):
+                writer.send({"type": "error", "content": "Attach with the daemon token first."})
+                return
+            with self._lock:
+                self._connections += 1
+                client_id = hello.get("client_id") or f"conn{self._connections}"
+            namespace = f"{client_id}/"
+            writer.send({"type": "ready", "debug": self.shared["config"].get("debug_metrics", False)})
+            inbox = queue.Queue()
+            threading.Thread(target=read_lines, args=(rfile, inbox), daemon=True).start()
+            if serve(self.shared, self.registry, inbox, writer, namespace=namespace):
+                # A client's shutdown only stops its own work, not the daemon.
+                for session in self.registry.sessions():
+                    if session.id.startswith(namespace):
+                        self.registry.cancel(session_id=session.id)
+            while self.registry.busy(namespace):
+                time.sleep(0.05)
+        except OSError:
+            pass
+        finally:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+
+def _spawn_daemon():
+    log = open(os.path.join(cache_dir(), f"daemon-{_workspace_key()}.log"), "ab")
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    subprocess.Popen(
+        [sys.executable, "-u", "-m", "core.daemon", "serve"],
+        stdin=subprocess.DEVNULL,
+        stdout=log,
+        stderr=log,
+        env=env,
+        **kwargs,
+    )
+    log.close()
+
+
+def _open_connection(start=True, timeout=30.0):
+    state = _read_state()
+    if state:
+        try:
+            return _connect(state), state
+        except OSError:
+            pass
+    if not start:
+        raise ConnectionError("No agent daemon is running.")
+    # A held lock means a daemon is already starting: wait for it instead.
+    probe = _try_lock()
+    if probe is not None:
+        probe.close()
+        _spawn_daemon()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        time.sleep(0.1)
+        state = _read_state()
+        if not state:
+            continue
+        try:
+            return _connect(state), state
+        except OSError:
+            continue
+    raise ConnectionError("Timed out waiting for the agent daemon to start.")
+
+
+def attach(client_id=None, start=True):
+    """Relay stdin/stdout to the daemon, starting it first if necessary."""
+    try:
+        sock, state = _open_connection(start=start)
+    except ConnectionError as exc:
+        sys.stdout.write(json.dumps({"type": "error", "content": str(exc)}) + "\n")
+        sys.stdout.flush()
+        return 1
+    hello = {"type": "attach", "token": state["token"], "client_id": client_id}
+    sock.sendall((json.dumps(hello) + "\n").encode("utf-8"))
+
+    def _pump_out():
+        out = sys.stdout.buffer
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            out.write(data)
+            out.flush()
+
+    reader = threading.Thread(target=_pump_out, daemon=True)
+    reader.start()
+    try:
+        for line in sys.stdin.buffer:
+            sock.sendall(line)
+        sock.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
+    reader.join()
+    sock.close()
+    return 0
+
+
+def stop():
+    state = _read_state()
+    if not state:
+        return 1
+    try:
+        os.kill(state["pid"], signal.SIGTERM)
+    except OSError:
+        return 1
+    return 0
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(prog="python -m core.daemon", description="Shared Codex agent daemon")
+    parser.add_argument("command", choices=["serve", "attach", "stop"], nargs="?", default="attach")
+    parser.add_argument("--port", type=int, default=config.get("daemon_port", 0), help="serve on localhost TCP instead of a Unix socket")
+    parser.add_argument("--idle-timeout", type=float, default=config.get("daemon_idle", 1800.0))
+    parser.add_argument("--spares", type=int, default=config.get("daemon_spares", 1))
+    parser.add_argument("--client-id", default=None, help="reattach to the sessions of an earlier client")
+    parser.add_argument("--no-start", action="store_true", help="fail instead of starting a daemon")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            started = AgentDaemon(port=args.port, idle_timeout=args.idle_timeout, spares=args.spares).serve_forever()
+        except KeyboardInterrupt:
+            started = True
+        return 0 if started else 1
+    if args.command == "stop":
+        return stop()
+    return attach(client_id=args.client_id, start=not args.no_start)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,356 @@
+"""Persistent index of workspace files for file_search and list_dir.
+
+The first query crawls the workspace once with ``os.scandir``; later
+queries only stat each directory and rescan the ones whose mtime (or
+.gitignore) changed, which is how new, deleted and renamed entries show up.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from core.config import cache_dir
+from core.ignore import ALWAYS_SKIP, IgnoreRules, glob_to_regex, is_ignored
+
+INDEX_VERSION = 1
+REFRESH_INTERVAL = 1.0
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _gitignore_mtime(path):
+    try:
+        return os.stat(os.path.join(path, ".gitignore")).st_mtime_ns
+    except OSError:
+        return 0
+
+
+class FileIndex:
+    """Directory records keyed by path relative to ``root``.
+
+    Each record holds the directory's mtime, its .gitignore mtime, and its
+    entries as ``files: [[name, size, mtime_ns, ignored]]`` and
+    ``dirs: [[name, ignored]]``. Ignored entries are listed but ignored
+    directories are not descended into.
+    """
+
+    def __init__(self, root, path=None):
+        self.root = os.path.abspath(root)
+        key = hashlib.sha256(self.root.encode("utf-8")).hexdigest()[:12]
+        self.path = path or os.path.join(cache_dir(), f"file_index-{key}.json")
+        self.dirs = self._load()
+        self._rules = {}
+        self._files = None
+        self._refreshed = 0.0
+        self._lock = threading.RLock()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != INDEX_VERSION or data.get("root") != self.root:
+            return {}
+        return data.get("dirs", {})
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as handle:
+                json.dump({"version": INDEX_VERSION, "root": self.root, "dirs": self.dirs}, handle, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def _abs(self, rel):
+        return os.path.join(self.root, *rel.split("/")) if rel else self.root
+
+    def _rules_for(self, rel, gi_mtime):
+        cached = self._rules.get(rel)
+        if cached is None or cached[0] != gi_mtime:
+            cached = (gi_mtime, IgnoreRules.load(self._abs(rel)) if gi_mtime else None)
+            self._rules[rel] = cached
+        return cached[1]
+
+    def _scan_dir(self, rel, dir_mtime, gi_mtime, stack):
+        files = []
+        dirs = []
+        try:
+            with os.scandir(self._abs(rel)) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            entries = []
+        for entry in entries:
+            child = f"{rel}/{entry.name}" if rel else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append([entry.name, entry.name in ALWAYS_SKIP or is_ignored(stack, child, True)])
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    files.append([entry.name, stat.st_size, stat.st_mtime_ns, is_ignored(stack, child, False)])
+            except OSError:
+                continue
+        return {"mtime": dir_mtime, "gi": gi_mtime, "files": files, "dirs": dirs}
+
+    def _refresh_dir(self, rel, stack, force, seen):
+        try:
+            dir_mtime = os.stat(self._abs(rel)).st_mtime_ns
+        except OSError:
+            return False
+        gi_mtime = _gitignore_mtime(self._abs(rel))
+        rules = self._rules_for(rel, gi_mtime)
+        if rules:
+            stack = stack + [(rel, rules)]
+        record = self.dirs.get(rel)
+        changed = False
+        # A changed .gitignore alters what is ignored below it, so the whole
+        # subtree is rescanned.
+        force = force or (record is not None and record["gi"] != gi_mtime)
+        if force or record is None or record["mtime"] != dir_mtime:
+            record = self.dirs[rel] = self._scan_dir(rel, dir_mtime, gi_mtime, stack)
+            changed = True
+        seen.add(rel)
+        for name, ignored in record["dirs"]:
+            if not ignored:
+                child = f"{rel}/{name}" if rel else name
+                changed = self._refresh_dir(child, stack, force, seen) or changed
+        return changed
+
+    def refresh(self, force=False):
+        """Bring the index up to date; cheap when nothing changed."""
+        with self._lock:
+            if not force and time.time() - self._refreshed < REFRESH_INTERVAL and self.dirs:
+                return False
+            seen = set()
+            changed = self._refresh_dir("", [], force, seen)
+            stale = set(self.dirs) - seen
+            for rel in stale:
+                del self.dirs[rel]
+            if changed or stale:
+                self._files = None
+                self._save()
+            self._refreshed = time.time()
+            return changed or bool(stale)
+
+    def files(self):
+        """Return the sorted relative paths of every file that is not ignored."""
+        with self._lock:
+            self.refresh()
+            if self._files is None:
+                paths = []
+                for rel, record in self.dirs.items():
+                    prefix = f"{rel}/" if rel else ""
+                    paths.extend(prefix + name for name, _, _, ignored in record["files"] if not ignored)
+                paths.sort()
+                self._files = paths
+            return self._files
+
+    def entries(self):
+        """Return ``{path: (size, mtime_ns)}`` for every file that is not ignored."""
+        with self._lock:
+            self.refresh()
+            stats = {}
+            for rel, record in self.dirs.items():
+                prefix = f"{rel}/" if rel else ""
+                for name, size, mtime, ignored in record["files"]:
+                    if not ignored:
+                        stats[prefix + name] = (size, mtime)
+            return stats
+
+    def glob(self, pattern, limit=200):
+        """Match a glob against indexed paths.
+
+        A pattern containing ``/`` is matched against the whole relative path
+        (``**`` crosses directories); one without is matched against file
+        names at any depth.
+        """
+        pattern = pattern.strip()
+        if pattern.startswith("./"):
+            pattern = pattern[2:]
+        regex = re.compile(glob_to_regex(pattern) + r"\Z")
+        anchored = "/" in pattern
+        matches = []
+        for path in self.files():
+            if regex.match(path if anchored else path.rsplit("/", 1)[-1]):
+                matches.append(path)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def fuzzy(self, query, limit=50):
+        """Rank paths containing the characters of ``query`` in order."""
+        query = query.strip().lower().replace("\\", "/")
+        if not query:
+            return []
+        scored = []
+        for path in self.files():
+            score = _fuzzy_score(query, path)
+            if score is not None:
+                scored.append((-score, len(path), path))
+        scored.sort()
+        return [path for _, _, path in scored[:limit]]
+
+    def listdir(self, rel):
+        """Return the record for directory ``rel``, scanning only that directory.
+
+        A directory the index has not seen yet is scanned and added unless it
+        sits under an ignored path. Returns None when ``rel`` is not a
+        directory.
+        """
+        rel = rel.strip("/")
+        with self._lock:
+            record = self.dirs.get(rel)
+            try:
+                dir_mtime = os.stat(self._abs(rel)).st_mtime_ns
+            except OSError:
+                return None
+            if not os.path.isdir(self._abs(rel)):
+                return None
+            # File sizes and mtimes change without touching the directory's
+            # own mtime, so a listing always restats its files.
+            stack = self._stack_for(rel)
+            fresh = self._scan_dir(rel, dir_mtime, _gitignore_mtime(self._abs(rel)), stack)
+            if record is None:
+                if self._ignored(rel, stack):
+                    return fresh
+            elif fresh["files"] == record["files"] and fresh["dirs"] == record["dirs"]:
+                return record
+            self.dirs[rel] = fresh
+            self._files = None
+            return fresh
+
+    def _ignored(self, rel, stack):
+        parts = rel.split("/") if rel else []
+        for depth in range(1, len(parts) + 1):
+            path = "/".join(parts[:depth])
+            # Only .gitignore files above ``path`` apply to it.
+            above = [(base, rules) for base, rules in stack if not base or path.startswith(base + "/")]
+            if parts[depth - 1] in ALWAYS_SKIP or is_ignored(above, path, True):
+                return True
+        return False
+
+    def _stack_for(self, rel):
+        stack = []
+        parts = rel.split("/") if rel else []
+        for depth in range(len(parts) + 1):
+            prefix = "/".join(parts[:depth])
+            rules = self._rules_for(prefix, _gitignore_mtime(self._abs(prefix)))
+            if rules:
+                stack.append((prefix, rules))
+        return stack
+
+
+def _fuzzy_score(query, path):
+    lower = path.lower()
+    name_start = lower.rfind("/") + 1
+    score = 0
+    position = -1
+    for char in query:
+        found = lower.find(char, position + 1)
+        if found < 0:
+            return None
+        score += 1
+        if found == position + 1:
+            score += 3
+        if found >= name_start:
+            score += 2
+        if found == 0 or lower[found - 1] in "/_-. ":
+            score += 2
+        position = found
+    if query in lower[name_start:]:
+        score += 10
+    elif query in lower:
+        score += 5
+    return score
+
+
+def get_index(root=None):
+    root = os.path.abspath(root or os.getcwd())
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = FileIndex(root)
+        return index
+
+
+def _format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def list_directory(path):
+    """Return a directory record for ``path``, from the index when it covers it."""
+    target = os.path.abspath(path)
+    index = get_index()
+    if target == index.root or target.startswith(index.root + os.sep):
+        rel = "" if target == index.root else os.path.relpath(target, index.root).replace(os.sep, "/")
+        record = index.listdir(rel)
+        if record is not None:
+            return record
+    files = []
+    dirs = []
+    with os.scandir(target) as it:
+        for entry in sorted(it, key=lambda e: e.name):
+            try:
+                if entry.is_dir():
+                    dirs.append([entry.name, False])
+                else:
+                    stat = entry.stat()
+                    files.append([entry.name, stat.st_size, stat.st_mtime_ns, False])
+            except OSError:
+                continue
+    return {"files": files, "dirs": dirs}
+
+
+def format_listing(record):
+    lines = [f"{name}/" for name, _ in record["dirs"]]
+    for name, size, mtime, _ in record["files"]:
+        stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime / 1e9))
+        lines.append(f"{name}  ({_format_size(size)}, modified {stamp})")
+    return "\n".join(lines)
+
+
+def _has_glob(pattern):
+    return any(char in pattern for char in "*?[")
+
+
+def run_file_search(args):
+    """``file_search`` front end: globs and fuzzy names against the index."""
+    pattern = args.strip()
+    if not pattern:
+        return "file_search error: no pattern provided."
+    index = get_index()
+    target = os.path.abspath(pattern)
+    rel = os.path.relpath(target, index.root).replace(os.sep, "/")
+    if (os.path.isabs(pattern) or pattern.startswith("..")) and (rel == ".." or rel.startswith("../")):
+        # Outside the workspace there is no index; search the disk directly.
+        import glob
+
+        matches = sorted(glob.glob(pattern, recursive=True))[:200]
+    elif os.path.isabs(pattern) or pattern.startswith(".."):
+        matches = index.glob(rel) if _has_glob(rel) else [rel] if os.path.isfile(target) else []
+    elif _has_glob(pattern):
+        matches = index.glob(pattern.replace("\\", "/"))
+    else:
+        matches = index.fuzzy(pattern)
+    if not matches:
+        return "No files matched the pattern."
+    return "\n".join(matches)
+
+
+def run_list_dir(args):
+    """``list_dir`` front end: entries with sizes and modification times."""
+    path = args.strip() or "."
+    if not os.path.exists(path):
+        return f"list_dir error: {path} not found."
+    try:
+        return format_listing(list_directory(path)) or "(empty directory)"
+    except Exception as exc:
+        return f"list_dir error: {exc}"
@@ -0,0 +1,181 @@
+"""Ranged line reads for the read_file tool.
+
+Small files are read whole. Larger ones are mapped with ``mmap`` and a
+sparse line index (the number of newlines before every 64 KB block) is
+built once and cached until the file's size or mtime changes, so reading
+lines 10-20 or the tail of a multi-GB log touches only the blocks involved.
+"""
+import mmap
+import os
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+MMAP_THRESHOLD = 1024 * 1024
+BLOCK_BYTES = 64 * 1024
+MAX_READ_BYTES = 64 * 1024
+MAX_INDEXES = 32
+
+_indexes = OrderedDict()
+_positions = {}
+_lock = threading.Lock()
+
+
+class LineIndex:
+    """Newline counts at block boundaries of one file, for seeking by line number."""
+
+    def __init__(self, path):
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime_ns
+        self.counts = []
+        total = 0
+        last = b""
+        with open(path, "rb") as handle:
+            while True:
+                block = handle.read(BLOCK_BYTES)
+                if not block:
+                    break
+                self.counts.append(total)
+                total += block.count(b"\n")
+                last = block
+        self.newlines = total
+        self.lines = total + (1 if last and not last.endswith(b"\n") else 0)
+
+    def fresh(self, stat):
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime
+
+    def offset(self, data, line):
+        """Byte offset where 1-based ``line`` starts (``len(data)`` past the end)."""
+        if line <= 1:
+            return 0
+        if line - 1 > self.newlines:
+            return len(data)
+        block = bisect_right(self.counts, line - 2) - 1
+        position = block * BLOCK_BYTES
+        for _ in range(line - 1 - self.counts[block]):
+            position = data.find(b"\n", position) + 1
+        return position
+
+
+def _line_index(path):
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None and index.fresh(stat):
+            _indexes.move_to_end(key)
+            return index
+    index = LineIndex(path)
+    with _lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def _slice(data, index, start, end, max_bytes):
+    """Return ``(bytes, last_line)`` for lines ``start..end`` capped at ``max_bytes``."""
+    begin = index.offset(data, start)
+    stop = index.offset(data, end + 1) if end < index.lines else len(data)
+    if stop - begin <= max_bytes:
+        return data[begin:stop], end
+    cut = data.rfind(b"\n", begin, begin + max_bytes)
+    if cut < 0:
+        # A single line longer than the cap: return its head.
+        return data[begin:begin + max_bytes], start
+    chunk = data[begin:cut + 1]
+    return chunk, start + chunk.count(b"\n") - 1
+
+
+class _SmallIndex:
+    """The LineIndex interface over an in-memory file."""
+
+    def __init__(self, data):
+        self.newlines = data.count(b"\n")
+        self.lines = self.newlines + (1 if data and not data.endswith(b"\n") else 0)
+        self._starts = None
+
+    def offset(self, data, line):
+        if self._starts is None:
+            starts = [0]
+            position = data.find(b"\n")
+            while position >= 0:
+                starts.append(position + 1)
+                position = data.find(b"\n", position + 1)
+            self._starts = starts
+        if line <= 1:
+            return 0
+        return self._starts[line - 1] if line - 1 < len(self._starts) else len(data)
+
+
+def read_lines(path, start=None, end=None, max_bytes=MAX_READ_BYTES):
+    """Read lines ``start..end`` (1-based, inclusive) of ``path``.
+
+    A negative ``start`` reads that many lines from the end. Returns
+    ``(text, first, last, total)``; ``last < end`` means the byte cap cut the
+    range short.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as handle:
+        if size < MMAP_THRESHOLD:
+            data = handle.read()
+            index = _SmallIndex(data)
+            return _read(data, index, start, end, max_bytes)
+        index = _line_index(path)
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return _read(data, index, start, end, max_bytes)
+
+
+def _read(data, index, start, end, max_bytes):
+    total = index.lines
+    if start is not None and start < 0:
+        start = max(total + start + 1, 1)
+    start = max(start or 1, 1)
+    end = min(end or total, total)
+    if start > end:
+        return "", start, start - 1, total
+    chunk, last = _slice(data, index, start, end, max(max_bytes, 1))
+    return bytes(chunk).decode("utf-8", errors="replace"), start, last, total
+
+
+def _parse_line(value):
+    return int(value) if value else None
+
+
+def run_read_file(args, tool="read_file"):
+    """``path|start|end|max_bytes`` front end.
+
+    ``start`` may be negative for a tail read, or ``next`` to continue from
+    where the previous read of ``path`` stopped.
+    """
+    if not args.strip():
+        return f"{tool} error: no arguments provided."
+    parts = [part.strip() for part in args.split("|")]
+    path = parts[0]
+    if not os.path.exists(path):
+        return f"{tool} error: {path} not found."
+    key = os.path.abspath(path)
+    try:
+        if len(parts) > 1 and parts[1].lower() == "next":
+            start = _positions.get(key, 0) + 1
+        else:
+            start = _parse_line(parts[1]) if len(parts) > 1 else None
+        end = _parse_line(parts[2]) if len(parts) > 2 else None
+        max_bytes = int(parts[3]) if len(parts) > 3 and parts[3] else MAX_READ_BYTES
+    except ValueError:
+        return f"{tool} error: line numbers and max_bytes must be integers."
+    try:
+        text, first, last, total = read_lines(path, start, end, max_bytes)
+    except Exception as exc:
+        return f"{tool} error: {exc}"
+    with _lock:
+        _positions[key] = last
+    if not text:
+        return "(No content in specified range)"
+    wanted = min(end or total, total)
+    if last < wanted:
+        text = text if text.endswith("\n") else text + "\n"
+        text += f"[... lines {first}-{last} of {total} shown; continue with {path}|next or {path}|{last + 1}|{wanted}]"
+    return text
@@ -0,0 +1,68 @@
+"""Session wiring shared by the CLI and the stdio chat process.
+
+Both front ends build histories, tool executors and the tool cache from the
+same config keys, answer direct messages the same way and print the same
+debug lines; those pieces live here so the two cannot drift apart.
+"""
+import time
+
+from core.history import ConversationHistory
+from core.tokens import load_tokenizer
+from core.tool_cache import ToolCache
+from core.tool_calls import ToolExecutor, complete_with_tools, record_transcript
+
+
+def new_history(config, summarizer=None):
+    return ConversationHistory(
+        token_budget=config.get("context_tokens"),
+        tokenizer=load_tokenizer(config.get("tokenizer", "approx"), config.get("model")),
+        summarizer=summarizer,
+    )
+
+
+def build_executor(tools, config, cache=None):
+    return ToolExecutor(
+        tools,
+        max_workers=config.get("tool_workers", 8),
+        timeout=config.get("tool_timeout", 60.0),
+        default_limit=config.get("tool_default_concurrency", 4),
+        limits=config.get("tool_concurrency"),
+        cache=cache,
+    )
+
+
+def build_tool_cache(config):
+    if not config.get("tool_cache", True):
+        return None
+    return ToolCache(max_entries=config.get("tool_cache_entries", 256))
+
+
+def respond_with_tools(client, history, executor, config, initial_reply=None, on_chunk=None, use_cache=False):
+    """Answer the last message, running any tool calls; returns ``(reply, elapsed, call_count)``."""
+    start = time.time()
+    reply, transcript, call_count = complete_with_tools(
+        client,
+        history.get_messages(),
+        executor,
+        on_chunk=on_chunk,
+        initial_reply=initial_reply,
+        max_rounds=config.get("tool_rounds", 5),
+        use_cache=use_cache,
+    )
+    record_transcript(history, transcript)
+    return reply, time.time() - start, call_count
+
+
+def connection_debug_line(client):
+    stats = client.connection_stats()
+    queue = client.queue_stats()
+    return (
+        f"[DEBUG] Connections opened: {stats['opened']} | Requests: {stats['requests']} | Reused: {stats['reused']}"
+        f" | Queue: {queue['depth']} (max {queue['max_depth']}) | Queue wait: avg {queue['wait_avg']:.2f}s, max {queue['wait_max']:.2f}s"
+        f" | Retries: {queue['retries']}"
+    )
+
+
+def tool_cache_debug_line(cache):
+    stats = cache.stats()
+    return f"[DEBUG] Tool cache hits: {stats['hits']} | Misses: {stats['misses']} | Invalidated: {stats['invalidations']}"
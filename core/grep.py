@@ -0,0 +1,221 @@
+"""Workspace-wide regex search used by the grep_search and search tools."""
+import itertools
+import mmap
+import multiprocessing
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from core.ignore import walk
+
+MAX_RESULTS = 200
+MAX_LINE = 200
+BATCH_FILES = 64
+BINARY_SNIFF = 8192
+MMAP_THRESHOLD = 1024 * 1024
+MAX_FILE_BYTES = 64 * 1024 * 1024
+
+WORKERS = min(os.cpu_count() or 1, 8)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def compile_pattern(pattern):
+    """Compile ``pattern`` as a bytes regex, falling back to a literal search."""
+    data = pattern.encode("utf-8")
+    try:
+        return re.compile(data, re.MULTILINE)
+    except re.error:
+        return re.compile(re.escape(data), re.MULTILINE)
+
+
+def _is_binary(head):
+    return b"\0" in head
+
+
+def _format_hit(path, line_no, line, col):
+    text = line.decode("utf-8", errors="replace").strip()
+    if len(text) > MAX_LINE:
+        text = text[:MAX_LINE] + "..."
+    return f"{path}:{line_no}:{col}: {text}"
+
+
+def search_file(path, display, regex, limit):
+    """Return up to ``limit`` ``path:line:col: text`` hits from one file."""
+    try:
+        size = os.path.getsize(path)
+        if size == 0 or size > MAX_FILE_BYTES:
+            return []
+        with open(path, "rb") as handle:
+            if _is_binary(handle.read(BINARY_SNIFF)):
+                return []
+            handle.seek(0)
+            if size >= MMAP_THRESHOLD:
+                with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return _scan(data, display, regex, limit)
+            return _scan(handle.read(), display, regex, limit)
+    except Exception:
+        # One unreadable file must not abort the whole search.
+        return []
+
+
+def _scan(data, display, regex, limit):
+    hits = []
+    line_no = 1
+    counted_to = 0
+    last_line = -1
+    for match in regex.finditer(data):
+        start = match.start()
+        # mmap has no count(); the slices are disjoint, so this copies each byte once.
+        line_no += data[counted_to:start].count(b"\n")
+        counted_to = start
+        if line_no == last_line:
+            continue  # one hit per line, like grep
+        last_line = line_no
+        line_start = data.rfind(b"\n", 0, start) + 1
+        line_end = data.find(b"\n", start)
+        if line_end < 0:
+            line_end = len(data)
+        line = bytes(data[line_start:line_end])
+        col = len(line[:start - line_start].decode("utf-8", errors="replace")) + 1
+        hits.append(_format_hit(display, line_no, line, col))
+        if len(hits) >= limit:
+            break
+    return hits
+
+
+def _search_batch(files, pattern, limit):
+    regex = compile_pattern(pattern)
+    hits = []
+    for path, display in files:
+        hits.extend(search_file(path, display, regex, limit - len(hits)))
+        if len(hits) >= limit:
+            break
+    return hits
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking a threaded parent (the chat process is one) is unsafe, so
+            # workers come from a forkserver, or are spawned where there is
+            # none. The pool is kept for later searches.
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=context)
+        return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _batches(root, base):
+    batch = []
+    for rel, entry in walk(root):
+        display = os.path.relpath(entry.path, base).replace(os.sep, "/")
+        batch.append((entry.path, display))
+        if len(batch) >= BATCH_FILES:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def grep(pattern, path=".", max_results=MAX_RESULTS):
+    """Search ``path`` (a file or directory) and return ``(hits, truncated)``.
+
+    Directories are walked honouring .gitignore; binary files are skipped.
+    Batches of files are searched on a process pool (when there is more than
+    one CPU and more than one batch), in walk order, and the walk stops as soon as ``max_results``
+    hits are found.
+    """
+    base = os.getcwd()
+    if os.path.isfile(path):
+        regex = compile_pattern(pattern)
+        display = os.path.relpath(path, base).replace(os.sep, "/")
+        hits = search_file(path, display, regex, max_results + 1)
+        return hits[:max_results], len(hits) > max_results
+
+    limit = max_results + 1
+    batches = _batches(path, base)
+    first = next(batches, None)
+    if first is None:
+        return [], False
+    hits = _search_batch(first, pattern, limit)
+    second = next(batches, None) if len(hits) < limit else None
+    if second is not None and WORKERS > 1:
+        hits.extend(_search_parallel(second, batches, pattern, limit - len(hits)))
+    elif second is not None:
+        for batch in itertools.chain([second], batches):
+            hits.extend(_search_batch(batch, pattern, limit - len(hits)))
+            if len(hits) >= limit:
+                break
+    return hits[:max_results], len(hits) > max_results
+
+
+def _search_parallel(first, batches, pattern, limit):
+    hits = []
+    pending = deque()
+    unsent = [first]
+    try:
+        pool = _get_pool()
+        while True:
+            while len(pending) < WORKERS * 2:
+                batch = unsent.pop() if unsent else next(batches, None)
+                if batch is None:
+                    break
+                unsent.append(batch)
+                pending.append((batch, pool.submit(_search_batch, batch, pattern, limit)))
+                unsent.pop()
+            if not pending or len(hits) >= limit:
+                break
+            # Consume in submission order so results are deterministic.
+            hits.extend(pending[0][1].result())
+            pending.popleft()
+    except BrokenProcessPool:
+        # Workers could not start (or died): finish the search in-process.
+        _discard_pool()
+        remaining = [batch for batch, _ in pending] + unsent
+        pending.clear()
+        for batch in itertools.chain(remaining, batches):
+            if len(hits) >= limit:
+                break
+            hits.extend(_search_batch(batch, pattern, limit - len(hits)))
+    finally:
+        for _, future in pending:
+            future.cancel()
+    return hits
+
+
+def run_grep_tool(args, tool="grep_search"):
+    """Shared ``pattern|path|max_results`` front end for the search tools."""
+    parts = args.split("|")
+    pattern = parts[0].strip()
+    path = parts[1].strip() if len(parts) > 1 and parts[1].strip() else "."
+    if not pattern:
+        return f"{tool} error: pattern required."
+    if not os.path.exists(path):
+        return f"{tool} error: {path} not found."
+    try:
+        limit = int(parts[2]) if len(parts) > 2 and parts[2].strip() else MAX_RESULTS
+    except ValueError:
+        return f"{tool} error: max_results must be a number."
+    try:
+        hits, truncated = grep(pattern, path, max(limit, 1))
+    except Exception as exc:
+        return f"{tool} error: {exc}"
+    if not hits:
+        return "No matches found."
+    if truncated:
+        hits.append(f"...[stopped after {len(hits)} matches]")
+    return "\n".join(hits)
@@ -1,29 +1,73 @@
+import threading
+from collections import deque
+
+from core.tokens import MESSAGE_OVERHEAD, approximate_tokens
+
+MIN_TRUNCATED_TOKENS = 64
+
+
 class ConversationHistory:
-    def __init__(self, levels=5, chunk_size=10):
+    def __init__(self, levels=5, chunk_size=10, token_budget=None, tokenizer=None, summarizer=None):
         self.levels = levels
         self.chunk_size = chunk_size
+        self.token_budget = token_budget
+        self.tokenizer = tokenizer or approximate_tokens
+        self.summarizer = summarizer
+        self.system = []
         self.memory = [[] for _ in range(levels)]
+        self._token_counts = {}
+        # Assembled context, kept up to date as messages are appended: the
+        # messages sent after the system prompts, the one just before them
+        # (truncated into the head of the list when it fits) and their cost.
+        self._cached = None
+        self._kept = deque()
+        self._boundary = None
+        self._head = False
+        self._used = 0
+        self._system_tokens = 0
+        self._lock = threading.RLock()
 
     def add_system_message(self, content):
-        self.memory[0].append({"role": "system", "content": content})
-        self._rollup_if_needed(0)
+        with self._lock:
+            self.system.append({"role": "system", "content": content})
+            self._changed()
 
     def add_user_message(self, content):
-        self.memory[0].append({"role": "user", "content": content})
-        self._rollup_if_needed(0)
+        self._add({"role": "user", "content": content})
 
     def add_assistant_message(self, content):
-        self.memory[0].append({"role": "assistant", "content": content})
-        self._rollup_if_needed(0)
+        self._add({"role": "assistant", "content": content})
+
+    def _add(self, message):
+        with self._lock:
+            self.memory[0].append(message)
+            if self._rollup_if_needed(0):
+                self._changed()
+            elif self._cached is not None:
+                self._extend(message)
+
+    def _changed(self):
+        self._cached = None
 
     def _rollup_if_needed(self, level):
+        rolled = False
         while len(self.memory[level]) > 2 * self.chunk_size:
+            rolled = True
             chunk = self.memory[level][:self.chunk_size]
             summary = self._summarize_chunk(chunk, level)
             self.memory[level] = self.memory[level][self.chunk_size:]
+            if self.summarizer is not None and level + 1 < self.levels:
+                cached = self.summarizer.cached(chunk)
+                if cached:
+                    summary["content"] = cached
+                else:
+                    self.summarizer.submit(chunk, lambda text, target=summary: self._replace_summary(target, text))
+            for message in chunk:
+                self._token_counts.pop(message["content"], None)
             if level + 1 < self.levels:
                 self.memory[level + 1].append(summary)
                 self._rollup_if_needed(level + 1)
+        return rolled
 
     def _summarize_chunk(self, chunk, level):
         user_msgs = [m["content"] for m in chunk if m["role"] == "user"]
@@ -36,9 +80,108 @@ class ConversationHistory:
             ),
         }
 
+    def _replace_summary(self, summary, content):
+        # Runs on the summarizer thread: swap the placeholder text in place so
+        # higher-level rollups that already hold this message see it too.
+        with self._lock:
+            self._token_counts.pop(summary["content"], None)
+            summary["content"] = content
+            self._changed()
+
+    def count_tokens(self, message):
+        # Keyed by content rather than id(): ids of freed dicts get reused.
+        content = message["content"]
+        count = self._token_counts.get(content)
+        if count is None:
+            count = self.tokenizer(content) + MESSAGE_OVERHEAD
+            self._token_counts[content] = count
+        return count
+
+    def token_count(self):
+        with self._lock:
+            history = list(self.system)
+            for lvl in range(self.levels - 1, -1, -1):
+                history.extend(self.memory[lvl])
+            return sum(self.count_tokens(message) for message in history)
+
+    def _truncate(self, message, budget):
+        content = message["content"]
+        tokens = self.count_tokens(message) - MESSAGE_OVERHEAD
+        keep = max(int(len(content) * budget / max(tokens, 1)) - 32, 0)
+        return {"role": message["role"], "content": content[:keep] + "\n...[truncated to fit context]..."}
+
+    @staticmethod
+    def _as_api_message(message):
+        if message["role"].startswith("summary_level_"):
+            return {"role": "system", "content": f"Summary of earlier conversation: {message['content']}"}
+        return message
+
     def get_messages(self):
-        result = []
+        with self._lock:
+            return list(self._assemble())
+
+    def _assemble(self):
+        if self._cached is None:
+            self._rebuild()
+        return self._cached
+
+    def _rebuild(self):
+        history = []
         for lvl in range(self.levels - 1, 0, -1):
-            result.extend(self.memory[lvl])
-        result.extend(self.memory[0])
-        return result[-(self.chunk_size * self.levels):]
+            history.extend(self.memory[lvl])
+        history.extend(self.memory[0])
+        self._kept = deque()
+        self._boundary = None
+        self._head = False
+        self._used = 0
+        if self.token_budget is None:
+            self._kept.extend(history[-(self.chunk_size * self.levels):])
+        else:
+            # System prompts are always sent; the rest of the budget is filled
+            # newest-first so recent turns survive and one huge message can't
+            # crowd out the whole conversation.
+            self._system_tokens = sum(self.count_tokens(m) for m in self.system)
+            available = self.token_budget - self._system_tokens
+            for message in reversed(history):
+                cost = self.count_tokens(message)
+                if self._used + cost > available:
+                    self._boundary = message
+                    break
+                self._kept.appendleft(message)
+                self._used += cost
+        self._cached = [self._as_api_message(message) for message in self.system]
+        self._cached.extend(self._as_api_message(message) for message in self._kept)
+        self._fit_boundary()
+
+    def _extend(self, message):
+        """Add ``message`` to the assembled context, dropping the oldest to stay within the limit."""
+        start = len(self.system)
+        self._kept.append(message)
+        self._cached.append(self._as_api_message(message))
+        if self.token_budget is None:
+            if len(self._kept) > self.chunk_size * self.levels:
+                self._kept.popleft()
+                del self._cached[start]
+            return
+        self._used += self.count_tokens(message)
+        available = self.token_budget - self._system_tokens
+        while self._kept and self._used > available:
+            self._boundary = self._kept.popleft()
+            self._used -= self.count_tokens(self._boundary)
+            del self._cached[start + self._head]
+        self._fit_boundary()
+
+    def _fit_boundary(self):
+        # The newest message that did not fit goes in truncated, unless only
+        # a sliver of budget is left after some whole messages.
+        start = len(self.system)
+        if self._head:
+            del self._cached[start]
+            self._head = False
+        if self._boundary is None:
+            return
+        remaining = self.token_budget - self._system_tokens - self._used
+        if remaining - MESSAGE_OVERHEAD >= MIN_TRUNCATED_TOKENS or not self._kept:
+            truncated = self._truncate(self._boundary, max(remaining - MESSAGE_OVERHEAD, 0))
+            self._cached.insert(start, self._as_api_message(truncated))
+            self._head = True
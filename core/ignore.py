@@ -0,0 +1,125 @@
+import os
+import re
+
+# Never worth descending into, ignored or not.
+ALWAYS_SKIP = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".mypy_cache", ".pytest_cache", ".tox", ".venv"}
+
+
+def glob_to_regex(pattern):
+    """Translate a gitignore-style glob (``*``, ``?``, ``[...]``, ``**``) to a regex string."""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                parts.append(re.escape("["))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append(f"[{body}]")
+            i = end + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(parts)
+
+
+class IgnoreRules:
+    """Patterns from one ``.gitignore``, matched relative to its directory."""
+
+    def __init__(self, lines):
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            regex = re.compile(glob_to_regex(line.lstrip("/")) + r"\Z")
+            self.rules.append((regex, negate, dir_only, anchored))
+
+    @classmethod
+    def load(cls, directory):
+        try:
+            with open(os.path.join(directory, ".gitignore"), "r", encoding="utf-8", errors="replace") as handle:
+                rules = cls(handle)
+        except OSError:
+            return None
+        return rules if rules.rules else None
+
+    def match(self, rel_path, is_dir):
+        """Return True (ignored), False (re-included by ``!``) or None (no rule applies)."""
+        name = rel_path.rsplit("/", 1)[-1]
+        result = None
+        for regex, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path if anchored else name):
+                result = not negate
+        return result
+
+
+def is_ignored(stack, rel_path, is_dir):
+    """Apply ``[(base, rules)]`` from the root down; deeper files win."""
+    ignored = False
+    for base, rules in stack:
+        sub = rel_path[len(base) + 1:] if base else rel_path
+        decision = rules.match(sub, is_dir)
+        if decision is not None:
+            ignored = decision
+    return ignored
+
+
+def walk(root, skip=ALWAYS_SKIP, include_dirs=False):
+    """Yield ``(rel_path, entry)`` for files under ``root`` honouring .gitignore files.
+
+    Paths use ``/`` separators and are relative to ``root``. With
+    ``include_dirs`` directories are yielded too, before their contents.
+    """
+    root = os.path.abspath(root)
+    rules = IgnoreRules.load(root)
+    yield from _walk(root, "", [("", rules)] if rules else [], skip, include_dirs)
+
+
+def _walk(path, rel, stack, skip, include_dirs):
+    try:
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError:
+        return
+    for entry in entries:
+        child = f"{rel}/{entry.name}" if rel else entry.name
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            continue
+        if is_dir:
+            if entry.name in skip or is_ignored(stack, child, True):
+                continue
+            if include_dirs:
+                yield child, entry
+            rules = IgnoreRules.load(entry.path)
+            yield from _walk(entry.path, child, stack + [(child, rules)] if rules else stack, skip, include_dirs)
+        elif entry.is_file(follow_symlinks=False) and not is_ignored(stack, child, False):
+            yield child, entry
@@ -1,24 +1,238 @@
+import json
+import os
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.config import cache_dir
 
 MCP_SERVER_URL = "http://localhost:8000/tools"
 
 discovered_tools = {}
 
-def discover_mcp_tools():
-    try:
-        resp = requests.get(MCP_SERVER_URL, timeout=5)
-        resp.raise_for_status()
-        tools = resp.json()
-        for tool in tools:
-            discovered_tools[tool["name"]] = tool["description"]
-        return discovered_tools
-    except Exception:
-        return {}
+
+class ToolTable(dict):
+    """A tool mapping that background discovery may update while others read it.
+
+    Writes take a lock and iteration works on a snapshot, so a refresh that
+    lands mid-iteration cannot raise "dictionary changed size".
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+
+    def update(self, *args, **kwargs):
+        with self._lock:
+            super().update(*args, **kwargs)
+
+    def keys(self):
+        with self._lock:
+            return list(super().keys())
+
+    def values(self):
+        with self._lock:
+            return list(super().values())
+
+    def items(self):
+        with self._lock:
+            return list(super().items())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+
+def _server_urls():
+    value = os.environ.get("MCP_SERVER_URLS") or os.environ.get("MCP_SERVER_URL") or MCP_SERVER_URL
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+class McpRegistry:
+    """Known MCP tools across one or more servers.
+
+    The last known tool list is persisted to disk and served immediately;
+    discovery refreshes it in a background thread once it is older than
+    ``ttl`` seconds. Calls share a pooled session and are limited to
+    ``max_concurrency`` in flight per server. Only discovery (GET) is retried
+    on 502/503/504; a tool invocation is retried only when the connection
+    could not be made, since the tool may not be idempotent.
+    """
+
+    def __init__(self, servers=None, ttl=300.0, max_concurrency=4, timeout=30.0, path=None):
+        self.servers = servers or _server_urls()
+        self.ttl = ttl
+        self.timeout = timeout
+        self.path = path or os.path.join(cache_dir(), "mcp_tools.json")
+        self.session = self._build_session(max_concurrency)
+        self._limits = {server: threading.BoundedSemaphore(max_concurrency) for server in self.servers}
+        self._lock = threading.Lock()
+        self._refreshing = None
+        self._listener = None
+        self._state = self._load()
+
+    def _build_session(self, pool_size):
+        retry = Retry(
+            total=2,
+            connect=2,
+            read=0,
+            status=2,
+            backoff_factor=0.3,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+        )
+        adapter = HTTPAdapter(pool_connections=max(len(self.servers), 1), pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as handle:
+                state = json.load(handle)
+        except (OSError, ValueError):
+            return {}
+        return {server: state[server] for server in self.servers if isinstance(state.get(server), dict)}
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as handle:
+                json.dump(self._state, handle)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def tools(self):
+        """Return {name: description}; the first server listing a name owns it."""
+        with self._lock:
+            result = {}
+            for server in self.servers:
+                for tool in self._state.get(server, {}).get("tools", []):
+                    result.setdefault(tool["name"], tool.get("description", ""))
+            return result
+
+    def _owner(self, name):
+        with self._lock:
+            for server in self.servers:
+                if any(tool["name"] == name for tool in self._state.get(server, {}).get("tools", [])):
+                    return server
+        return self.servers[0] if self.servers else None
+
+    def _stale(self):
+        now = time.time()
+        with self._lock:
+            return any(now - self._state.get(server, {}).get("fetched", 0) > self.ttl for server in self.servers)
+
+    def _fetch(self, server):
+        try:
+            resp = self.session.get(server, timeout=(2, 5))
+            resp.raise_for_status()
+            tools = [
+                {"name": tool["name"], "description": tool.get("description", "")}
+                for tool in resp.json()
+                if isinstance(tool, dict) and tool.get("name")
+            ]
+        except Exception:
+            # Keep the last known list; try again after another TTL.
+            with self._lock:
+                entry = self._state.setdefault(server, {"tools": []})
+                entry["fetched"] = time.time()
+            return
+        with self._lock:
+            self._state[server] = {"fetched": time.time(), "tools": tools}
+
+    def refresh(self):
+        threads = [threading.Thread(target=self._fetch, args=(server,), daemon=True) for server in self.servers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with self._lock:
+            self._save()
+            listener = self._listener
+        if listener is not None:
+            try:
+                listener(self.tools())
+            except Exception:
+                pass
+
+    def discover(self, on_update=None, block=False):
+        """Return the last known tools now and refresh in the background if stale.
+
+        ``on_update`` (replacing any earlier one) receives the refreshed list.
+        """
+        if on_update is not None:
+            with self._lock:
+                self._listener = on_update
+        if self._stale():
+            with self._lock:
+                running = self._refreshing is not None and self._refreshing.is_alive()
+                if not running:
+                    self._refreshing = threading.Thread(target=self.refresh, daemon=True)
+                    self._refreshing.start()
+                thread = self._refreshing
+            if block:
+                thread.join()
+        return self.tools()
+
+    def run(self, toolname, args):
+        server = self._owner(toolname)
+        if server is None:
+            return "MCP tool error: no MCP server configured."
+        with self._limits[server]:
+            try:
+                resp = self.session.post(f"{server}/{toolname}", json={"args": args}, timeout=self.timeout)
+                resp.raise_for_status()
+                return resp.json().get("result", "(No result)")
+            except Exception as exc:
+                return f"MCP tool error: {exc}"
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = McpRegistry(ttl=float(os.environ.get("MCP_DISCOVERY_TTL", 300)))
+        return _registry
+
+
+def discover_mcp_tools(on_update=None, block=False):
+    tools = get_registry().discover(on_update=on_update, block=block)
+    discovered_tools.update(tools)
+    return tools
+
 
 def run_mcp_tool(toolname, args):
-    try:
-        resp = requests.post(f"{MCP_SERVER_URL}/{toolname}", json={"args": args}, timeout=30)
-        resp.raise_for_status()
-        return resp.json().get("result", "(No result)")
-    except Exception as exc:
-        return f"MCP tool error: {exc}"
+    return get_registry().run(toolname, args)
+
+
+def add_mcp_tools(tools):
+    """Merge MCP tools into ``tools`` now and again whenever discovery refreshes.
+
+    Returns a ``ToolTable`` copy of ``tools``; use it in place of the argument.
+    """
+    tools = tools if isinstance(tools, ToolTable) else ToolTable(tools)
+
+    def _merge(mcp_tools):
+        tools.update({
+            name: {
+                "run": lambda arguments, n=name: run_mcp_tool(n, arguments),
+                "description": f"(MCP) {description}",
+            }
+            for name, description in mcp_tools.items()
+        })
+
+    _merge(discover_mcp_tools(on_update=_merge))
+    return tools
@@ -0,0 +1,242 @@
+"""Process-wide latency, throughput and cache metrics.
+
+Call sites record into the shared registry ``METRICS``: ``observe`` adds a
+value to a histogram and ``inc`` bumps a counter, each keyed by a metric
+name plus keyword labels. Histograms use fixed log-spaced buckets chosen by
+the name's suffix (``_seconds``, ``_bytes``, otherwise a rate), so a record
+is one ``bisect`` and a few additions under a lock and nothing is kept per
+sample. Percentiles are interpolated within buckets.
+
+``snapshot()`` returns plain data for the ``metrics`` stdio action and for
+JSONL export, ``prometheus()`` renders the text exposition format. With
+``LLM_METRICS_FILE`` set, an exporter thread rewrites a ``.prom`` file (for
+node_exporter's textfile collector) or appends a JSONL snapshot every
+``LLM_METRICS_INTERVAL`` seconds and once more at exit.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+
+TIME_BUCKETS = tuple(0.001 * 2 ** n for n in range(19))  # 1ms .. ~262s
+BYTE_BUCKETS = tuple(256 * 4 ** n for n in range(10))  # 256B .. 64MB
+RATE_BUCKETS = tuple(2 ** n for n in range(12))  # 1 .. 2048 per second
+
+HELP = {
+    "model_ttft_seconds": "Time from the start of a model call to its first token, queueing and retries included.",
+    "model_inter_token_seconds": "Gap between consecutive streamed deltas.",
+    "model_output_tokens_per_second": "Output tokens per second after the first token.",
+    "model_call_seconds": "Duration of one model call by generation profile.",
+    "model_request_bytes": "Size of the JSON request body sent to the model.",
+    "stage_seconds": "Duration of router, plan, step and summary stages.",
+    "tool_seconds": "Duration of one tool call.",
+    "request_seconds": "Duration of one chat request, end to end.",
+    "cache_lookups_total": "Cache lookups by cache and result (hit, miss or revalidated).",
+}
+
+
+def _bounds(name):
+    if name.endswith("_seconds"):
+        return TIME_BUCKETS
+    if name.endswith("_bytes"):
+        return BYTE_BUCKETS
+    return RATE_BUCKETS
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = self.bounds[index - 1] if index else 0.0
+                high = self.bounds[index] if index < len(self.bounds) else self.max
+                value = low + (high - low) * (rank - seen) / count
+                return min(max(value, self.min), self.max)
+            seen += count
+        return self.max
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """Counters and histograms keyed by ``(name, labels)``."""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(_bounds(name))
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def snapshot(self):
+        """Plain-data view: counters, histogram summaries and cache hit rates."""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": round(h.sum, 6),
+                    "min": h.min,
+                    "max": h.max,
+                    "p50": h.quantile(0.5),
+                    "p90": h.quantile(0.9),
+                    "p99": h.quantile(0.99),
+                }
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+        caches = {}
+        for counter in counters:
+            if counter["name"] == "cache_lookups_total":
+                totals = caches.setdefault(counter["labels"].get("cache", ""), {"hits": 0, "lookups": 0})
+                totals["lookups"] += counter["value"]
+                if counter["labels"].get("result") == "hit":
+                    totals["hits"] += counter["value"]
+        hit_rates = {name: round(t["hits"] / t["lookups"], 3) for name, t in caches.items() if t["lookups"]}
+        return {
+            "time": time.time(),
+            "uptime": time.time() - self.started,
+            "counters": counters,
+            "histograms": histograms,
+            "cache_hit_rates": hit_rates,
+        }
+
+    def prometheus(self, prefix="codex_"):
+        """Render the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, list(h.bounds), list(h.counts), h.count, h.sum) for key, h in self._histograms.items()
+            )
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {prefix}{name} {HELP[name]}")
+                lines.append(f"# TYPE {prefix}{name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name, "counter")
+            lines.append(f"{prefix}{name}{_labels(labels)} {value}")
+        for (name, labels), bounds, counts, count, total in histograms:
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, bucket in zip(bounds + [float("inf")], counts):
+                cumulative += bucket
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{prefix}{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{prefix}{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{prefix}{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+METRICS = Metrics()
+
+
+def export_metrics(path, metrics=METRICS):
+    """Write ``metrics`` to ``path``: Prometheus text for ``.prom``, else one appended JSONL line."""
+    if path.endswith(".prom"):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as handle:
+            handle.write(metrics.prometheus())
+        os.replace(tmp, path)
+        return
+    with open(path, "a", encoding="utf-8") as handle:
+        handle.write(json.dumps(dict(metrics.snapshot(), pid=os.getpid())) + "\n")
+
+
+def format_summary(snapshot):
+    """A few human-readable lines for debug output."""
+    lines = []
+    for entry in snapshot["histograms"]:
+        if entry["name"] in ("model_ttft_seconds", "model_output_tokens_per_second", "stage_seconds", "request_seconds"):
+            label = ",".join(f"{k}={v}" for k, v in entry["labels"].items())
+            name = f"{entry['name']}{{{label}}}" if label else entry["name"]
+            unit = "/s" if entry["name"].endswith("per_second") else "s"
+            lines.append(f"{name} n={entry['count']} p50={entry['p50']:.3f}{unit} p90={entry['p90']:.3f}{unit}")
+    for cache, rate in sorted(snapshot["cache_hit_rates"].items()):
+        lines.append(f"cache {cache}: {rate:.0%} hits")
+    return lines
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def start_exporter(config):
+    """Start the periodic file exporter once per process when ``metrics_file`` is set."""
+    global _exporter
+    path = config.get("metrics_file")
+    if not path:
+        return None
+    with _exporter_lock:
+        if _exporter is not None:
+            return _exporter
+        interval = max(config.get("metrics_interval", 15.0), 1.0)
+        stop = threading.Event()
+
+        def write():
+            try:
+                export_metrics(path)
+            except OSError:
+                pass
+
+        def loop():
+            while not stop.wait(interval):
+                write()
+
+        _exporter = threading.Thread(target=loop, daemon=True, name="metrics-export")
+        _exporter.start()
+        atexit.register(lambda: (stop.set(), write()))
+        return _exporter
@@ -0,0 +1,177 @@
+import json
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from core.metrics import METRICS
+from core.tool_calls import complete_with_tools, record_transcript
+
+
+def build_plan_prompt(chain_limit):
+    return (
+        "Given the user's request, break it down into concrete steps (tools or actions) to achieve the goal. "
+        f"Only plan up to {chain_limit} steps. Respond with JSON only, in the form "
+        '{"steps": [{"id": 1, "task": "...", "depends_on": []}, {"id": 2, "task": "...", "depends_on": [1]}]}. '
+        "List in depends_on only the steps whose results a step actually needs, so independent steps can run in parallel."
+    )
+
+
+def _extract_json(text):
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    candidate = fenced.group(1) if fenced else text
+    start = candidate.find("{")
+    end = candidate.rfind("}")
+    if start < 0 or end <= start:
+        return None
+    try:
+        return json.loads(candidate[start:end + 1])
+    except ValueError:
+        return None
+
+
+def parse_plan(text, limit=25):
+    """Parse a plan reply into [{"id", "task", "depends_on"}] in plan order.
+
+    Structured JSON plans keep their dependencies; a plain numbered list is
+    treated as a sequential chain, matching the old behaviour.
+    """
+    data = _extract_json(text)
+    steps = []
+    if isinstance(data, dict) and isinstance(data.get("steps"), list):
+        for index, raw in enumerate(data["steps"][:limit], start=1):
+            if isinstance(raw, str):
+                raw = {"task": raw}
+            if not isinstance(raw, dict) or not str(raw.get("task", "")).strip():
+                continue
+            step_id = raw.get("id", index)
+            depends_on = raw.get("depends_on") or []
+            if not isinstance(depends_on, list):
+                depends_on = [depends_on]
+            steps.append({"id": str(step_id), "task": str(raw["task"]).strip(), "depends_on": [str(dep) for dep in depends_on]})
+    else:
+        for index, task in enumerate(re.findall(r"\d+\.\s*(.*)", text)[:limit], start=1):
+            steps.append({"id": str(index), "task": task.strip(), "depends_on": [str(index - 1)] if index > 1 else []})
+    return _sanitize(steps)
+
+
+def _sanitize(steps):
+    seen = {}
+    for step in steps:
+        if step["id"] in seen:
+            step["id"] = f"{step['id']}#{len(seen)}"
+        seen[step["id"]] = step
+    for step in steps:
+        step["depends_on"] = [dep for dep in dict.fromkeys(step["depends_on"]) if dep in seen and dep != step["id"]]
+    if _has_cycle(steps):
+        for index, step in enumerate(steps):
+            step["depends_on"] = [steps[index - 1]["id"]] if index else []
+    return steps
+
+
+def _has_cycle(steps):
+    remaining = {step["id"]: set(step["depends_on"]) for step in steps}
+    while remaining:
+        ready = [step_id for step_id, deps in remaining.items() if not deps]
+        if not ready:
+            return True
+        for step_id in ready:
+            del remaining[step_id]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return False
+
+
+def _ancestors(step, by_id):
+    """Ids of every step ``step`` depends on, directly or transitively."""
+    found = set()
+    stack = list(step["depends_on"])
+    while stack:
+        dep = stack.pop()
+        if dep not in found:
+            found.add(dep)
+            stack.extend(by_id[dep]["depends_on"])
+    return found
+
+
+def _step_messages(base_messages, step, by_id, results):
+    """The plan-time conversation plus every ancestor's task and result, in plan order."""
+    messages = list(base_messages)
+    ancestors = _ancestors(step, by_id)
+    for dep in (step_id for step_id in by_id if step_id in ancestors):
+        messages.append({"role": "user", "content": f"Step: {by_id[dep]['task']}"})
+        messages.append({"role": "assistant", "content": results[dep]})
+    messages.append({"role": "user", "content": f"Step: {step['task']}"})
+    return messages
+
+
+def _run_step(client, messages, executor, max_rounds):
+    start = time.time()
+    if executor is not None:
+        reply, transcript, _ = complete_with_tools(client, messages, executor, max_rounds=max_rounds, profile="step")
+    else:
+        parts = []
+        for chunk in client.stream_chat(messages, profile="step"):
+            parts.append(chunk)
+        reply = "".join(parts)
+        transcript = [{"role": "assistant", "content": reply}]
+    elapsed = time.time() - start
+    METRICS.observe("stage_seconds", elapsed, stage="step")
+    return reply, transcript, elapsed
+
+
+def execute_plan(client, history, steps, max_workers=4, executor=None, max_rounds=5, on_step_start=None, on_step_end=None):
+    """Run plan steps as a DAG on a bounded worker pool.
+
+    Each step sees the conversation as it was when the plan was made plus the
+    results of all its direct and transitive dependencies. Once every step
+    has finished, results are merged into ``history`` in plan order so the
+    transcript is deterministic.
+    With an ``executor`` each step may call tools before giving its answer.
+    ``on_step_start(step)`` and ``on_step_end(step, response, elapsed)`` are
+    called from the scheduling thread as steps start and finish.
+    Returns [{"id", "step", "response", "elapsed"}] in plan order.
+    """
+    base_messages = history.get_messages()
+    by_id = {step["id"]: step for step in steps}
+    pending = {step["id"]: set(step["depends_on"]) for step in steps}
+    results = {}
+    transcripts = {}
+    timings = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        running = {}
+        while pending or running:
+            for step_id in [sid for sid, deps in pending.items() if not deps]:
+                del pending[step_id]
+                if executor is not None and executor.cancelled:
+                    results[step_id], timings[step_id] = "Step cancelled.", 0.0
+                    transcripts[step_id] = [{"role": "assistant", "content": results[step_id]}]
+                    for deps in pending.values():
+                        deps.discard(step_id)
+                    continue
+                messages = _step_messages(base_messages, by_id[step_id], by_id, results)
+                if on_step_start:
+                    on_step_start(by_id[step_id])
+                running[pool.submit(_run_step, client, messages, executor, max_rounds)] = step_id
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step_id = running.pop(future)
+                try:
+                    results[step_id], transcripts[step_id], timings[step_id] = future.result()
+                except Exception as exc:
+                    results[step_id], timings[step_id] = f"Step failed: {exc}", 0.0
+                    transcripts[step_id] = [{"role": "assistant", "content": results[step_id]}]
+                if on_step_end:
+                    on_step_end(by_id[step_id], results[step_id], timings[step_id])
+                for deps in pending.values():
+                    deps.discard(step_id)
+    chain_history = []
+    for step in steps:
+        history.add_user_message(f"Step: {step['task']}")
+        record_transcript(history, transcripts[step["id"]])
+        chain_history.append({
+            "id": step["id"],
+            "step": step["task"],
+            "response": results[step["id"]].strip(),
+            "elapsed": timings[step["id"]],
+        })
+    return chain_history
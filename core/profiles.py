@@ -0,0 +1,109 @@
+"""Named generation profiles for the different kinds of model call.
+
+Each call site asks for a profile by name (``router``, ``plan``, ``step``,
+``summary``, ``rollup``, ``skill`` or ``chat``) and the client applies its
+model, ``max_tokens``, ``temperature`` and ``stop`` sequences to the
+request. Unset fields fall back to the configured model and the server's
+defaults.
+
+Overrides are applied in this order:
+
+1. the built-in defaults below;
+2. ``LLM_FAST_MODEL``, which moves ``router`` and ``rollup`` to a small model;
+3. a JSON file named by ``LLM_PROFILES_FILE``, shaped like
+   ``{"router": {"model": "llama3.2:1b", "max_tokens": 8}}``;
+4. ``LLM_PROFILE_<NAME>`` variables such as
+   ``LLM_PROFILE_ROUTER="model=llama3.2:1b,max_tokens=8,stop=\\n"``, where
+   several stop sequences are separated with ``|``.
+
+The router defaults suit reasoning models that think before answering; with
+a router model that answers directly, ``max_tokens=8,stop=\\n`` as above
+cuts the call to a few tokens.
+"""
+import codecs
+import json
+import re
+
+FIELDS = ("model", "max_tokens", "temperature", "stop")
+
+DEFAULT_PROFILES = {
+    "chat": {},
+    "skill": {},
+    "step": {},
+    "summary": {},
+    "plan": {"temperature": 0.2, "max_tokens": 1024},
+    # The router only needs "plan" or "respond", but the default model thinks
+    # first, so there is room for a <think> block and no newline stop.
+    "router": {"temperature": 0.0, "max_tokens": 1024},
+    "rollup": {"temperature": 0.2, "max_tokens": 512},
+}
+
+FAST_PROFILES = ("router", "rollup")
+
+# Queued behind interactive calls when the backends are saturated.
+BACKGROUND_PROFILES = ("rollup",)
+
+_ESCAPE_RE = re.compile(r"\\(?:u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|[\\nrt0'\"])")
+
+
+def _unescape(text):
+    # Only the escapes themselves are decoded, so other non-ASCII text survives.
+    return _ESCAPE_RE.sub(lambda match: codecs.decode(match.group(0), "unicode_escape"), text)
+
+
+def _coerce(field, value):
+    if value in (None, ""):
+        return None
+    if field == "max_tokens":
+        return int(value)
+    if field == "temperature":
+        return float(value)
+    if field == "stop":
+        if isinstance(value, list):
+            # JSON strings are already unescaped.
+            return [str(item) for item in value if item] or None
+        return [_unescape(item) for item in str(value).split("|") if item] or None
+    return str(value)
+
+
+def parse_profile(spec):
+    """Parse ``key=value,key=value`` into a profile dict."""
+    profile = {}
+    for item in spec.split(","):
+        field, sep, value = item.partition("=")
+        field = field.strip()
+        if sep and field in FIELDS:
+            profile[field] = _coerce(field, value.strip())
+    return profile
+
+
+def load_profiles(config):
+    """Return ``{name: profile}`` after applying the config's overrides."""
+    profiles = {name: dict(profile) for name, profile in DEFAULT_PROFILES.items()}
+    fast_model = config.get("fast_model")
+    if fast_model:
+        for name in FAST_PROFILES:
+            profiles[name]["model"] = fast_model
+    path = config.get("profiles_file")
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            data = {}
+        for name, profile in data.items() if isinstance(data, dict) else ():
+            if isinstance(profile, dict):
+                target = profiles.setdefault(name, {})
+                target.update((field, _coerce(field, profile[field])) for field in FIELDS if field in profile)
+    for name, spec in config.get("profile_overrides", {}).items():
+        profiles.setdefault(name, {}).update(parse_profile(spec))
+    return profiles
+
+
+def request_params(profile, default_model):
+    """Request fields for ``profile``; unset values are left to the server."""
+    params = {"model": profile.get("model") or default_model}
+    for field in ("max_tokens", "temperature", "stop"):
+        if profile.get(field) is not None:
+            params[field] = profile[field]
+    return params
@@ -0,0 +1,71 @@
+import json
+import threading
+import uuid
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:12]
+
+
+class JsonLineWriter:
+    """Write one JSON object per line; safe to share between threads."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def send(self, payload):
+        line = json.dumps(payload) + "\n"
+        with self._lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+
+class DeltaCoalescer:
+    """Batch streamed text into ``delta`` events.
+
+    Text is held until ``interval`` seconds have passed since the first
+    pending piece or ``max_chars`` have accumulated, so a fast stream turns
+    into a few dozen events per second instead of one per token. A timer
+    flushes the tail when the stream pauses.
+    """
+
+    def __init__(self, send, request_id, interval=0.05, max_chars=512):
+        self.send = send
+        self.request_id = request_id
+        self.interval = interval
+        self.max_chars = max_chars
+        self._parts = []
+        self._size = 0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, text):
+        if not text:
+            return
+        with self._lock:
+            self._parts.append(text)
+            self._size += len(text)
+            if self._size < self.max_chars:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.interval, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._parts:
+                return
+            content = "".join(self._parts)
+            self._parts = []
+            self._size = 0
+            # Send under the lock so deltas can't overtake each other.
+            self.send({"type": "delta", "request_id": self.request_id, "content": content})
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,248 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from core.config import cache_dir
+from core.metrics import METRICS
+
+ROUTER_MODES = {"llm", "local", "speculative"}
+
+_TOKEN_RE = re.compile(r"[a-z0-9_./-]+")
+_PLAN_RE = re.compile(
+    r"\b(create|write|generate|edit|modify|refactor|fix|rename|delete|remove|install|run|execute|build|"
+    r"deploy|commit|revert|implement|add|update|search|grep|find|scaffold|set up|setup|step by step)\b"
+)
+_PATH_RE = re.compile(r"(\w+\.(py|js|ts|cs|json|md|txt|toml|yaml|yml|ipynb)\b|[\\/]\w)")
+_QUESTION_RE = re.compile(r"^(what|why|who|when|where|how|which|is|are|can|does|do|explain|define|describe)\b")
+
+
+def build_router_prompt(user_input):
+    return (
+        "Does the following user request require a multi-step plan (tools/actions) or can it be answered directly? "
+        "Reply with 'plan' or 'respond'. Request: '" + user_input + "'"
+    )
+
+
+_THINK_RE = re.compile(r"<think>.*?(</think>|\Z)", re.DOTALL | re.IGNORECASE)
+
+
+def parse_decision(text):
+    # Reasoning models may echo both options while thinking; only the answer counts.
+    answer = _THINK_RE.sub("", text)
+    return "plan" if "plan" in answer.strip().lower() else "respond"
+
+
+def _normalize(text):
+    return " ".join(text.lower().split())
+
+
+def _tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class KeywordClassifier:
+    """Regex rules that only answer when the intent is unambiguous."""
+
+    name = "keyword"
+
+    def classify(self, text):
+        lowered = _normalize(text)
+        wants_action = bool(_PLAN_RE.search(lowered))
+        mentions_path = bool(_PATH_RE.search(lowered))
+        if wants_action and mentions_path:
+            return "plan"
+        if not wants_action and not mentions_path and _QUESTION_RE.match(lowered) and len(lowered) < 200:
+            return "respond"
+        return None
+
+
+class NaiveBayesClassifier:
+    """Multinomial naive Bayes over bag-of-words, trained from logged decisions."""
+
+    name = "bayes"
+
+    def __init__(self, min_examples=20, min_margin=2.0):
+        self.min_examples = min_examples
+        self.min_margin = min_margin
+        self.class_counts = Counter()
+        self.word_counts = {"plan": Counter(), "respond": Counter()}
+        self.vocabulary = set()
+
+    def update(self, text, decision):
+        if decision not in self.word_counts:
+            return
+        tokens = _tokenize(text)
+        self.class_counts[decision] += 1
+        self.word_counts[decision].update(tokens)
+        self.vocabulary.update(tokens)
+
+    def classify(self, text):
+        total = sum(self.class_counts.values())
+        if total < self.min_examples or len(self.class_counts) < 2:
+            return None
+        tokens = _tokenize(text)
+        if not tokens:
+            return None
+        vocab_size = len(self.vocabulary) + 1
+        scores = {}
+        for decision, counts in self.word_counts.items():
+            denominator = sum(counts.values()) + vocab_size
+            score = math.log(self.class_counts[decision] / total)
+            for token in tokens:
+                score += math.log((counts[token] + 1) / denominator)
+            scores[decision] = score
+        best, runner_up = sorted(scores, key=scores.get, reverse=True)
+        if scores[best] - scores[runner_up] < self.min_margin:
+            return None
+        return best
+
+
+class DecisionLog:
+    """Append-only JSONL log of router decisions made by the model."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_dir(), "router_decisions.jsonl")
+        self._lock = threading.Lock()
+
+    def load(self):
+        entries = []
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("decision") in ("plan", "respond") and entry.get("text"):
+                    entries.append(entry)
+        return entries
+
+    def append(self, text, decision):
+        with self._lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as handle:
+                    handle.write(json.dumps({"text": text, "decision": decision, "ts": time.time()}) + "\n")
+            except OSError:
+                pass
+
+
+class Router:
+    """Decide whether a request needs a plan, avoiding the model call when possible.
+
+    Modes:
+      llm          always ask the model (original behaviour)
+      local        decision cache, then local classifiers, then the model
+      speculative  like local, but when the model has to be asked the direct
+                   answer is streamed concurrently and the losing branch is
+                   cancelled
+    """
+
+    def __init__(self, client, mode="local", classifiers=None, log=None):
+        self.client = client
+        self.mode = mode if mode in ROUTER_MODES else "local"
+        self.log = log or DecisionLog()
+        self.bayes = NaiveBayesClassifier()
+        self.classifiers = classifiers if classifiers is not None else [KeywordClassifier(), self.bayes]
+        self.cache = {}
+        # One router serves every session; learning and classifying share state.
+        self._lock = threading.Lock()
+        for entry in self.log.load():
+            self._learn(entry["text"], entry["decision"])
+
+    def _learn(self, text, decision):
+        with self._lock:
+            self.cache[_normalize(text)] = decision
+            self.bayes.update(text, decision)
+
+    def classify_local(self, user_input):
+        key = _normalize(user_input)
+        with self._lock:
+            if key in self.cache:
+                return self.cache[key], "cache"
+            for classifier in self.classifiers:
+                decision = classifier.classify(user_input)
+                if decision:
+                    return decision, classifier.name
+        return None, None
+
+    def _ask_model(self, user_input, messages, cancel_event=None):
+        router_messages = list(messages) + [{"role": "user", "content": build_router_prompt(user_input)}]
+        parts = []
+        for chunk in self.client.stream_chat(router_messages, cancel_event=cancel_event, profile="router"):
+            parts.append(chunk)
+        decision = parse_decision("".join(parts))
+        self._learn(user_input, decision)
+        self.log.append(user_input, decision)
+        return decision
+
+    def route(self, user_input, messages, cancel_event=None, on_chunk=None):
+        """Return {"decision", "source", "elapsed", "response", "streamed"}.
+
+        ``messages`` is the conversation including the user's message. When
+        ``response`` is not None it already holds the direct answer; if
+        ``streamed`` is true it has also been passed to ``on_chunk``, the
+        buffered part as soon as the decision was "respond" and the rest as it
+        arrived. ``cancel_event`` stops any model call made to decide and the
+        speculative answer with it.
+        """
+        start = time.time()
+        if self.mode != "llm":
+            decision, source = self.classify_local(user_input)
+            if decision:
+                METRICS.observe("stage_seconds", time.time() - start, stage="router")
+                return {"decision": decision, "source": source, "elapsed": time.time() - start, "response": None, "streamed": False}
+        if self.mode != "speculative":
+            decision = self._ask_model(user_input, messages, cancel_event)
+            METRICS.observe("stage_seconds", time.time() - start, stage="router")
+            return {"decision": decision, "source": "model", "elapsed": time.time() - start, "response": None, "streamed": False}
+
+        cancel = threading.Event()
+        parts = []
+        errors = []
+        lock = threading.Lock()
+        sink = []
+
+        def _direct():
+            try:
+                for chunk in self.client.stream_chat(messages, cancel_event=cancel):
+                    with lock:
+                        parts.append(chunk)
+                        if sink:
+                            sink[0](chunk)
+            except Exception as exc:
+                errors.append(exc)
+
+        def _cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+
+        worker = threading.Thread(target=_direct, daemon=True)
+        worker.start()
+        try:
+            decision = self._ask_model(user_input, messages, cancel_event)
+        except Exception:
+            self.client.abort(cancel)
+            raise
+        # Only the decision counts; the speculative reply is a model call of its own.
+        METRICS.observe("stage_seconds", time.time() - start, stage="router")
+        if decision == "plan" or _cancelled():
+            self.client.abort(cancel)
+            return {"decision": decision, "source": "model", "elapsed": time.time() - start, "response": None, "streamed": False}
+        if on_chunk is not None:
+            with lock:
+                if parts:
+                    on_chunk("".join(parts))
+                sink.append(on_chunk)
+        while worker.is_alive():
+            worker.join(0.1)
+            if _cancelled():
+                # The session's abort only knows its own event; close ours too.
+                self.client.abort(cancel)
+                worker.join()
+        with lock:
+            response = None if errors and not sink else "".join(parts)
+        return {"decision": decision, "source": "model", "elapsed": time.time() - start, "response": response, "streamed": bool(sink)}
@@ -0,0 +1,312 @@
+"""Offline retrieval over workspace files for the semantic_search tool.
+
+Files are cut into overlapping line windows. Each chunk is indexed two
+ways: term frequencies for BM25 (identifiers are also split into their
+camelCase/snake_case parts) and a signed hashed-feature vector of its terms
+and their character trigrams, which lets a query match related word forms
+("caching" and "cache") that share no exact term. Both are persisted per
+file and only files whose size or mtime changed are re-chunked. NumPy is
+used for the vector scores when it is installed.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+
+from core.config import cache_dir
+from core.file_index import get_index
+
+INDEX_VERSION = 1
+CHUNK_LINES = 40
+CHUNK_STRIDE = 30
+MAX_FILE_BYTES = 512 * 1024
+VECTOR_DIM = 512
+SNIPPET_LINES = 12
+MAX_RESULTS = 8
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+VECTOR_WEIGHT = 0.35
+
+_TOKEN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_PARTS = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Lowercased identifiers plus the parts of compound ones."""
+    terms = []
+    for token in _TOKEN.findall(text):
+        lower = token.lower()
+        if len(lower) > 1:
+            terms.append(lower)
+        parts = _PARTS.findall(token)
+        if len(parts) > 1:
+            terms.extend(part.lower() for part in parts if len(part) > 1)
+    return terms
+
+
+def _bucket(feature):
+    value = zlib.crc32(feature.encode("utf-8"))
+    return value % VECTOR_DIM, 1.0 if value & 0x80000000 else -1.0
+
+
+def hashed_vector(counts):
+    """Return a unit-length sparse vector ``{bucket: weight}`` for term ``counts``."""
+    vector = {}
+    for term, count in counts.items():
+        weight = 1.0 + math.log(count)
+        features = [term]
+        padded = f"#{term}#"
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        share = weight / len(features) ** 0.5
+        for feature in features:
+            bucket, sign = _bucket(feature)
+            vector[bucket] = vector.get(bucket, 0.0) + sign * share
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    if not norm:
+        return {}
+    return {bucket: round(value / norm, 4) for bucket, value in vector.items() if value}
+
+
+def chunk_lines(lines):
+    """Yield ``(start, end)`` 1-based inclusive line windows over ``lines``."""
+    start = 0
+    while start < len(lines):
+        end = min(start + CHUNK_LINES, len(lines))
+        yield start + 1, end
+        if end == len(lines):
+            break
+        start += CHUNK_STRIDE
+
+
+def _read_text(path):
+    try:
+        with open(path, "rb") as handle:
+            data = handle.read(MAX_FILE_BYTES + 1)
+    except OSError:
+        return None
+    if len(data) > MAX_FILE_BYTES or b"\0" in data[:8192]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+class SemanticIndex:
+    """BM25 postings and hashed vectors over chunks of the files under ``root``."""
+
+    def __init__(self, root, path=None):
+        self.root = os.path.abspath(root)
+        key = hashlib.sha256(self.root.encode("utf-8")).hexdigest()[:12]
+        self.path = path or os.path.join(cache_dir(), f"semantic-{key}.json")
+        self.files = self._load()
+        self._postings = {}
+        self._lengths = {}
+        self._vectors = {}
+        self._matrix = None
+        self._lock = threading.Lock()
+        for rel, record in self.files.items():
+            self._add_postings(rel, record)
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != INDEX_VERSION or data.get("root") != self.root:
+            return {}
+        return data.get("files", {})
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as handle:
+                json.dump({"version": INDEX_VERSION, "root": self.root, "files": self.files}, handle, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def _chunk_file(self, rel, size, mtime):
+        text = _read_text(os.path.join(self.root, *rel.split("/")))
+        chunks = []
+        if text:
+            lines = text.splitlines()
+            for start, end in chunk_lines(lines):
+                counts = Counter(tokenize("\n".join(lines[start - 1:end])))
+                if not counts:
+                    continue
+                vector = hashed_vector(counts)
+                # Path terms help queries that name a module or directory.
+                counts.update(tokenize(rel))
+                chunks.append([start, end, sum(counts.values()), dict(counts), sorted(vector.items())])
+        return {"size": size, "mtime": mtime, "chunks": chunks}
+
+    def _add_postings(self, rel, record):
+        for number, (_, _, length, counts, vector) in enumerate(record["chunks"]):
+            key = (rel, number)
+            self._lengths[key] = length
+            self._vectors[key] = vector
+            for term, count in counts.items():
+                self._postings.setdefault(term, {})[key] = count
+
+    def _remove_postings(self, rel, record):
+        for number, (_, _, _, counts, _) in enumerate(record["chunks"]):
+            key = (rel, number)
+            self._lengths.pop(key, None)
+            self._vectors.pop(key, None)
+            for term in counts:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(key, None)
+                    if not postings:
+                        del self._postings[term]
+
+    def update(self):
+        """Re-chunk files that were added or changed and drop deleted ones."""
+        stats = get_index(self.root).entries()
+        changed = False
+        with self._lock:
+            for rel in [rel for rel in self.files if rel not in stats]:
+                self._remove_postings(rel, self.files.pop(rel))
+                changed = True
+            for rel, (size, mtime) in stats.items():
+                record = self.files.get(rel)
+                if record is not None and record["size"] == size and record["mtime"] == mtime:
+                    continue
+                if record is not None:
+                    self._remove_postings(rel, record)
+                if size > MAX_FILE_BYTES:
+                    record = {"size": size, "mtime": mtime, "chunks": []}
+                else:
+                    record = self._chunk_file(rel, size, mtime)
+                self.files[rel] = record
+                self._add_postings(rel, record)
+                changed = True
+            if changed:
+                self._matrix = None
+                self._save()
+        return changed
+
+    def _bm25(self, terms):
+        total = len(self._lengths)
+        if not total:
+            return {}
+        average = sum(self._lengths.values()) / total
+        scores = {}
+        for term in set(terms):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, count in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[key] / average)
+                scores[key] = scores.get(key, 0.0) + idf * count * (BM25_K1 + 1) / (count + norm)
+        return scores
+
+    def _cosine(self, query_vector):
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        if np is None:
+            scores = {}
+            for key, vector in self._vectors.items():
+                score = sum(query_vector.get(bucket, 0.0) * weight for bucket, weight in vector)
+                if score > 0:
+                    scores[key] = score
+            return scores
+        if self._matrix is None:
+            keys = list(self._vectors)
+            matrix = np.zeros((len(keys), VECTOR_DIM), dtype=np.float32)
+            for row, key in enumerate(keys):
+                for bucket, weight in self._vectors[key]:
+                    matrix[row, bucket] = weight
+            self._matrix = (keys, matrix)
+        keys, matrix = self._matrix
+        query = np.zeros(VECTOR_DIM, dtype=np.float32)
+        for bucket, weight in query_vector.items():
+            query[bucket] = weight
+        values = matrix @ query
+        return {keys[row]: float(values[row]) for row in np.nonzero(values > 0)[0]}
+
+    def search(self, query, limit=MAX_RESULTS):
+        """Return ``[(score, path, start, end)]`` for the best matching chunks."""
+        self.update()
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            lexical = self._bm25(terms)
+            vector = self._cosine(hashed_vector(Counter(terms)))
+            chunks = {(rel, number): self.files[rel]["chunks"][number] for rel, number in set(lexical) | set(vector)}
+        top = max(lexical.values(), default=0.0) or 1.0
+        ranked = []
+        for key, chunk in chunks.items():
+            score = (1 - VECTOR_WEIGHT) * lexical.get(key, 0.0) / top + VECTOR_WEIGHT * vector.get(key, 0.0)
+            ranked.append((score, key[0], chunk[0], chunk[1]))
+        ranked.sort(key=lambda item: (-item[0], item[1], item[2]))
+        results = []
+        covered = {}
+        for score, rel, start, end in ranked:
+            # Overlapping windows of one file would repeat the same lines.
+            if any(start <= other_end and other_start <= end for other_start, other_end in covered.get(rel, [])):
+                continue
+            covered.setdefault(rel, []).append((start, end))
+            results.append((score, rel, start, end))
+            if len(results) >= limit:
+                break
+        return results
+
+
+def get_semantic_index(root=None):
+    root = os.path.abspath(root or os.getcwd())
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = SemanticIndex(root)
+        return index
+
+
+def _snippet(root, rel, start, end, terms):
+    text = _read_text(os.path.join(root, *rel.split("/"))) or ""
+    lines = text.splitlines()[start - 1:end]
+    # Start the excerpt at the first line that mentions a query term.
+    offset = 0
+    for number, line in enumerate(lines):
+        if terms & set(tokenize(line)):
+            offset = max(number - 2, 0)
+            break
+    excerpt = lines[offset:offset + SNIPPET_LINES]
+    first = start + offset
+    return first, first + len(excerpt) - 1, "\n".join(line.rstrip() for line in excerpt)
+
+
+def run_semantic_search(args):
+    """``semantic_search`` front end: ``query|max_results``."""
+    parts = args.split("|")
+    query = parts[0].strip()
+    if not query:
+        return "semantic_search error: query required."
+    try:
+        limit = int(parts[1]) if len(parts) > 1 and parts[1].strip() else MAX_RESULTS
+    except ValueError:
+        return "semantic_search error: max_results must be a number."
+    index = get_semantic_index()
+    try:
+        results = index.search(query, max(limit, 1))
+    except Exception as exc:
+        return f"semantic_search error: {exc}"
+    if not results:
+        return "No relevant code found."
+    terms = set(tokenize(query))
+    blocks = []
+    for score, rel, start, end in results:
+        first, last, excerpt = _snippet(index.root, rel, start, end, terms)
+        blocks.append(f"{rel}:{first}-{last} (chunk {start}-{end}, score {score:.2f})\n{excerpt}")
+    return "\n\n".join(blocks)
@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ChatSession:
+    """One conversation: its history, tool executor and pending requests."""
+
+    def __init__(self, session_id, history, executor, tools, client=None, debug_metrics=False):
+        self.id = session_id
+        self.history = history
+        self.executor = executor
+        self.tools = tools
+        self.client = client
+        self.debug_metrics = debug_metrics
+        self.queue = deque()
+        self.busy = False
+        self.current = None
+        self.last_used = time.time()
+
+    def cancel(self):
+        """Abort the running request: its model stream and any tools still running."""
+        if self.client is not None:
+            self.client.abort(self.executor.cancel_event)
+        else:
+            self.executor.cancel()
+
+    def close(self):
+        self.cancel()
+        self.executor.shutdown()
+
+
+class SessionRegistry:
+    """Run requests for many sessions concurrently.
+
+    Requests within a session are handled one at a time in arrival order so
+    its history stays consistent; different sessions run in parallel on a
+    shared pool, so one slow chat doesn't hold up the others. With
+    ``spares`` that many sessions are built ahead of time so opening a new
+    chat doesn't wait for its history and executor to be set up.
+    """
+
+    def __init__(self, factory, max_workers=8, spares=0):
+        self.factory = factory
+        self.spares = spares
+        self._sessions = {}
+        self._requests = {}
+        self._spare = []
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="session")
+        self._refill()
+
+    def _refill(self):
+        with self._lock:
+            missing = self.spares - len(self._spare)
+        for _ in range(max(missing, 0)):
+            threading.Thread(target=self._build_spare, daemon=True).start()
+
+    def _build_spare(self):
+        session = self.factory(None)
+        with self._lock:
+            if len(self._spare) < self.spares:
+                self._spare.append(session)
+                return
+        session.close()
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                return session
+            if self._spare:
+                session = self._spare.pop()
+                session.id = session_id
+                session.last_used = time.time()
+                self._sessions[session_id] = session
+        if session is not None:
+            self._refill()
+            return session
+        session = self.factory(session_id)
+        with self._lock:
+            # Another thread may have created it while we were building ours.
+            existing = self._sessions.setdefault(session_id, session)
+        if existing is not session:
+            session.close()
+        return existing
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def submit(self, session_id, request_id, run, on_skip=None):
+        """Queue ``run(session)``; ``on_skip()`` is called if it is cancelled before it starts."""
+        session = self.get(session_id)
+        with self._lock:
+            session.queue.append((request_id, run, on_skip))
+            self._requests[request_id] = session
+            session.last_used = time.time()
+            if session.busy:
+                return
+            session.busy = True
+        self._pool.submit(self._drain, session)
+
+    def _drain(self, session):
+        while True:
+            with self._lock:
+                if not session.queue:
+                    session.busy = False
+                    session.current = None
+                    return
+                request_id, run, _ = session.queue.popleft()
+                # Reset under the lock so a cancel can't land between the
+                # reset and the request becoming current.
+                session.executor.reset()
+                session.current = request_id
+            try:
+                run(session)
+            finally:
+                with self._lock:
+                    self._requests.pop(request_id, None)
+                    session.current = None
+                    session.last_used = time.time()
+
+    def cancel(self, request_id=None, session_id=None):
+        """Cancel one request, or everything queued and running in a session.
+
+        Returns False when there was nothing to cancel.
+        """
+        with self._lock:
+            if request_id is not None:
+                session = self._requests.get(request_id)
+            else:
+                session = self._sessions.get(session_id)
+            if session is None:
+                return False
+            skipped = [entry for entry in session.queue if request_id is None or entry[0] == request_id]
+            for entry in skipped:
+                session.queue.remove(entry)
+                self._requests.pop(entry[0], None)
+            running = session.current is not None and (request_id is None or session.current == request_id)
+        if running:
+            session.cancel()
+        for _, _, on_skip in skipped:
+            if on_skip:
+                on_skip()
+        return running or bool(skipped)
+
+    def close(self, session_id):
+        self.cancel(session_id=session_id)
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def evict_idle(self, max_idle):
+        """Close sessions with nothing queued or running for ``max_idle`` seconds."""
+        cutoff = time.time() - max_idle
+        with self._lock:
+            idle = [sid for sid, session in self._sessions.items() if not session.busy and session.last_used < cutoff]
+            evicted = [self._sessions.pop(sid) for sid in idle]
+        for session in evicted:
+            session.close()
+        return [session.id for session in evicted]
+
+    def busy(self, prefix=""):
+        """Return True while any session whose id starts with ``prefix`` has work."""
+        with self._lock:
+            return any(session.busy for sid, session in self._sessions.items() if sid.startswith(prefix))
+
+    def shutdown(self, cancel=False):
+        """Stop accepting work; with ``cancel`` abort what is running, then wait for it."""
+        if cancel:
+            for session in self.sessions():
+                self.cancel(session_id=session.id)
+        self._pool.shutdown(wait=True)
+        with self._lock:
+            spares, self._spare, self.spares = self._spare, [], 0
+        for session in spares:
+            session.close()
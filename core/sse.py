@@ -0,0 +1,125 @@
+import codecs
+import json
+
+_loads = json.JSONDecoder().decode
+
+
+class StreamError(RuntimeError):
+    """Raised when the server reports an error inside the event stream."""
+
+
+class ChatStreamParser:
+    """Incremental parser for OpenAI-style chat completion SSE streams.
+
+    Feed it raw bytes as they come off the socket; it decodes UTF-8
+    incrementally (multi-byte characters may straddle chunks), splits events
+    on blank lines and returns the content deltas found in each chunk.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buffer = ""
+        self.parts = []
+        self.usage = None
+        self.finish_reason = None
+        self.done = False
+        self.malformed = 0
+
+    @property
+    def content(self):
+        return "".join(self.parts)
+
+    def feed(self, data):
+        if self.done:
+            return []
+        text = self._decoder.decode(data)
+        if not text:
+            return []
+        buffer = self._buffer + text
+        if "\r" in buffer:
+            # Hold a trailing CR back in case its LF arrives in the next chunk.
+            held = "\r" if buffer.endswith("\r") else ""
+            buffer = buffer[: len(buffer) - len(held)].replace("\r\n", "\n").replace("\r", "\n") + held
+        blocks = buffer.split("\n\n")
+        self._buffer = blocks.pop()
+        deltas = []
+        self._consume(self._payloads(blocks), deltas)
+        return deltas
+
+    def close(self):
+        """Flush any trailing event that was not terminated by a blank line."""
+        if self.done:
+            return []
+        tail = self._buffer + self._decoder.decode(b"", final=True)
+        self._buffer = ""
+        deltas = []
+        if tail.strip():
+            self._consume(self._payloads([tail.replace("\r\n", "\n").strip("\n")]), deltas)
+        return deltas
+
+    def _payloads(self, blocks):
+        payloads = []
+        for block in blocks:
+            if block.startswith("data: ") and "\n" not in block:
+                payload = block[6:]
+            else:
+                data_lines = []
+                for line in block.split("\n"):
+                    if line.startswith("data:"):
+                        value = line[5:]
+                        data_lines.append(value[1:] if value.startswith(" ") else value)
+                if not data_lines:
+                    continue
+                payload = "\n".join(data_lines)
+            if payload == "[DONE]":
+                self.done = True
+                self._buffer = ""
+                break
+            payloads.append(payload)
+        return payloads
+
+    def _consume(self, payloads, deltas):
+        if not payloads:
+            return
+        # Decode every complete event in this chunk with a single json call;
+        # fall back to per-event decoding only if one of them is malformed.
+        try:
+            chunks = _loads("[" + ",".join(payloads) + "]")
+        except ValueError:
+            chunks = []
+            for payload in payloads:
+                try:
+                    chunks.append(_loads(payload))
+                except ValueError:
+                    self.malformed += 1
+        for chunk in chunks:
+            if isinstance(chunk, dict):
+                self._apply(chunk, deltas)
+            else:
+                self.malformed += 1
+
+    def _apply(self, chunk, deltas):
+        error = chunk.get("error")
+        if error:
+            message = error.get("message", error) if isinstance(error, dict) else error
+            raise StreamError(f"Model server error: {message}")
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        for choice in chunk.get("choices") or ():
+            delta = choice.get("delta")
+            content = delta.get("content") if delta else None
+            if content:
+                self.parts.append(content)
+                deltas.append(content)
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+
+
+def iter_chat_deltas(chunks, parser=None):
+    """Yield content deltas from an iterable of raw byte chunks."""
+    parser = parser or ChatStreamParser()
+    for data in chunks:
+        yield from parser.feed(data)
+        if parser.done:
+            return
+    yield from parser.close()
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core.config import cache_dir
+
+SUMMARY_PROMPT = (
+    "Summarize the following conversation excerpt for your own later reference. Keep facts, decisions, "
+    "file names, commands, results and open tasks; drop pleasantries. Reply with the summary only, "
+    "in at most {words} words."
+)
+
+
+def chunk_key(chunk):
+    payload = json.dumps([[m.get("role"), m.get("content")] for m in chunk], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class BackgroundSummarizer:
+    """Produce rollup summaries with the model on a background worker.
+
+    Jobs run in FIFO order on a single thread, so a higher-level rollup only
+    runs after the summaries it is built from have landed. Results are cached
+    by chunk hash (in memory and in an append-only file) so a chunk is never
+    summarized twice.
+    """
+
+    def __init__(self, client, path=None, words=150, max_workers=1):
+        self.client = client
+        self.words = words
+        self.path = path or os.path.join(cache_dir(), "summaries.jsonl")
+        self._lock = threading.Lock()
+        self._cache = self._load()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summary")
+
+    def _load(self):
+        cache = {}
+        if not os.path.exists(self.path):
+            return cache
+        with open(self.path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("key") and entry.get("summary"):
+                    cache[entry["key"]] = entry["summary"]
+        return cache
+
+    def _store(self, key, summary):
+        with self._lock:
+            self._cache[key] = summary
+            try:
+                with open(self.path, "a", encoding="utf-8") as handle:
+                    handle.write(json.dumps({"key": key, "summary": summary}, ensure_ascii=False) + "\n")
+            except OSError:
+                pass
+
+    def cached(self, chunk):
+        with self._lock:
+            return self._cache.get(chunk_key(chunk))
+
+    def submit(self, chunk, on_done):
+        """Summarize ``chunk`` in the background and call ``on_done(summary)``."""
+        return self._pool.submit(self._run, list(chunk), on_done)
+
+    def _run(self, chunk, on_done):
+        # The key is computed when the job runs, after any placeholder
+        # summaries inside the chunk have been replaced.
+        key = chunk_key(chunk)
+        with self._lock:
+            summary = self._cache.get(key)
+        if summary is None:
+            transcript = "\n\n".join(f"{m['role']}: {m['content']}" for m in chunk)
+            messages = [
+                {"role": "system", "content": SUMMARY_PROMPT.format(words=self.words)},
+                {"role": "user", "content": transcript},
+            ]
+            try:
+                summary = "".join(self.client.stream_chat(messages, profile="rollup")).strip()
+            except Exception:
+                return None
+            if not summary:
+                return None
+            self._store(key, summary)
+        on_done(summary)
+        return summary
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,340 @@
+"""Persistent shell sessions behind run_in_terminal, shell, run and test.
+
+Each session is one long-lived shell (bash or sh; PowerShell on Windows)
+fed commands on stdin. After every command the shell prints a marker line
+carrying a per-command token, the exit status and the working directory;
+a reader thread strips the markers and appends everything else to a
+bounded ring buffer, which is also what get_terminal_output reads. So
+``cd``, exported variables and an activated virtualenv persist between
+calls. A command that outlives its timeout has the session's whole process
+group killed; the next command starts a fresh shell in the same directory.
+"""
+import atexit
+import base64
+import os
+import re
+import shutil
+import signal
+import subprocess
+import threading
+import time
+import uuid
+
+from core.config import load_config
+
+MARKER = b"__CODEX_DONE_"
+_MARKER_LINE = re.compile(rb"__CODEX_DONE_([0-9a-f]{32})__ (-?\d+) ([^\r\n]*)\r?\n")
+# Longest tail that may still turn out to be the start of a marker line.
+_MARKER_HOLD = 4096
+MAX_OUTPUT = 32 * 1024
+
+
+class RingBuffer:
+    """The last ``capacity`` bytes of a stream, addressed by absolute offset."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = bytearray()
+        self.end = 0
+
+    @property
+    def start(self):
+        return self.end - len(self.data)
+
+    def write(self, chunk):
+        self.data += chunk
+        self.end += len(chunk)
+        if len(self.data) > self.capacity:
+            del self.data[:len(self.data) - self.capacity]
+
+    def read(self, since, until=None):
+        """Return ``(bytes, dropped)`` between two offsets; ``dropped`` counts bytes already overwritten."""
+        until = self.end if until is None else until
+        dropped = max(self.start - since, 0)
+        since = max(since, self.start)
+        return bytes(self.data[since - self.start:until - self.start]), dropped
+
+
+class Command:
+    def __init__(self, text, start):
+        self.text = text
+        self.token = uuid.uuid4().hex
+        self.start = start
+        self.end = None
+        self.exit_code = None
+        self.started = time.time()
+        self.finished = None
+        self.timed_out = False
+        self.done = threading.Event()
+
+
+def _shell_argv():
+    if os.name == "nt":
+        exe = shutil.which("pwsh") or shutil.which("powershell") or "powershell"
+        return [exe, "-NoLogo", "-NoProfile", "-NonInteractive", "-Command", "-"]
+    bash = shutil.which("bash")
+    return [bash, "--noprofile", "--norc"] if bash else ["/bin/sh"]
+
+
+def _frame(command, token):
+    """Script for one command, followed by its marker line."""
+    if os.name == "nt":
+        # One line per command: PowerShell reading stdin runs each line as it
+        # arrives, so the command travels base64-encoded.
+        encoded = base64.b64encode(command.encode("utf-8")).decode("ascii")
+        return (
+            "$global:LASTEXITCODE = 0; "
+            f"try {{ Invoke-Expression ([Text.Encoding]::UTF8.GetString([Convert]::FromBase64String('{encoded}'))) "
+            "| Out-Host; $__ok = $? } catch { Write-Host $_; $__ok = $false }; "
+            "$__code = if ($LASTEXITCODE) { $LASTEXITCODE } elseif ($__ok) { 0 } else { 1 }; "
+            f"Write-Host \"__CODEX_DONE_{token}__ $__code $((Get-Location).Path)\"\n"
+        )
+    # Commands read from /dev/null rather than swallowing the rest of our stdin.
+    return f"{{\n{command}\n}} < /dev/null\nprintf '{MARKER.decode()}%s__ %s %s\\n' {token} $? \"$PWD\"\n"
+
+
+class ShellSession:
+    """One persistent shell; commands run one at a time."""
+
+    def __init__(self, name, cwd=None, buffer_bytes=1024 * 1024):
+        self.name = name
+        self.cwd = os.path.abspath(cwd or os.getcwd())
+        self.buffer = RingBuffer(buffer_bytes)
+        self.history = []
+        self.proc = None
+        self._current = None
+        self._lock = threading.Lock()
+        self._state = threading.Condition()
+        self.restarts = 0
+
+    def _start(self):
+        env = dict(os.environ, TERM="dumb", PAGER="cat", GIT_PAGER="cat")
+        kwargs = {}
+        if os.name == "nt":
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        self.proc = subprocess.Popen(
+            _shell_argv(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=self.cwd if os.path.isdir(self.cwd) else None,
+            env=env,
+            bufsize=0,
+            **kwargs,
+        )
+        threading.Thread(target=self._read, args=(self.proc,), daemon=True, name=f"terminal-{self.name}").start()
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def _read(self, proc):
+        pending = b""
+        fd = proc.stdout.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, 65536)
+            except OSError:
+                chunk = b""
+            if not chunk:
+                break
+            pending += chunk
+            while True:
+                match = _MARKER_LINE.search(pending)
+                if match is None:
+                    break
+                self._append(pending[:match.start()])
+                pending = pending[match.end():]
+                self._finish(match.group(1).decode(), int(match.group(2)), match.group(3).decode("utf-8", "replace"))
+            hold = pending.find(MARKER[:2], max(len(pending) - _MARKER_HOLD, 0))
+            while hold >= 0 and not MARKER.startswith(pending[hold:hold + len(MARKER)]):
+                hold = pending.find(MARKER[:2], hold + 1)
+            if hold < 0:
+                self._append(pending)
+                pending = b""
+            else:
+                self._append(pending[:hold])
+                pending = pending[hold:]
+        self._append(pending)
+        code = proc.wait()
+        with self._state:
+            current = self._current
+        if current is not None and not current.done.is_set() and self.proc is proc:
+            self._finish(current.token, code, self.cwd)
+
+    def _append(self, data):
+        if data:
+            with self._state:
+                self.buffer.write(data)
+                self._state.notify_all()
+
+    def _finish(self, token, code, cwd):
+        with self._state:
+            command = self._current
+            if command is None or command.token != token:
+                return
+            if cwd:
+                self.cwd = cwd
+            command.exit_code = code
+            command.end = self.buffer.end
+            command.finished = time.time()
+            command.done.set()
+            self._state.notify_all()
+
+    def kill(self):
+        """Kill the shell and everything it started."""
+        proc = self.proc
+        if proc is None or proc.poll() is not None:
+            return
+        try:
+            if os.name == "nt":
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)], capture_output=True)
+            else:
+                os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+
+    def run(self, command, timeout=30.0):
+        """Run ``command`` and return the finished (or timed-out) Command."""
+        with self._lock:
+            if not self.alive():
+                if self.proc is not None:
+                    self.restarts += 1
+                self._start()
+            with self._state:
+                current = self._current = Command(command, self.buffer.end)
+            self.history.append(current)
+            del self.history[:-50]
+            try:
+                self.proc.stdin.write(_frame(command, current.token).encode("utf-8"))
+                self.proc.stdin.flush()
+            except OSError:
+                pass
+            if not current.done.wait(timeout):
+                current.timed_out = True
+                self.kill()
+                with self._state:
+                    current.end = self.buffer.end
+                    current.finished = time.time()
+                    current.done.set()
+            return current
+
+    def output(self, command, limit=MAX_OUTPUT):
+        """Return the command's output so far, keeping the last ``limit`` bytes."""
+        with self._state:
+            data, dropped = self.buffer.read(command.start, command.end)
+        if len(data) > limit:
+            dropped += len(data) - limit
+            data = data[-limit:]
+        text = data.decode("utf-8", errors="replace")
+        if dropped:
+            text = f"[... {dropped} earlier bytes not shown]\n" + text
+        return text
+
+    def tail(self, lines):
+        with self._state:
+            data, _ = self.buffer.read(self.buffer.start)
+        return "\n".join(data.decode("utf-8", errors="replace").splitlines()[-lines:])
+
+    def last(self):
+        with self._state:
+            return self.history[-1] if self.history else None
+
+
+class TerminalPool:
+    """Named shell sessions, started on first use."""
+
+    def __init__(self):
+        config = load_config()
+        self.timeout = config.get("terminal_timeout", 30.0)
+        self.buffer_bytes = config.get("terminal_buffer_kb", 1024) * 1024
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, name="default"):
+        with self._lock:
+            session = self._sessions.get(name)
+            if session is None:
+                session = self._sessions[name] = ShellSession(name, buffer_bytes=self.buffer_bytes)
+            return session
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.kill()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = TerminalPool()
+            atexit.register(_pool.close)
+        return _pool
+
+
+def run_command(command, timeout=None, session="default"):
+    """Run ``command`` in a persistent session; returns ``(exit_code, output, note)``."""
+    pool = get_pool()
+    shell = pool.get(session)
+    result = shell.run(command, timeout or pool.timeout)
+    output = shell.output(result).strip()
+    note = ""
+    if result.timed_out:
+        note = f"[timed out after {timeout or pool.timeout:.0f}s; the command and the terminal were killed, the next command starts a new shell in {shell.cwd}]"
+    return (None if result.timed_out else result.exit_code), output, note
+
+
+def run_terminal_tool(args, tool, failure="Command failed (code {code}): {output}", success="{output}", empty="(No output)", timeout=None):
+    """Shared front end for the terminal tools; formats match the old one-shot tools."""
+    command = args.strip()
+    if not command:
+        return f"{tool} error: no command provided."
+    try:
+        code, output, note = run_command(command, timeout)
+    except Exception as exc:
+        return f"{tool} error: {exc}"
+    if note:
+        return f"{output}\n{note}" if output else note
+    if code != 0:
+        return failure.format(code=code, output=output or "(No output)")
+    return success.format(output=output) if output else empty
+
+
+def get_terminal_output(args=""):
+    """Output of the last command, or the last N lines of the terminal with ``N``."""
+    shell = get_pool().get()
+    value = args.strip()
+    if value.isdigit():
+        return shell.tail(int(value)) or "(No output)"
+    command = shell.last()
+    if command is None:
+        return "No command has been run in the terminal yet."
+    output = shell.output(command).strip() or "(No output)"
+    if not command.done.is_set():
+        return f"{output}\n[still running for {time.time() - command.started:.0f}s]"
+    return output
+
+
+def terminal_last_command(_args=""):
+    shell = get_pool().get()
+    command = shell.last()
+    if command is None:
+        return "No command has been run in the terminal yet."
+    if not command.done.is_set():
+        status = f"running for {time.time() - command.started:.1f}s"
+    elif command.timed_out:
+        status = "timed out and was killed"
+    else:
+        status = f"exit code {command.exit_code} after {command.finished - command.started:.1f}s"
+    return f"{command.text}\n({status}; cwd {shell.cwd})"
@@ -0,0 +1,25 @@
+MESSAGE_OVERHEAD = 4
+
+
+def approximate_tokens(text):
+    """Cheap local estimate (~4 characters per token), good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def load_tokenizer(name="approx", model=None):
+    """Return a callable text -> token count.
+
+    ``tiktoken`` is used when requested and installed; otherwise the local
+    approximation is returned.
+    """
+    if name == "tiktoken":
+        try:
+            import tiktoken  # type: ignore
+        except ImportError:
+            return approximate_tokens
+        try:
+            encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    return approximate_tokens
@@ -0,0 +1,152 @@
+"""Memoized results for read-only tools.
+
+A tool opts in with a ``cache`` entry in its metadata, e.g.
+``{"scope": "file", "path_arg": 0}``: the path is that ``|``-separated
+argument (``default`` when empty) and the scope says what a result depends
+on:
+
+``file``  the file's size and mtime
+``dir``   the directory and the size/mtime of its direct entries
+``tree``  every non-ignored file below the path (a file path acts like ``file``)
+``git``   the workspace tree plus ``.git/HEAD`` and ``.git/index``
+
+A result is reused while that stamp is unchanged; ``bypass`` lists argument
+values whose result depends on more than that. A tool whose calls have
+side effects of their own (read_file moves its ``next`` cursor) must not
+opt in, since a hit skips the call. Tools that modify files declare
+``invalidates``: ``{"path_arg": 0}`` drops entries overlapping that path,
+``"all"`` clears the cache. Stamps already catch most writes; the explicit
+invalidation covers edits that land within one mtime tick.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from core.ignore import walk
+from core.metrics import METRICS
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _dir_stamp(path):
+    digest = hashlib.sha1(repr(_stat(path)).encode())
+    try:
+        with os.scandir(path) as it:
+            for entry in sorted(it, key=lambda e: e.name):
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                digest.update(f"{entry.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8", "replace"))
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def _tree_stamp(path):
+    if not os.path.isdir(path):
+        return _stat(path)
+    digest = hashlib.sha1()
+    for rel, entry in walk(path):
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        digest.update(f"{rel}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8", "replace"))
+    return digest.hexdigest()
+
+
+def _git_stamp(path):
+    git = os.path.join(path, ".git")
+    return _tree_stamp(path), _stat(os.path.join(git, "HEAD")), _stat(os.path.join(git, "index"))
+
+
+_STAMPS = {"file": _stat, "dir": _dir_stamp, "tree": _tree_stamp, "git": _git_stamp}
+
+
+def _arg_path(args, spec):
+    parts = args.split("|")
+    index = spec.get("path_arg", 0)
+    value = parts[index].strip() if len(parts) > index else ""
+    return os.path.abspath(value or spec.get("default", "."))
+
+
+def _overlaps(a, b):
+    return a == b or a.startswith(b + os.sep) or b.startswith(a + os.sep)
+
+
+class ToolCache:
+    """LRU of ``(tool, args) -> result`` validated by filesystem stamps."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def call(self, name, tool, args):
+        """Run ``tool`` for ``args``, answering from the cache when its inputs are unchanged."""
+        spec = tool.get("cache")
+        if not spec:
+            try:
+                return str(tool["run"](args))
+            finally:
+                self._after_write(tool.get("invalidates"), args)
+        if any(part.strip() in spec.get("bypass", ()) for part in args.split("|")):
+            return str(tool["run"](args))
+        scope = spec.get("scope", "file")
+        path = os.path.abspath(".") if scope == "git" else _arg_path(args, spec)
+        key = (name, os.getcwd(), args.strip())
+        # Stamp before running: a change made meanwhile shows up as a miss later.
+        stamp = _STAMPS[scope](path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                METRICS.inc("cache_lookups_total", cache="tool", result="hit")
+                return entry[1]
+            self.misses += 1
+        METRICS.inc("cache_lookups_total", cache="tool", result="miss")
+        result = str(tool["run"](args))
+        with self._lock:
+            self._entries[key] = (stamp, result, path, scope)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def _after_write(self, spec, args):
+        if not spec:
+            return
+        if spec == "all":
+            self.clear()
+            return
+        self.invalidate(_arg_path(args, spec))
+
+    def invalidate(self, path):
+        """Drop entries for ``path``, anything above or below it, and git status."""
+        path = os.path.abspath(path)
+        with self._lock:
+            stale = [key for key, (_, _, dep, scope) in self._entries.items() if scope == "git" or _overlaps(dep, path)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations, "entries": len(self._entries)}
@@ -0,0 +1,243 @@
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from core.metrics import METRICS
+
+_TOOL_CALL_RE = re.compile(r"<tool:([^>\s]+)>(.*?)</tool>", re.DOTALL)
+_TAG_OPEN = "<tool:"
+
+_current_executor = None
+_local = threading.local()
+
+
+def current_executor():
+    """Return the ToolExecutor running the calling tool (used by multi_tool_use.parallel).
+
+    Outside a tool call this is the most recently created executor.
+    """
+    return getattr(_local, "executor", None) or _current_executor
+
+
+class ToolCallDetector:
+    """Spot complete ``<tool:name>args</tool>`` tags while tokens are still arriving."""
+
+    def __init__(self):
+        self._tail = ""
+        self.calls = []
+
+    def feed(self, delta):
+        self._tail += delta
+        found = []
+        consumed = 0
+        for match in _TOOL_CALL_RE.finditer(self._tail):
+            found.append({"name": match.group(1), "args": match.group(2).strip()})
+            consumed = match.end()
+        rest = self._tail[consumed:]
+        open_at = rest.find(_TAG_OPEN)
+        if open_at >= 0:
+            # An unterminated tag: keep it until its closing tag arrives.
+            self._tail = rest[open_at:]
+        else:
+            # Keep just enough to recognise a tag opening split across deltas.
+            partial = rest.rfind("<")
+            self._tail = rest[partial:] if partial >= 0 and _TAG_OPEN.startswith(rest[partial:]) else ""
+        self.calls.extend(found)
+        return found
+
+
+def find_tool_calls(text):
+    return [{"name": m.group(1), "args": m.group(2).strip()} for m in _TOOL_CALL_RE.finditer(text)]
+
+
+class ToolExecutor:
+    """Run tool calls on a shared thread pool with per-tool limits and timeouts.
+
+    Python threads cannot be killed, so a timed-out or cancelled call is
+    reported back to the model immediately while its thread finishes on its
+    own in the background.
+    """
+
+    def __init__(self, tools, max_workers=8, timeout=60.0, default_limit=4, limits=None, cache=None):
+        global _current_executor
+        self.tools = tools
+        self.cache = cache
+        self.timeout = timeout
+        self.default_limit = default_limit
+        self.limits = dict(limits or {})
+        self._semaphores = {}
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        _current_executor = self
+
+    def _semaphore(self, name):
+        with self._lock:
+            if name not in self._semaphores:
+                self._semaphores[name] = threading.BoundedSemaphore(self.limits.get(name, self.default_limit))
+            return self._semaphores[name]
+
+    def _invoke(self, name, args):
+        tool = self.tools.get(name)
+        if tool is None:
+            return f"Tool '{name}' not found."
+        semaphore = self._semaphore(name)
+        while not semaphore.acquire(timeout=0.1):
+            if self._cancel.is_set():
+                return f"Tool '{name}' cancelled."
+        _local.executor = self
+        start = time.perf_counter()
+        try:
+            if self._cancel.is_set():
+                return f"Tool '{name}' cancelled."
+            if self.cache is not None:
+                return self.cache.call(name, tool, args)
+            return str(tool["run"](args))
+        except Exception as exc:
+            return f"Tool '{name}' failed: {exc}"
+        finally:
+            _local.executor = None
+            METRICS.observe("tool_seconds", time.perf_counter() - start, tool=name)
+            semaphore.release()
+
+    def submit(self, call):
+        call = dict(call)
+        call["started"] = time.time()
+        call["future"] = self._pool.submit(self._invoke, call["name"], call["args"])
+        return call
+
+    def result(self, call):
+        deadline = call["started"] + self.timeout
+        while True:
+            remaining = deadline - time.time()
+            try:
+                return call["future"].result(timeout=max(min(remaining, 0.1), 0.0))
+            except FutureTimeout:
+                if self._cancel.is_set():
+                    call["future"].cancel()
+                    return f"Tool '{call['name']}' cancelled."
+                if remaining <= 0.1:
+                    call["future"].cancel()
+                    return f"Tool '{call['name']}' timed out after {self.timeout:.0f}s."
+
+    def call(self, name, args=""):
+        """Run one call now, e.g. a manual ``!tool`` command, through the cache and limits."""
+        return self.run_all([{"name": name, "args": args}])[0]
+
+    def run_all(self, calls):
+        """Run calls concurrently and return their results in call order."""
+        if not calls:
+            return []
+        # Nested dispatch (e.g. multi_tool_use.parallel) gets its own pool so
+        # it never waits on a worker slot held by its caller.
+        with ThreadPoolExecutor(max_workers=min(len(calls), 8)) as pool:
+            submitted = []
+            for call in calls:
+                submitted.append((call, time.time(), pool.submit(self._invoke, call["name"], call.get("args", ""))))
+            results = []
+            for call, started, future in submitted:
+                try:
+                    results.append(future.result(timeout=max(self.timeout - (time.time() - started), 0.0)))
+                except FutureTimeout:
+                    results.append(f"Tool '{call['name']}' timed out after {self.timeout:.0f}s.")
+            return results
+
+    def cancel(self):
+        self._cancel.set()
+
+    def reset(self):
+        self._cancel.clear()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def cancel_event(self):
+        """Event set by cancel(); pass it to ``stream_chat`` to stop streams too."""
+        return self._cancel
+
+    def shutdown(self):
+        self.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def format_tool_results(calls, results):
+    blocks = [f"<tool_result:{call['name']}>\n{result}\n</tool_result>" for call, result in zip(calls, results)]
+    return "Tool results:\n" + "\n".join(blocks)
+
+
+def complete_with_tools(client, messages, executor, on_chunk=None, initial_reply=None, max_rounds=5, use_cache=False, profile="chat"):
+    """Stream a reply, dispatch any tool calls as they appear and loop.
+
+    Returns ``(reply, transcript, call_count)`` where ``transcript`` holds the
+    assistant/tool-result messages produced along the way, ending with the
+    final assistant reply.
+    """
+    messages = list(messages)
+    transcript = []
+    call_count = 0
+    reply = initial_reply
+    for round_index in range(max_rounds + 1):
+        detector = ToolCallDetector()
+        pending = []
+        if reply is None:
+            parts = []
+            for chunk in client.stream_chat(messages, cancel_event=executor.cancel_event, use_cache=use_cache, profile=profile):
+                parts.append(chunk)
+                if on_chunk:
+                    on_chunk(chunk)
+                if round_index < max_rounds:
+                    pending.extend(executor.submit(call) for call in detector.feed(chunk))
+            reply = "".join(parts)
+        elif round_index < max_rounds:
+            pending.extend(executor.submit(call) for call in detector.feed(reply))
+        assistant_message = {"role": "assistant", "content": reply}
+        transcript.append(assistant_message)
+        if not pending or executor.cancelled:
+            break
+        results = [executor.result(call) for call in pending]
+        call_count += len(pending)
+        tool_message = {"role": "user", "content": format_tool_results(pending, results)}
+        transcript.append(tool_message)
+        messages.extend([assistant_message, tool_message])
+        reply = None
+    return reply, transcript, call_count
+
+
+def record_transcript(history, transcript):
+    for message in transcript:
+        if message["role"] == "assistant":
+            history.add_assistant_message(message["content"])
+        else:
+            history.add_user_message(message["content"])
+
+
+def parse_parallel_calls(args):
+    """Parse multi_tool_use.parallel arguments into [{"name", "args"}].
+
+    Accepts a JSON list or ``{"tool_uses": [...]}`` where each entry has
+    ``name``/``args`` or ``recipient_name``/``parameters``; falls back to
+    embedded ``<tool:name>args</tool>`` tags.
+    """
+    try:
+        data = json.loads(args)
+    except ValueError:
+        return find_tool_calls(args)
+    if isinstance(data, dict):
+        data = data.get("tool_uses", [])
+    calls = []
+    for entry in data if isinstance(data, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        name = entry.get("name") or entry.get("recipient_name") or ""
+        if name.startswith("functions."):
+            name = name[len("functions."):]
+        params = entry.get("args", entry.get("parameters", ""))
+        if isinstance(params, dict):
+            params = params.get("args", json.dumps(params))
+        if name:
+            calls.append({"name": name, "args": str(params)})
+    return calls
@@ -1,31 +1,191 @@
-import os
+import ast
 import importlib.util
+import json
+import os
+import threading
+
+from core.config import cache_dir
 
 TOOLS_DIR = os.path.join(os.path.dirname(__file__), "..", "tools")
+MANIFEST_VERSION = 2
+# Optional metadata keys passed through to the tool table (see core.tool_cache).
+EXTRA_KEYS = ("cache", "invalidates")
+
+_modules = {}
+_import_lock = threading.Lock()
+
+
+def _manifest_path():
+    return os.path.join(cache_dir(), "tool_manifest.json")
+
+
+def _import_module(path):
+    with _import_lock:
+        mod = _modules.get(path)
+        if mod is None:
+            name = os.path.splitext(os.path.basename(path))[0]
+            spec = importlib.util.spec_from_file_location(name, path)
+            mod = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(mod)
+            _modules[path] = mod
+        return mod
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, SyntaxError):
+        return None
+
+
+def _static_entries(tree):
+    """Extract tool names/descriptions from a module's AST without running it.
+
+    Returns a list of entries, [] for modules that define no tools, or None if
+    the module builds its metadata dynamically and has to be imported once.
+    """
+    assigned = {}
+    has_run = False
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id in ("metadata", "TOOLS"):
+                    assigned[target.id] = node.value
+        elif isinstance(node, ast.FunctionDef) and node.name == "run":
+            has_run = True
+    if "TOOLS" in assigned:
+        value = assigned["TOOLS"]
+        if not isinstance(value, ast.List):
+            return None
+        entries = []
+        for element in value.elts:
+            if not isinstance(element, ast.Dict):
+                return None
+            fields = {_literal(k): v for k, v in zip(element.keys, element.values) if k is not None}
+            name = _literal(fields["name"]) if "name" in fields else None
+            description = _literal(fields["description"]) if "description" in fields else ""
+            if not isinstance(name, str) or not isinstance(description, str):
+                return None
+            entry = {"name": name, "description": description, "kind": "TOOLS"}
+            for key in EXTRA_KEYS:
+                if key in fields:
+                    entry[key] = _literal(fields[key])
+            entries.append(entry)
+        return entries
+    if "metadata" in assigned and has_run:
+        metadata = _literal(assigned["metadata"])
+        if not isinstance(metadata, dict):
+            return None
+        if not metadata.get("name"):
+            return []
+        entry = {"name": metadata["name"], "description": metadata.get("description", ""), "kind": "metadata"}
+        entry.update((key, metadata[key]) for key in EXTRA_KEYS if key in metadata)
+        return [entry]
+    return []
+
+
+def _imported_entries(path):
+    mod = _import_module(path)
+    entries = []
+    if hasattr(mod, "TOOLS"):
+        for tool in mod.TOOLS:
+            if tool.get("name") and callable(tool.get("run")):
+                entry = {"name": tool["name"], "description": tool.get("description", ""), "kind": "TOOLS"}
+                entry.update((key, tool[key]) for key in EXTRA_KEYS if key in tool)
+                entries.append(entry)
+    elif hasattr(mod, "metadata") and callable(getattr(mod, "run", None)) and mod.metadata.get("name"):
+        entry = {"name": mod.metadata["name"], "description": mod.metadata.get("description", ""), "kind": "metadata"}
+        entry.update((key, mod.metadata[key]) for key in EXTRA_KEYS if key in mod.metadata)
+        entries.append(entry)
+    return entries
+
+
+def _scan(path):
+    with open(path, "r", encoding="utf-8") as handle:
+        source = handle.read()
+    try:
+        entries = _static_entries(ast.parse(source, filename=path))
+    except SyntaxError:
+        return []
+    if entries is None:
+        entries = _imported_entries(path)
+    return entries
+
+
+def _load_manifest():
+    try:
+        with open(_manifest_path(), "r", encoding="utf-8") as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def _save_manifest(files):
+    path = _manifest_path()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as handle:
+            json.dump({"version": MANIFEST_VERSION, "files": files}, handle)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _lazy_runner(path, name, kind):
+    def _run(arguments):
+        mod = _import_module(path)
+        if kind == "metadata":
+            return mod.run(arguments)
+        for tool in mod.TOOLS:
+            if tool.get("name") == name:
+                return tool["run"](arguments)
+        return f"Tool '{name}' not found."
+    return _run
+
 
 def load_tools():
+    """Return {name: {"run", "description"}} without importing tool modules.
+
+    Names and descriptions come from a manifest cached per file (keyed by
+    mtime and size); modules are imported the first time one of their tools
+    runs. When a name is defined twice, a dedicated ``metadata`` module wins
+    over a ``TOOLS`` collection, then the alphabetically first file wins.
+    """
     tools = {}
     if not os.path.isdir(TOOLS_DIR):
         return tools
-    for fname in os.listdir(TOOLS_DIR):
+    tools_dir = os.path.abspath(TOOLS_DIR)
+    cached = _load_manifest()
+    files = {}
+    dirty = False
+    for fname in sorted(os.listdir(tools_dir)):
         if not fname.endswith(".py") or fname.startswith("_"):
             continue
-        path = os.path.join(TOOLS_DIR, fname)
-        spec = importlib.util.spec_from_file_location(fname[:-3], path)
-        mod = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(mod)
-        if hasattr(mod, "TOOLS"):
-            for tool in mod.TOOLS:
-                name = tool.get("name")
-                run_fn = tool.get("run")
-                desc = tool.get("description", "")
-                if name and callable(run_fn):
-                    tools[name] = {"run": run_fn, "description": desc}
-        elif hasattr(mod, "metadata") and hasattr(mod, "run"):
-            name = mod.metadata.get("name")
-            if name and callable(mod.run):
-                tools[name] = {
-                    "run": mod.run,
-                    "description": mod.metadata.get("description", ""),
+        path = os.path.join(tools_dir, fname)
+        stat = os.stat(path)
+        entry = cached.get(path)
+        if not entry or entry.get("mtime") != stat.st_mtime_ns or entry.get("size") != stat.st_size:
+            entry = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "tools": _scan(path)}
+            dirty = True
+        files[path] = entry
+    if dirty or set(files) != {p for p in cached if p.startswith(tools_dir + os.sep)}:
+        merged = {p: e for p, e in cached.items() if not p.startswith(tools_dir + os.sep)}
+        merged.update(files)
+        _save_manifest(merged)
+
+    sources = {}
+    for kind in ("metadata", "TOOLS"):
+        for path, entry in files.items():
+            for tool in entry["tools"]:
+                if tool["kind"] != kind or tool["name"] in sources:
+                    continue
+                sources[tool["name"]] = path
+                tools[tool["name"]] = {
+                    "run": _lazy_runner(path, tool["name"], kind),
+                    "description": tool["description"],
                 }
-    return tools
+                tools[tool["name"]].update((key, tool[key]) for key in EXTRA_KEYS if tool.get(key))
+    return dict(sorted(tools.items()))
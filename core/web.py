@@ -0,0 +1,340 @@
+"""Fetching and text extraction for the fetch_webpage tool.
+
+Pages come through one pooled ``requests`` session with a capped,
+streamed download. Bodies are turned into readable text by an incremental
+``html.parser`` extractor as they arrive (scripts, styles and other
+non-content elements are dropped). The extracted text is cached on disk
+with the response's validators, so a repeat fetch is served locally while
+fresh (Cache-Control max-age) and otherwise revalidated with
+If-None-Match / If-Modified-Since. With a query, the text is split into
+chunks and the best BM25 matches are returned in page order.
+"""
+import codecs
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from html.parser import HTMLParser
+
+from core.config import cache_dir
+from core.metrics import METRICS
+from core.semantic import BM25_B, BM25_K1, tokenize
+
+MAX_DOWNLOAD_BYTES = 2 * 1024 * 1024
+MAX_RETURN_CHARS = 2000
+CHUNK_CHARS = 600
+DEFAULT_MAX_AGE = 300
+TIMEOUT = (5, 15)
+
+_SKIP = {"script", "style", "noscript", "template", "svg", "iframe", "canvas", "select", "button"}
+_BLOCK = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption", "footer",
+    "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p", "pre",
+    "section", "table", "td", "th", "tr", "ul",
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class TextExtractor(HTMLParser):
+    """Collect the readable blocks of an HTML document as it is fed."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self.title = ""
+        self._parts = []
+        self._skip = 0
+        self._pre = 0
+        self._in_title = False
+        self._prefix = ""
+
+    def _flush(self):
+        text = "".join(self._parts)
+        self._parts = []
+        text = text.strip("\n") if self._pre else " ".join(text.split())
+        if text:
+            self.blocks.append(self._prefix + text)
+        self._prefix = ""
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        if tag in _SKIP:
+            self._skip += 1
+            return
+        if self._skip:
+            return
+        if tag in _BLOCK:
+            self._flush()
+        if tag == "pre":
+            self._pre += 1
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self._prefix = "#" * int(tag[1]) + " "
+        elif tag == "li":
+            self._prefix = "- "
+
+    def handle_startendtag(self, tag, attrs):
+        if not self._skip and tag in _BLOCK:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        if tag in _SKIP:
+            self._skip = max(self._skip - 1, 0)
+            return
+        if self._skip:
+            return
+        if tag in _BLOCK:
+            self._flush()
+        if tag == "pre":
+            self._pre = max(self._pre - 1, 0)
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip:
+            self._parts.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+        self.title = " ".join(self.title.split())
+
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({
+                "User-Agent": "codex-agent/1.0 (+fetch_webpage)",
+                "Accept": "text/html,application/xhtml+xml,text/plain;q=0.9,*/*;q=0.5",
+            })
+            _session = session
+        return _session
+
+
+def _cache_path(url):
+    folder = os.path.join(cache_dir(), "web")
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, hashlib.sha256(url.encode("utf-8")).hexdigest()[:32] + ".json")
+
+
+def _load_cached(url):
+    try:
+        with open(_cache_path(url), "r", encoding="utf-8") as handle:
+            entry = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    return entry if entry.get("url") == url else None
+
+
+def _store(entry):
+    path = _cache_path(entry["url"])
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as handle:
+            json.dump(entry, handle)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _forget(url):
+    try:
+        os.unlink(_cache_path(url))
+    except OSError:
+        pass
+
+
+def _no_store(headers):
+    return "no-store" in headers.get("Cache-Control", "").lower()
+
+
+def _max_age(headers):
+    control = headers.get("Cache-Control", "").lower()
+    if "no-store" in control or "no-cache" in control:
+        return 0
+    match = re.search(r"max-age=(\d+)", control)
+    return int(match.group(1)) if match else DEFAULT_MAX_AGE
+
+
+def _extract(response, max_bytes):
+    """Decode and extract ``response`` chunk by chunk; returns ``(title, text, truncated)``."""
+    content_type = response.headers.get("Content-Type", "")
+    charset = re.search(r"charset=([\w.-]+)", content_type, re.IGNORECASE)
+    try:
+        decoder = codecs.getincrementaldecoder(charset.group(1) if charset else "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    is_html = "html" in content_type or not content_type
+    extractor = TextExtractor() if is_html else None
+    plain = []
+    received = 0
+    truncated = False
+    for chunk in response.iter_content(16 * 1024):
+        received += len(chunk)
+        if received > max_bytes:
+            chunk = chunk[:len(chunk) - (received - max_bytes)]
+            truncated = True
+        text = decoder.decode(chunk)
+        if extractor is not None:
+            extractor.feed(text)
+        else:
+            plain.append(text)
+        if truncated:
+            break
+    response.close()
+    if extractor is None:
+        return "", "".join(plain) + decoder.decode(b"", final=True), truncated
+    extractor.feed(decoder.decode(b"", final=True))
+    extractor.close()
+    return extractor.title, "\n\n".join(extractor.blocks), truncated
+
+
+def fetch_text(url, max_bytes=MAX_DOWNLOAD_BYTES):
+    """Return the cache entry for ``url``: ``{"title", "text", "truncated", "source", ...}``."""
+    cached = _load_cached(url)
+    now = time.time()
+    if cached and now - cached["fetched"] < cached.get("max_age", 0):
+        METRICS.inc("cache_lookups_total", cache="web", result="hit")
+        return dict(cached, source="cache")
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    response = _get_session().get(url, headers=headers, stream=True, timeout=TIMEOUT)
+    if response.status_code == 304 and cached:
+        response.close()
+        cached.update(fetched=now, max_age=_max_age(response.headers))
+        if _no_store(response.headers):
+            _forget(url)
+        else:
+            _store(cached)
+        METRICS.inc("cache_lookups_total", cache="web", result="revalidated")
+        return dict(cached, source="revalidated")
+    try:
+        response.raise_for_status()
+    except Exception:
+        response.close()
+        raise
+    title, text, truncated = _extract(response, max_bytes)
+    entry = {
+        "url": url,
+        "title": title,
+        "text": text,
+        "truncated": truncated,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "fetched": now,
+        "max_age": _max_age(response.headers),
+    }
+    if not _no_store(response.headers) and (entry["max_age"] or entry["etag"] or entry["last_modified"]):
+        _store(entry)
+    METRICS.inc("cache_lookups_total", cache="web", result="miss")
+    return dict(entry, source="network")
+
+
+def chunk_text(text, size=CHUNK_CHARS):
+    """Group paragraphs into chunks of roughly ``size`` characters."""
+    chunks = []
+    current = []
+    length = 0
+    for paragraph in text.split("\n\n"):
+        while len(paragraph) > size * 2:
+            cut = paragraph.rfind(" ", 0, size) if " " in paragraph[:size] else size
+            cut = cut if cut > 0 else size
+            if current:
+                chunks.append("\n\n".join(current))
+                current, length = [], 0
+            chunks.append(paragraph[:cut])
+            paragraph = paragraph[cut:].lstrip()
+        if current and length + len(paragraph) > size:
+            chunks.append("\n\n".join(current))
+            current, length = [], 0
+        current.append(paragraph)
+        length += len(paragraph) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def rank_chunks(chunks, query):
+    """Return chunk indexes ordered by BM25 relevance to ``query`` (matches only)."""
+    terms = set(tokenize(query))
+    if not terms or not chunks:
+        return []
+    counts = [Counter(tokenize(chunk)) for chunk in chunks]
+    lengths = [sum(count.values()) or 1 for count in counts]
+    average = sum(lengths) / len(lengths)
+    idf = {}
+    for term in terms:
+        df = sum(1 for count in counts if term in count)
+        if df:
+            idf[term] = math.log(1 + (len(chunks) - df + 0.5) / (df + 0.5))
+    scores = []
+    for number, count in enumerate(counts):
+        score = 0.0
+        for term, weight in idf.items():
+            tf = count.get(term, 0)
+            if not tf:
+                continue
+            score += weight * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths[number] / average))
+        if score > 0:
+            scores.append((-score, number))
+    scores.sort()
+    return [number for _, number in scores]
+
+
+def run_fetch_webpage(args, tool="fetch_webpage"):
+    """``url|query`` front end."""
+    if not args.strip():
+        return f"{tool} error: no URL provided."
+    url, _, query = args.partition("|")
+    url = url.strip()
+    query = query.strip()
+    try:
+        page = fetch_text(url)
+    except ImportError:
+        return f"{tool} error: requests library not installed."
+    except Exception as exc:
+        return f"{tool} error: {exc}"
+    text = page["text"]
+    header = f"{page['title'] or url} ({url}, {len(text)} chars of text, {page['source']})"
+    if page["truncated"]:
+        header += f" [page cut off after {MAX_DOWNLOAD_BYTES // 1024} KB]"
+    if not text.strip():
+        return f"{header}\n(No readable text on the page.)"
+    if not query:
+        body = text[:MAX_RETURN_CHARS]
+        return f"{header}\n{body}" + ("\n...[truncated]..." if len(text) > MAX_RETURN_CHARS else "")
+    chunks = chunk_text(text)
+    ranked = rank_chunks(chunks, query)
+    if not ranked:
+        return f"{header}\nQuery not found in page."
+    chosen = []
+    budget = MAX_RETURN_CHARS
+    for number in ranked:
+        if len(chunks[number]) > budget and chosen:
+            continue
+        chosen.append(number)
+        budget -= len(chunks[number])
+        if budget <= 0:
+            break
+    body = "\n...\n".join(chunks[number][:MAX_RETURN_CHARS] for number in sorted(chosen))
+    return f"{header}\n{body}"
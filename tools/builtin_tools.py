@@ -1,7 +1,5 @@
 import os
 import json
-import glob
-import re
 import subprocess
 from typing import Callable, List, Dict
 
@@ -62,66 +60,23 @@ def _create_notebook(args: str) -> str:
 
 
 def _fetch_webpage(args: str) -> str:
-    if not args.strip():
-        return "fetch_webpage error: no URL provided."
-    if '|' in args:
-        url, query = args.split('|', 1)
-        query = query.strip()
-    else:
-        url, query = args, ''
-    url = url.strip()
-    try:
-        import requests  # type: ignore
-    except ImportError:
-        return "fetch_webpage error: requests library not installed."
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        text = response.text
-        if query:
-            match = re.search(query, text, re.IGNORECASE)
-            if match:
-                start = max(match.start() - 120, 0)
-                end = min(match.end() + 120, len(text))
-                snippet = text[start:end]
-                return f"Found query snippet:\n{snippet}"
-            return "Query not found in page."
-        return text[:2000] + ('\n...[truncated]...' if len(text) > 2000 else '')
-    except Exception as exc:
-        return f"fetch_webpage error: {exc}"
+    from core.web import run_fetch_webpage
+    return run_fetch_webpage(args)
 
 
 def _file_search(args: str) -> str:
-    pattern = args.strip()
-    if not pattern:
-        return "file_search error: no pattern provided."
-    matches = glob.glob(pattern, recursive=True)
-    if not matches:
-        return "No files matched the pattern."
-    matches.sort()
-    return '\n'.join(matches[:200])
+    from core.file_index import run_file_search
+    return run_file_search(args)
 
 
 def _grep_search(args: str) -> str:
-    if '|' not in args:
-        return "grep_search usage: pattern|filename."
-    pattern, filename = args.split('|', 1)
-    pattern = pattern.strip()
-    filename = filename.strip()
-    if not pattern or not filename:
-        return "grep_search error: pattern and filename required."
-    if not os.path.exists(filename):
-        return f"grep_search error: {filename} not found."
-    try:
-        with open(filename, 'r', encoding='utf-8') as handle:
-            content = handle.read()
-        matches = re.findall(pattern, content, flags=re.MULTILINE)
-        if not matches:
-            return "No matches found."
-        sample = matches[:5]
-        return f"Found {len(matches)} matches: {sample}"
-    except Exception as exc:
-        return f"grep_search error: {exc}"
+    from core.grep import run_grep_tool
+    return run_grep_tool(args, "grep_search")
+
+
+def _semantic_search(args: str) -> str:
+    from core.semantic import run_semantic_search
+    return run_semantic_search(args)
 
 
 def _get_changed_files(_args: str) -> str:
@@ -134,60 +89,41 @@ def _get_changed_files(_args: str) -> str:
 
 
 def _list_dir(args: str) -> str:
-    path = args.strip() or '.'
-    if not os.path.exists(path):
-        return f"list_dir error: {path} not found."
-    try:
-        entries = sorted(os.listdir(path))
-        return '\n'.join(entries)
-    except Exception as exc:
-        return f"list_dir error: {exc}"
+    from core.file_index import run_list_dir
+    return run_list_dir(args)
 
 
 def _read_file(args: str) -> str:
-    if not args.strip():
-        return "read_file error: no arguments provided."
-    parts = [part.strip() for part in args.split('|')]
-    path = parts[0]
-    start = int(parts[1]) if len(parts) > 1 and parts[1] else None
-    end = int(parts[2]) if len(parts) > 2 and parts[2] else None
-    if not os.path.exists(path):
-        return f"read_file error: {path} not found."
-    try:
-        with open(path, 'r', encoding='utf-8') as handle:
-            lines = handle.readlines()
-        start_idx = start - 1 if start else 0
-        end_idx = end if end else len(lines)
-        selected = ''.join(lines[start_idx:end_idx])
-        return selected if selected else '(No content in specified range)'
-    except Exception as exc:
-        return f"read_file error: {exc}"
+    from core.file_reader import run_read_file
+    return run_read_file(args)
 
 
 def _run_in_terminal(args: str) -> str:
-    command = args.strip()
-    if not command:
-        return "run_in_terminal error: no command provided."
-    try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=30)
-        output = result.stdout.strip()
-        error = result.stderr.strip()
-        if result.returncode != 0:
-            return f"Command failed (code {result.returncode}): {error or output}"
-        return output or '(No output)'
-    except Exception as exc:
-        return f"run_in_terminal error: {exc}"
+    from core.terminal import run_terminal_tool
+    return run_terminal_tool(args, "run_in_terminal")
+
+
+def _get_terminal_output(args: str) -> str:
+    from core.terminal import get_terminal_output
+    return get_terminal_output(args)
+
+
+def _terminal_last_command(args: str) -> str:
+    from core.terminal import terminal_last_command
+    return terminal_last_command(args)
 
 
 _supported_tools: List[Dict[str, object]] = [
     {
         'name': 'create_directory',
         'description': 'Recursively create folders (mkdir -p).',
+        'invalidates': {'path_arg': 0},
         'run': _create_directory,
     },
     {
         'name': 'create_file',
         'description': 'Create a new file with given content.',
+        'invalidates': {'path_arg': 0},
         'run': _create_file,
     },
     {
@@ -197,39 +133,58 @@ _supported_tools: List[Dict[str, object]] = [
     },
     {
         'name': 'fetch_webpage',
-        'description': 'Download and parse webpage content for summarization.',
+        'description': 'Fetch a webpage as readable text. Usage: url|query; with a query, returns the ~2 KB of the page most relevant to it.',
         'run': _fetch_webpage,
     },
     {
         'name': 'file_search',
-        'description': 'Glob search for filenames within workspace.',
+        'description': 'Find workspace files by glob (e.g. **/*.py) or by fuzzy name (e.g. chatproc).',
         'run': _file_search,
     },
     {
         'name': 'grep_search',
-        'description': 'Regex or plain-text search across files.',
+        'description': 'Regex or plain-text search across the workspace. Usage: pattern|path|max_results.',
+        'cache': {'scope': 'tree', 'path_arg': 1},
         'run': _grep_search,
     },
+    {
+        'name': 'semantic_search',
+        'description': 'Natural-language search across workspace files, offline (BM25 plus hashed word vectors). Usage: query|max_results (default 8). Returns ranked snippets as path:start-end.',
+        'run': _semantic_search,
+    },
     {
         'name': 'get_changed_files',
         'description': 'List git changes (staged/unstaged/conflicts).',
+        'cache': {'scope': 'git'},
         'run': _get_changed_files,
     },
     {
         'name': 'list_dir',
-        'description': 'Directory listing (files and subfolders).',
+        'description': 'Directory listing (subfolders, then files with size and modification time).',
+        'cache': {'scope': 'dir', 'path_arg': 0},
         'run': _list_dir,
     },
     {
         'name': 'read_file',
-        'description': 'Read file contents by line range.',
+        'description': 'Read file contents by line range. Usage: path|start|end|max_bytes; a negative start reads the last lines, start=next continues the previous read. Output is capped at 64 KB per call.',
         'run': _read_file,
     },
     {
         'name': 'run_in_terminal',
-        'description': 'Execute PowerShell commands in persistent terminal.',
+        'description': 'Execute commands in a persistent terminal (cd, environment variables and activated virtualenvs carry over between calls).',
+        'invalidates': 'all',
         'run': _run_in_terminal,
     },
+    {
+        'name': 'get_terminal_output',
+        'description': 'Fetch output of the last terminal command (also while it is still running); pass a number to get that many trailing lines of the terminal instead.',
+        'run': _get_terminal_output,
+    },
+    {
+        'name': 'terminal_last_command',
+        'description': 'Return the last command executed in the terminal, its status and the working directory.',
+        'run': _terminal_last_command,
+    },
 ]
 
 
@@ -247,7 +202,6 @@ _unsupported_definitions = [
     ("open_simple_browser", "Open URL in VS Code Simple Browser."),
     ("run_notebook_cell", "Execute a specific Jupyter notebook cell."),
     ("run_vscode_command", "Invoke a VS Code command (new workspace setup)."),
-    ("semantic_search", "Natural-language search across workspace files."),
     ("get_search_view_results", "Return the current VS Code Search view results."),
     ("test_failure", "Report previously captured test failures."),
     ("vscode_searchExtensions_internal", "Search VS Code Marketplace for extensions."),
@@ -268,12 +222,9 @@ _unsupported_definitions = [
     ("mcp_pylance_mcp_s_pylanceUpdatePythonEnvironment", "Switch active Python environment."),
     ("mcp_pylance_mcp_s_pylanceWorkspaceRoots", "Return workspace root paths."),
     ("mcp_pylance_mcp_s_pylanceWorkspaceUserFiles", "List user Python files considered by Pylance."),
-    ("get_terminal_output", "Fetch output from a previously run terminal command."),
-    ("terminal_last_command", "Return the last command executed in terminal."),
     ("terminal_selection", "Return current selection from terminal buffer."),
     ("create_and_run_task", "Define and execute VS Code tasks via tasks.json."),
     ("runSubagent", "Launch autonomous agent for multi-step research or edits."),
-    ("multi_tool_use.parallel", "Execute multiple tool calls in parallel when safe."),
 ]
 
 
@@ -2,7 +2,8 @@ import subprocess
 
 metadata = {
     'name': 'commit',
-    'description': 'Create git commits with messages. Usage: <tool:commit>commit message</tool>'
+    'description': 'Create git commits with messages. Usage: <tool:commit>commit message</tool>',
+    'invalidates': 'all',
 }
 
 def run(args):
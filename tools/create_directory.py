@@ -2,7 +2,8 @@ import os
 
 metadata = {
     'name': 'create_directory',
-    'description': 'Recursively create folders (mkdir -p).'
+    'description': 'Recursively create folders (mkdir -p).',
+    'invalidates': {'path_arg': 0},
 }
 
 
@@ -2,7 +2,8 @@ import os
 
 metadata = {
     'name': 'create_file',
-    'description': 'Create a new file with given content.'
+    'description': 'Create a new file with given content.',
+    'invalidates': {'path_arg': 0},
 }
 
 
@@ -1,6 +1,7 @@
 metadata = {
     'name': 'edit',
-    'description': 'Edit files using instructions. Usage: <tool:edit>filename|instructions</tool>'
+    'description': 'Edit files using instructions. Usage: <tool:edit>filename|instructions</tool>',
+    'invalidates': {'path_arg': 0},
 }
 
 def run(args):
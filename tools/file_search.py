@@ -1,17 +1,10 @@
-import glob
+from core.file_index import run_file_search
 
 metadata = {
     'name': 'file_search',
-    'description': 'Glob search for filenames within workspace.'
+    'description': 'Find workspace files by glob (e.g. **/*.py) or by fuzzy name (e.g. chatproc).'
 }
 
 
 def run(args: str) -> str:
-    pattern = args.strip()
-    if not pattern:
-        return 'file_search error: no pattern provided.'
-    matches = glob.glob(pattern, recursive=True)
-    if not matches:
-        return 'No files matched the pattern.'
-    matches.sort()
-    return '\n'.join(matches[:200])
+    return run_file_search(args)
@@ -2,7 +2,8 @@ import subprocess
 
 metadata = {
     'name': 'get_changed_files',
-    'description': 'List git changes (staged/unstaged/conflicts).'
+    'description': 'List git changes (staged/unstaged/conflicts).',
+    'cache': {'scope': 'git'},
 }
 
 
@@ -1,8 +1,10 @@
+from core.terminal import get_terminal_output
+
 metadata = {
     'name': 'get_terminal_output',
-    'description': 'Fetch output from a previously run terminal command.'
+    'description': 'Fetch output of the last terminal command (also while it is still running); pass a number to get that many trailing lines of the terminal instead.'
 }
 
 
-def run(_args: str) -> str:
-    return "Tool 'get_terminal_output' is not supported in this CLI environment."
+def run(args: str) -> str:
+    return get_terminal_output(args)
@@ -1,17 +1,11 @@
-import os
+from core.file_index import run_list_dir
 
 metadata = {
     'name': 'list_dir',
-    'description': 'Directory listing (files and subfolders).'
+    'description': 'Directory listing (subfolders, then files with size and modification time).',
+    'cache': {'scope': 'dir', 'path_arg': 0},
 }
 
 
 def run(args: str) -> str:
-    path = args.strip() or '.'
-    if not os.path.exists(path):
-        return f'list_dir error: {path} not found.'
-    try:
-        entries = sorted(os.listdir(path))
-        return '\n'.join(entries)
-    except Exception as exc:
-        return f'list_dir error: {exc}'
+    return run_list_dir(args)
@@ -1,8 +1,18 @@
+from core.tool_calls import current_executor, format_tool_results, parse_parallel_calls
+
 metadata = {
     'name': 'multi_tool_use.parallel',
-    'description': 'Execute multiple tool calls in parallel when safe.'
+    'description': 'Execute multiple tool calls in parallel when safe. Usage: <tool:multi_tool_use.parallel>[{"name": "read_file", "args": "a.py"}, ...]</tool>'
 }
 
 
-def run(_args: str) -> str:
-    return "Tool 'multi_tool_use.parallel' is not supported in this CLI environment."
+def run(args: str) -> str:
+    calls = parse_parallel_calls(args.strip())
+    if not calls:
+        return 'multi_tool_use.parallel error: no tool calls provided.'
+    if any(call['name'] == metadata['name'] for call in calls):
+        return 'multi_tool_use.parallel error: nested parallel calls are not allowed.'
+    executor = current_executor()
+    if executor is None:
+        return 'multi_tool_use.parallel error: no tool executor is active.'
+    return format_tool_results(calls, executor.run_all(calls))
@@ -2,7 +2,8 @@ import subprocess
 
 metadata = {
     'name': 'revert',
-    'description': 'Revert changes. Usage: <tool:revert>commit or file</tool>'
+    'description': 'Revert changes. Usage: <tool:revert>commit or file</tool>',
+    'invalidates': 'all',
 }
 
 def run(args):
@@ -1,17 +1,10 @@
-import subprocess
+from core.terminal import run_terminal_tool
 
 metadata = {
     'name': 'run',
-    'description': 'Run shell commands. Usage: <tool:run>your command here</tool>'
+    'description': 'Run shell commands in the persistent terminal. Usage: <tool:run>your command here</tool>',
+    'invalidates': 'all',
 }
 
 def run(args):
-    try:
-        result = subprocess.run(args, shell=True, capture_output=True, text=True, timeout=15)
-        output = result.stdout.strip()
-        error = result.stderr.strip()
-        if result.returncode != 0:
-            return f'Error (code {result.returncode}): {error or output}'
-        return output or '(No output)'
-    except Exception as e:
-        return f'Run tool error: {e}'
+    return run_terminal_tool(args, 'run', failure='Error (code {code}): {output}', timeout=15)
@@ -1,8 +1,10 @@
+from core.semantic import run_semantic_search
+
 metadata = {
     'name': 'semantic_search',
-    'description': 'Natural-language search across workspace files.'
+    'description': 'Natural-language search across workspace files, offline (BM25 plus hashed word vectors). Usage: query|max_results (default 8). Returns ranked snippets as path:start-end.'
 }
 
 
-def run(_args: str) -> str:
-    return "Tool 'semantic_search' is not supported in this CLI environment."
+def run(args: str) -> str:
+    return run_semantic_search(args)
@@ -1,20 +1,21 @@
 
-import subprocess
 import os
-import platform
+
+from core.terminal import run_terminal_tool
 
 if os.name == 'nt':
     shell_desc = (
-        'Run a shell command and return its output. Example: "dir" to list files, "type file.txt" to show a file.'
+        'Run a command in the persistent terminal and return its output. Example: "dir" to list files, "type file.txt" to show a file.'
     )
 else:
     shell_desc = (
-        'Run a shell command and return its output. Example: "ls" to list files, "cat file.txt" to show a file.'
+        'Run a command in the persistent terminal and return its output. Example: "ls" to list files, "cat file.txt" to show a file.'
     )
 
 metadata = {
     'name': 'shell',
-    'description': shell_desc
+    'description': shell_desc,
+    'invalidates': 'all',
 }
 
 def run(args):
@@ -24,12 +25,4 @@ def run(args):
     """
     if not args.strip():
         return 'No command provided.'
-    try:
-        result = subprocess.run(args, shell=True, capture_output=True, text=True, timeout=10)
-        output = result.stdout.strip()
-        error = result.stderr.strip()
-        if result.returncode != 0:
-            return f'Error (code {result.returncode}): {error or output}'
-        return output or '(No output)'
-    except Exception as e:
-        return f'Exception: {e}'
+    return run_terminal_tool(args, 'shell', failure='Error (code {code}): {output}', timeout=10)
@@ -1,8 +1,10 @@
+from core.terminal import terminal_last_command
+
 metadata = {
     'name': 'terminal_last_command',
-    'description': 'Return the last command executed in terminal.'
+    'description': 'Return the last command executed in the terminal, its status and the working directory.'
 }
 
 
-def run(_args: str) -> str:
-    return "Tool 'terminal_last_command' is not supported in this CLI environment."
+def run(args: str) -> str:
+    return terminal_last_command(args)